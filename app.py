@@ -9,7 +9,6 @@ from http import HTTPStatus
 from aiohttp import web
 from aiohttp.web import Request, Response, json_response
 from botbuilder.core import (
-    BotFrameworkAdapter,
     BotFrameworkAdapterSettings,
     ConversationState,
     MemoryStorage,
@@ -19,18 +18,35 @@ from botbuilder.core import (
 from botbuilder.core.integration import aiohttp_error_middleware
 from botbuilder.schema import Activity, ActivityTypes
 
+from auth import CachingBotFrameworkAdapter, OpenIdMetadataRefresher, TokenCache
 from bots import Felix
+from cloud_clients import (
+    AzureClientCredential,
+    CapabilityIndex,
+    ClientFactory,
+    GcpMetadataCredential,
+    InventoryCache,
+    PageMemo,
+    ResponseCache,
+    VmsBackend,
+)
 
 # Create the loop and Flask app
 from config import DefaultConfig
 from dialogs import MainDialog
+from inventory import SnapshotStore, Snapshotter
+from server import is_primary_worker, ready, serve
+from storage import BatchingStorage, RedisStorage, SqliteStorage
+from telemetry import DEFAULT_TRACER, CallbackGauge, JsonFileExporter, metrics, metrics_middleware
 
 CONFIG = DefaultConfig()
 
 # Create adapter.
 # See https://aka.ms/about-bot-adapter to learn more about how bots work.
 SETTINGS = BotFrameworkAdapterSettings(CONFIG.APP_ID, CONFIG.APP_PASSWORD)
-ADAPTER = BotFrameworkAdapter(SETTINGS)
+ADAPTER = CachingBotFrameworkAdapter(SETTINGS, token_cache=TokenCache(max_entries=CONFIG.TOKEN_CACHE_MAX_ENTRIES))
+# refreshes the keys inbound tokens are validated with ahead of time
+OPENID_METADATA_REFRESHER = OpenIdMetadataRefresher(interval=CONFIG.OPENID_METADATA_REFRESH_INTERVAL)
 
 
 # Catch-all for errors.
@@ -64,13 +80,102 @@ async def on_error(context: TurnContext, error: Exception):
 
 ADAPTER.on_turn_error = on_error
 
-# Create MemoryStorage and state
-MEMORY = MemoryStorage()
-USER_STATE = UserState(MEMORY)
-CONVERSATION_STATE = ConversationState(MEMORY)
+# Create the state storage and state
+if CONFIG.STATE_STORAGE == "sqlite":
+    STORAGE = SqliteStorage(CONFIG.STATE_DB_PATH)
+elif CONFIG.STATE_STORAGE == "redis":
+    STORAGE = RedisStorage(
+        host=CONFIG.STATE_REDIS_HOST,
+        port=CONFIG.STATE_REDIS_PORT,
+        password=CONFIG.STATE_REDIS_PASSWORD,
+        db=CONFIG.STATE_REDIS_DB,
+        ttl=CONFIG.STATE_TTL,
+    )
+else:
+    STORAGE = MemoryStorage()
+USER_STATE = UserState(STORAGE)
+CONVERSATION_STATE = ConversationState(STORAGE)
+
+# Create the cloud clients factory
+# (per-user client views over pooled connections, shared inventory & response caches, page memo and capability index)
+CAPABILITY_INDEX = CapabilityIndex(
+    path=CONFIG.CAPABILITY_DB_PATH,
+    max_age=CONFIG.CAPABILITY_MAX_AGE,
+    disabled_max_age=CONFIG.CAPABILITY_DISABLED_MAX_AGE,
+)
+RESPONSE_CACHE = ResponseCache(
+    max_bytes=CONFIG.RESPONSE_CACHE_MAX_BYTES, max_entry_bytes=CONFIG.RESPONSE_CACHE_MAX_ENTRY_BYTES
+)
+PAGE_MEMO = PageMemo(max_entries=CONFIG.PAGE_MEMO_MAX_ENTRIES)
+CLIENT_FACTORY = ClientFactory(
+    cache=InventoryCache(ttl=CONFIG.INVENTORY_CACHE_TTL, max_entries=CONFIG.INVENTORY_CACHE_MAX_ENTRIES),
+    capabilities=CAPABILITY_INDEX,
+    response_cache=RESPONSE_CACHE if CONFIG.RESPONSE_CACHE_MAX_BYTES else None,
+    page_memo=PAGE_MEMO if CONFIG.PAGE_MEMO_MAX_ENTRIES else None,
+    azure_options=dict(vms_backend=VmsBackend(CONFIG.AZURE_VMS_BACKEND)),
+)
+
+# Create the inventory snapshot store and its background crawler (both optional)
+SNAPSHOT_STORE = None
+SNAPSHOTTER = None
+if CONFIG.SNAPSHOT_DB_PATH:
+    SNAPSHOT_STORE = SnapshotStore(CONFIG.SNAPSHOT_DB_PATH, max_age=CONFIG.SNAPSHOT_MAX_AGE)
+    AZURE_SERVICE_CREDENTIAL = None
+    if CONFIG.SNAPSHOT_AZURE_CLIENT_ID:
+        AZURE_SERVICE_CREDENTIAL = AzureClientCredential(
+            tenant_id=CONFIG.SNAPSHOT_AZURE_TENANT_ID,
+            client_id=CONFIG.SNAPSHOT_AZURE_CLIENT_ID,
+            client_secret=CONFIG.SNAPSHOT_AZURE_CLIENT_SECRET,
+        )
+    GCP_SERVICE_CREDENTIAL = GcpMetadataCredential() if CONFIG.SNAPSHOT_GCP_USE_METADATA_SERVER else None
+    if AZURE_SERVICE_CREDENTIAL or GCP_SERVICE_CREDENTIAL:
+        SNAPSHOTTER = Snapshotter(
+            store=SNAPSHOT_STORE,
+            # no inventory cache - every crawl should see fresh data (revalidated responses are fresh)
+            client_factory=ClientFactory(
+                capabilities=CAPABILITY_INDEX,
+                response_cache=CLIENT_FACTORY.response_cache,
+                page_memo=CLIENT_FACTORY.page_memo,
+                azure_options=dict(vms_backend=VmsBackend(CONFIG.AZURE_VMS_BACKEND)),
+            ),
+            azure_credential=AZURE_SERVICE_CREDENTIAL,
+            azure_subscription_ids=CONFIG.SNAPSHOT_AZURE_SUBSCRIPTIONS,
+            gcp_credential=GCP_SERVICE_CREDENTIAL,
+            gcp_project_ids=CONFIG.SNAPSHOT_GCP_PROJECTS,
+            interval=CONFIG.SNAPSHOT_INTERVAL,
+        )
+
+# Expose the hit ratios of the caches with the rest of the metrics
+CallbackGauge(
+    "felix_inventory_cache_hit_ratio", "Hit ratio of the inventory cache", lambda: CLIENT_FACTORY.cache.hit_ratio
+)
+CallbackGauge(
+    "felix_response_cache_hit_ratio", "Share of cloud API responses served from the response cache (304s)",
+    lambda: RESPONSE_CACHE.hit_ratio,
+)
+CallbackGauge("felix_response_cache_bytes", "Bytes of the response cache", lambda: RESPONSE_CACHE.size)
+CallbackGauge(
+    "felix_page_memo_hit_ratio", "Share of cloud API pages that weren't built again as they didn't change",
+    lambda: PAGE_MEMO.hit_ratio,
+)
+CallbackGauge(
+    "felix_cloud_coalesced_ratio", "Share of cloud API requests that joined an identical one in flight",
+    lambda: CLIENT_FACTORY.coalescer.coalesced_ratio,
+)
+CallbackGauge(
+    "felix_token_cache_hit_ratio", "Hit ratio of the inbound token cache", lambda: ADAPTER.token_cache.hit_ratio
+)
+
+if CONFIG.TRACE_FILE:
+    DEFAULT_TRACER.add_exporter(JsonFileExporter(CONFIG.TRACE_FILE))
 
 # Create dialog
-DIALOG = MainDialog(azure_connection_name=CONFIG.AAD_CONNECTION_NAME, gcp_connection_name=CONFIG.GCP_CONNECTION_NAME)
+DIALOG = MainDialog(
+    azure_connection_name=CONFIG.AAD_CONNECTION_NAME,
+    gcp_connection_name=CONFIG.GCP_CONNECTION_NAME,
+    client_factory=CLIENT_FACTORY,
+    snapshot_store=SNAPSHOT_STORE,
+)
 
 # Create Bot
 BOT = Felix(CONVERSATION_STATE, USER_STATE, DIALOG)
@@ -93,11 +198,56 @@ async def messages(req: Request) -> Response:
     return Response(status=HTTPStatus.OK)
 
 
-APP = web.Application(middlewares=[aiohttp_error_middleware])
+async def close_cloud_clients(app: web.Application):
+    await CLIENT_FACTORY.close()
+
+
+async def start_snapshotter(app: web.Application):
+    # a single crawler, however many worker processes serve the bot
+    if is_primary_worker(app):
+        await SNAPSHOTTER.start()
+
+
+async def close_storage(app: web.Application):
+    await STORAGE.close()
+
+
+async def close_snapshot_store(app: web.Application):
+    await SNAPSHOT_STORE.close()
+
+
+APP = web.Application(middlewares=[metrics_middleware, aiohttp_error_middleware])
 APP.router.add_post("/api/messages", messages)
+APP.router.add_get("/ready", ready)
+APP.router.add_get("/metrics", metrics)
+APP.on_startup.append(CAPABILITY_INDEX.load)
+if CONFIG.APP_ID:
+    # no inbound tokens to validate otherwise
+    APP.on_startup.append(OPENID_METADATA_REFRESHER.start)
+    APP.on_cleanup.append(OPENID_METADATA_REFRESHER.stop)
+if SNAPSHOTTER:
+    APP.on_startup.append(start_snapshotter)
+    APP.on_cleanup.append(SNAPSHOTTER.stop)
+if SNAPSHOT_STORE:
+    APP.on_cleanup.append(close_snapshot_store)
+APP.on_cleanup.append(close_cloud_clients)
+APP.on_cleanup.append(CAPABILITY_INDEX.close)
+if isinstance(STORAGE, BatchingStorage):
+    APP.on_cleanup.append(close_storage)
+APP.on_cleanup.append(DEFAULT_TRACER.close)
 
 if __name__ == "__main__":
+    if CONFIG.WORKERS > 1 and isinstance(STORAGE, MemoryStorage):
+        sys.exit("Serving with several workers requires a shared StateStorage (sqlite / redis)")
     try:
-        web.run_app(APP, host="localhost", port=CONFIG.PORT)
+        serve(
+            APP,
+            host=CONFIG.HOST,
+            port=CONFIG.PORT,
+            workers=CONFIG.WORKERS,
+            shutdown_timeout=CONFIG.SHUTDOWN_TIMEOUT,
+            drain_delay=CONFIG.DRAIN_DELAY,
+            worker_port_base=CONFIG.WORKER_PORT_BASE,
+        )
     except Exception as error:
         raise error
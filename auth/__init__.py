@@ -0,0 +1,9 @@
+from .adapter import CachingBotFrameworkAdapter
+from .metadata import OpenIdMetadataRefresher
+from .token_cache import TokenCache
+
+__all__ = [
+    "CachingBotFrameworkAdapter",
+    "OpenIdMetadataRefresher",
+    "TokenCache",
+]
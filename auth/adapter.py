@@ -0,0 +1,31 @@
+from botbuilder.core import BotFrameworkAdapter, BotFrameworkAdapterSettings
+from botbuilder.schema import Activity
+from botframework.connector.auth import ClaimsIdentity, MicrosoftAppCredentials
+
+from .token_cache import TokenCache
+
+
+class CachingBotFrameworkAdapter(BotFrameworkAdapter):
+    """
+    BotFrameworkAdapter that validates every inbound token once: the identity of a validated token is cached
+    (see TokenCache) so the following activities of the same channel session skip the signature verification
+    """
+
+    def __init__(self, settings: BotFrameworkAdapterSettings, token_cache: TokenCache = None):
+        super().__init__(settings)
+        self.token_cache = token_cache or TokenCache()
+
+    async def _authenticate_request(self, request: Activity, auth_header: str) -> ClaimsIdentity:
+        if not auth_header:
+            # anonymous (authentication is disabled) - nothing to validate
+            return await super()._authenticate_request(request, auth_header)
+
+        identity = self.token_cache.get(auth_header, request.channel_id, request.service_url)
+        if identity:
+            # the rest of what a validation does
+            MicrosoftAppCredentials.trust_service_url(request.service_url)
+            return identity
+
+        identity = await super()._authenticate_request(request, auth_header)
+        self.token_cache.put(auth_header, request.channel_id, request.service_url, identity)
+        return identity
@@ -0,0 +1,90 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+import aiohttp
+import structlog
+import yarl
+from botframework.connector.auth import AuthenticationConstants, JwtTokenExtractor
+
+from cloud_clients.pool import DEFAULT_POOL, ConnectionPool
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_METADATA_URLS = [
+    AuthenticationConstants.TO_BOT_FROM_CHANNEL_OPEN_ID_METADATA_URL,
+    AuthenticationConstants.TO_BOT_FROM_EMULATOR_OPEN_ID_METADATA_URL,
+]
+
+
+@dataclass
+class OpenIdMetadataRefresher:
+    """
+    keeps the signing keys the Bot Framework validates inbound tokens with up to date, in the background.
+    botbuilder fetches them lazily (on the request that finds them missing or 5 days old) with blocking calls;
+    refreshing them ahead of time keeps that off the request path.
+    every metadata url the token extractors use is refreshed (on top of metadata_urls)
+    """
+    metadata_urls: List[str] = field(default_factory=lambda: list(DEFAULT_METADATA_URLS))
+    interval: float = 24 * 3600.0
+    retry_interval: float = 60.0
+    timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=30)
+    pool: ConnectionPool = DEFAULT_POOL
+
+    _task: Optional[asyncio.Task] = field(default=None, init=False, repr=False)
+
+    async def start(self, *args):
+        """
+        start refreshing in the background (can be used as an aiohttp on_startup signal)
+        """
+        if not self._task:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self, *args):
+        """
+        stop refreshing (can be used as an aiohttp on_cleanup signal)
+        """
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            refreshed = await self.refresh()
+            await asyncio.sleep(self.interval if refreshed else self.retry_interval)
+
+    async def refresh(self) -> bool:
+        """
+        refresh the keys of every metadata url. returns whether all of them were refreshed
+        """
+        for url in self.metadata_urls:
+            JwtTokenExtractor.get_open_id_metadata(url)
+        urls = list(JwtTokenExtractor.metadataCache)
+        results = await asyncio.gather(*[self._refresh(url) for url in urls], return_exceptions=True)
+        refreshed = True
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                # the current keys stay in place (botbuilder refreshes them itself once they're too old)
+                logger.warning("Failed to refresh OpenID metadata", url=url, err=repr(result))
+                refreshed = False
+        return refreshed
+
+    async def _refresh(self, url: str):
+        metadata = await self._get_json(url)
+        keys = (await self._get_json(metadata["jwks_uri"]))["keys"]
+        # swapped together, like botbuilder's own refresh does
+        open_id_metadata = JwtTokenExtractor.get_open_id_metadata(url)
+        open_id_metadata.keys = keys
+        open_id_metadata.last_updated = datetime.now()
+        logger.debug("Refreshed OpenID metadata", url=url, keys=len(keys))
+
+    async def _get_json(self, url: str) -> dict:
+        parsed_url = yarl.URL(url)
+        session = self.pool.get_session(scheme=parsed_url.scheme, host=parsed_url.host, port=parsed_url.port)
+        async with session.get(parsed_url, raise_for_status=True, timeout=self.timeout) as res:
+            return await res.json(content_type=None)
@@ -0,0 +1,55 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from botframework.connector.auth import ClaimsIdentity
+
+
+@dataclass
+class TokenCache:
+    """
+    LRU cache of the identities of validated inbound (channel) tokens, each until its token expires.
+    entries are keyed by a hash of the token and of what its validation depended on (channel id & service url)
+    """
+    max_entries: int = 4096
+
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _entries: "OrderedDict[str, Tuple[float, ClaimsIdentity]]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, auth_header: str, channel_id: str, service_url: str) -> Optional[ClaimsIdentity]:
+        key = self._get_key(auth_header, channel_id, service_url)
+        entry = self._entries.get(key)
+        if entry:
+            expires_at, identity = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return identity
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, auth_header: str, channel_id: str, service_url: str, identity: ClaimsIdentity):
+        expires_at = identity.claims.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            # no expiry to bound the entry by
+            return
+        key = self._get_key(auth_header, channel_id, service_url)
+        self._entries[key] = (expires_at, identity)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _get_key(auth_header: str, channel_id: str, service_url: str) -> str:
+        return hashlib.sha256(f"{auth_header}\n{channel_id}\n{service_url}".encode()).hexdigest()
@@ -0,0 +1,105 @@
+"""
+compare building every VM and filtering afterwards with pre-checking the raw data on synthetic 10k-VM payloads
+
+    python -m benchmarks.azure_running_vms_filter [vms] [running ratio]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from benchmarks.stubs import quiet_logs
+from cloud_clients.azure import Vms
+from cloud_models.azure import Subscription, Vm, VmPowerState
+
+PAGE_SIZE = 1000
+
+
+def make_raw_vm(i: int, running: bool) -> dict:
+    power_state = "running" if running else "deallocated"
+    return {
+        "name": f"vm-{i}",
+        "id": f"/subscriptions/sub/resourceGroups/rg-{i % 20}/providers/Microsoft.Compute/virtualMachines/vm-{i}",
+        "type": "Microsoft.Compute/virtualMachines",
+        "location": "westeurope",
+        "properties": {
+            "vmId": f"00000000-0000-0000-0000-{i:012}",
+            "instanceView": {
+                "statuses": [
+                    {"code": "ProvisioningState/succeeded", "level": "Info", "displayStatus": "Provisioning succeeded"},
+                    {"code": f"PowerState/{power_state}", "level": "Info", "displayStatus": f"VM {power_state}"},
+                ],
+            },
+        },
+    }
+
+
+def make_pages(vms_count: int, running_ratio: float) -> List[dict]:
+    running_every = max(int(1 / running_ratio), 1) if running_ratio else vms_count + 1
+    raw_vms = [make_raw_vm(i, running=i % running_every == 0) for i in range(vms_count)]
+    pages = []
+    for i in range(0, vms_count, PAGE_SIZE):
+        page = {"value": raw_vms[i:i+PAGE_SIZE]}
+        if i + PAGE_SIZE < vms_count:
+            page["nextLink"] = f"https://management.azure.com/page/{len(pages) + 1}"
+        pages.append(page)
+    return pages
+
+
+@dataclass
+class PagesClient:
+    """
+    serves the synthetic pages instead of the API
+    """
+    pages: List[dict]
+    identity: str = "benchmark"
+
+    async def iter_json_items(
+        self, items_key: str, url: Optional[str] = None, extra: Optional[Dict[str, Any]] = None, **kwargs
+    ) -> AsyncIterator[dict]:
+        page = self.pages[int(url.rsplit("/", 1)[1]) if url else 0]
+        for item in page[items_key]:
+            yield item
+        extra.update((key, value) for key, value in page.items() if key != items_key)
+
+
+async def build_then_filter(vms: Vms, subscription: Subscription) -> List[Vm]:
+    def filter_func(vm: Vm):
+        return vm.power_state == VmPowerState.running
+
+    running_vms, next_link = [], None
+    while True:
+        page, next_link = await vms.list_all(subscription=subscription, filter_func=filter_func, next_link=next_link)
+        running_vms += page
+        if not next_link:
+            return running_vms
+
+
+async def raw_pre_check(vms: Vms, subscription: Subscription) -> List[Vm]:
+    return [vm async for vm in vms.iter_running_vms(subscription=subscription)]
+
+
+async def main(vms_count: int, running_ratio: float):
+    quiet_logs()
+    pages = make_pages(vms_count, running_ratio)
+    vms = Vms(client=PagesClient(pages=pages))
+    subscription = Subscription(id="sub", name="sub")
+    print(f"{vms_count} vms, {running_ratio:.0%} running")
+    print(f"{'mode':<20}{'running':>10}{'time (ms)':>12}{'peak (KiB)':>12}")
+    for name, func in (("build then filter", build_then_filter), ("raw pre-check", raw_pre_check)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        running_vms = await func(vms, subscription)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<20}{len(running_vms):>10}{elapsed * 1000:>12.1f}{peak / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        vms_count=int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        running_ratio=float(sys.argv[2]) if len(sys.argv) > 2 else 0.1,
+    ))
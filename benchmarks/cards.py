@@ -0,0 +1,89 @@
+"""
+render 10k VM rows into cards: a template parsed per card and chunked by row count vs the shared card engine
+
+    python -m benchmarks.cards [rows]
+"""
+import json
+import sys
+import time
+from typing import Callable, List
+
+from botbuilder.core import CardFactory
+from botbuilder.schema import Attachment
+
+from benchmarks.stubs import quiet_logs
+from cards import AZURE_VMS_CARD, MESSAGE_MAX_BYTES, get_azure_vms_cards, group_by_size
+from cloud_models.azure import Vm, VmPowerState
+
+ROUNDS = 5
+LEGACY_CARD_MAX_VMS = 50
+# the old templates were pretty printed JSON strings, parsed for every card
+LEGACY_TEMPLATE = json.dumps(AZURE_VMS_CARD._get_card(title=None, columns_items=[[], [], []]), indent=4)
+
+
+def legacy_get_azure_vms_card(vms: List[Vm], start_idx: int) -> Attachment:
+    # how cards used to be rendered
+    data = json.loads(LEGACY_TEMPLATE)
+    idx_col, name_col, rg_col = data["body"][1]["columns"]
+    for i, vm in enumerate(vms):
+        idx_col["items"].append({"type": "TextBlock", "text": f"{start_idx + i}.", "wrap": False, "isSubtle": True})
+        name_col["items"].append({"type": "TextBlock", "text": vm.name, "wrap": False, "isSubtle": False})
+        rg_col["items"].append({"type": "TextBlock", "text": vm.rg, "wrap": False, "isSubtle": False})
+    return CardFactory.adaptive_card(card=data)
+
+
+def legacy_get_azure_vms_cards(vms: List[Vm]) -> List[Attachment]:
+    return [
+        legacy_get_azure_vms_card(vms[i:i+LEGACY_CARD_MAX_VMS], start_idx=i+1)
+        for i in range(0, len(vms), LEGACY_CARD_MAX_VMS)
+    ]
+
+
+def make_vms(count: int, name_length: int) -> List[Vm]:
+    return [
+        Vm.from_trusted(
+            id=str(i),
+            name=f"vm-{i}-".ljust(name_length, "x"),
+            rg=f"rg-{i % 20}".ljust(name_length // 2, "x"),
+            power_state=VmPowerState.running,
+        )
+        for i in range(count)
+    ]
+
+
+def measure(
+        render: Callable[[List[Vm]], List[Attachment]],
+        group: Callable[[List[Attachment]], List[List[Attachment]]],
+        vms: List[Vm],
+):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        cards = render(vms)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    sizes = [len(json.dumps(card.content)) for card in cards]
+    messages = [sum(len(json.dumps(card.content)) for card in message) for message in group(cards)]
+    return elapsed, len(cards), max(sizes), len(messages), sum(size > MESSAGE_MAX_BYTES for size in messages)
+
+
+def main():
+    quiet_logs()
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+
+    print(f"{rows} rows, message budget {MESSAGE_MAX_BYTES} bytes")
+    print(f"{'names':<8}{'renderer':<10}{'time (ms)':>12}{'cards':>8}{'max card (B)':>14}{'messages':>10}{'too big':>9}")
+    for name_length in (12, 64, 200):
+        vms = make_vms(rows, name_length)
+        renderers = (
+            # the dialogs used to send all the cards in a single message
+            ("legacy", legacy_get_azure_vms_cards, lambda cards: [cards]),
+            ("engine", get_azure_vms_cards, group_by_size),
+        )
+        for renderer, render, group in renderers:
+            elapsed, cards, max_size, messages, too_big = measure(render, group, vms)
+            print(
+                f"{name_length:<8}{renderer:<10}{elapsed * 1000:>12.1f}{cards:>8}{max_size:>14}{messages:>10}{too_big:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
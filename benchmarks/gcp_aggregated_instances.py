@@ -0,0 +1,86 @@
+"""
+compare the per-zone instances fan-out with the aggregated list for 50 projects,
+and the aggregated list's full responses with its partial ones (see AGGREGATED_RUNNING_INSTANCES_FIELDS)
+
+    python -m benchmarks.gcp_aggregated_instances
+"""
+import asyncio
+import time
+
+from benchmarks.stubs import GcpComputeStub, quiet_logs, start_app
+from cloud_clients import ClientFactory, GcpClient
+from cloud_clients.gcp import AGGREGATED_RUNNING_INSTANCES_FIELDS, RUNNING_INSTANCES_FIELDS
+
+# the zone allow-list the GCP dialog used to fan out over
+US_ZONES_LIST = [
+    'us-central1-a', 'us-central1-b', 'us-central1-c', 'us-central1-f',
+    'us-east1-b', 'us-east1-c', 'us-east1-d',
+    'us-east4-a', 'us-east4-b', 'us-east4-c',
+    'us-west1-a', 'us-west1-b', 'us-west1-c',
+    'us-west2-a', 'us-west2-b', 'us-west2-c',
+    'us-west3-a', 'us-west3-b', 'us-west3-c',
+    'us-west4-a', 'us-west4-b', 'us-west4-c',
+]
+
+
+async def per_zone_scan(client: GcpClient, projects):
+    async def scan(project, zone):
+        instances, next_page_token = [], None
+        while True:
+            page, next_page_token = await client.instances.list_running(
+                project=project, zone=zone, next_page_token=next_page_token
+            )
+            instances += page
+            if not next_page_token:
+                return instances
+
+    results = await asyncio.gather(*[scan(project, zone) for project in projects for zone in US_ZONES_LIST])
+    return [instance for instances in results for instance in instances]
+
+
+async def aggregated_scan(client: GcpClient, projects):
+    async def scan(project):
+        instances, next_page_token = [], None
+        while True:
+            by_zone, next_page_token = await client.instances.list_running_aggregated(
+                project=project, next_page_token=next_page_token
+            )
+            for zone_instances in by_zone.values():
+                instances += zone_instances
+            if not next_page_token:
+                return instances
+
+    results = await asyncio.gather(*[scan(project) for project in projects])
+    return [instance for instances in results for instance in instances]
+
+
+async def main():
+    quiet_logs()
+    stub = GcpComputeStub(projects_count=50)
+    runner, port = await start_app(stub.app())
+    factory = ClientFactory(
+        gcp_options=dict(compute_host="127.0.0.1", cloud_resource_manager_host="127.0.0.1", port=port, scheme="http")
+    )
+    client = factory.gcp(token="benchmark")
+    try:
+        print(f"{'mode':<20}{'requests':>10}{'KiB':>10}{'instances':>12}{'wall (s)':>10}")
+        for name, scan_func, counter, fields in (
+                ("per-zone", per_zone_scan, "zonal", RUNNING_INSTANCES_FIELDS),
+                ("aggregated (full)", aggregated_scan, "aggregated", None),
+                ("aggregated", aggregated_scan, "aggregated", AGGREGATED_RUNNING_INSTANCES_FIELDS),
+        ):
+            client.instances.list_instances_fields = client.instances.aggregated_list_instances_fields = fields
+            stub.requests.clear()
+            stub.response_bytes.clear()
+            start = time.perf_counter()
+            instances = await scan_func(client, stub.projects)
+            elapsed = time.perf_counter() - start
+            kib = stub.response_bytes[counter] / 1024
+            print(f"{name:<20}{stub.requests[counter]:>10}{kib:>10.1f}{len(instances):>12}{elapsed:>10.2f}")
+    finally:
+        await factory.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
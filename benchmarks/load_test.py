@@ -0,0 +1,238 @@
+"""
+load test the bot: simulated users talk to APP (app.py, served in a process of its own) over HTTP,
+while local stand-ins serve the Bot Framework channel & token service and the Azure / GCP APIs.
+reports the throughput, the turn latency percentiles and the peak memory of the bot
+
+    python -m benchmarks.load_test [--users 20] [--conversations 3] [--cloud both] [--latency 0.02] ...
+
+the bot's own settings (e.g., InventoryCacheTtl, StateStorage, AzureVmsBackend) are taken from the environment
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import signal
+import socket
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.stubs import AzureManagementStub, ChannelStub, GcpComputeStub, quiet_logs, start_app
+from dialogs.azure_dialog import ALL_SUBSCRIPTIONS
+from dialogs.gcp_dialog import ChosenProjectType
+
+AZURE_CONVERSATION = ["hi", "Azure", ALL_SUBSCRIPTIONS]
+GCP_CONVERSATION = ["hi", "GCP", ChosenProjectType.ALL.value]
+CONVERSATIONS = {
+    "azure": [AZURE_CONVERSATION],
+    "gcp": [GCP_CONVERSATION],
+    "both": [AZURE_CONVERSATION, GCP_CONVERSATION],
+}
+
+READY_TIMEOUT = 30.0
+
+
+def stub_token_flow(adapter):
+    """
+    the adapter only asks the token service for tokens on behalf of a bot with an app id (taken from the inbound
+    request's claims) - there's none with inbound auth off. ask the channel's token service as it would otherwise
+    (with the same - blocking - client)
+    """
+    from botframework.connector.auth import MicrosoftAppCredentials
+    from botframework.connector.token_api import TokenApiClient
+    from botbuilder.schema import TokenResponse
+
+    def get_client(context) -> TokenApiClient:
+        return TokenApiClient(MicrosoftAppCredentials.empty(), context.activity.service_url)
+
+    async def get_user_token(context, connection_name: str, magic_code: str = None, *args) -> Optional[TokenResponse]:
+        activity = context.activity
+        result = get_client(context).user_token.get_token(
+            activity.from_property.id, connection_name, activity.channel_id, magic_code
+        )
+        return result if result and result.token else None
+
+    async def sign_out_user(context, connection_name: str = None, user_id: str = None, *args):
+        activity = context.activity
+        get_client(context).user_token.sign_out(
+            user_id or activity.from_property.id, connection_name, activity.channel_id
+        )
+
+    adapter.get_user_token = get_user_token
+    adapter.sign_out_user = sign_out_user
+
+
+def run_bot(port: int, stubs_port: int, workers: int):
+    """
+    serve APP with its clients pointed at the stand-ins (runs in the bot process)
+    """
+    # no inbound auth - the simulated channel doesn't sign its requests (like the Bot Framework Emulator)
+    os.environ["MicrosoftAppId"] = ""
+    os.environ["MicrosoftAppPassword"] = ""
+    os.environ.setdefault("AadConnectionName", "azure")
+    os.environ.setdefault("GcpConnectionName", "gcp")
+    quiet_logs(levels=("debug", "info"))
+
+    import app as bot
+    from server import serve
+
+    stub_token_flow(bot.ADAPTER)
+    stubs = dict(port=stubs_port, scheme="http")
+    bot.CLIENT_FACTORY.azure_options.update(host="127.0.0.1", **stubs)
+    bot.CLIENT_FACTORY.gcp_options.update(compute_host="127.0.0.1", cloud_resource_manager_host="127.0.0.1", **stubs)
+    serve(bot.APP, host="127.0.0.1", port=port, workers=workers, shutdown_timeout=5.0)
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def get_peak_rss_mib() -> float:
+    """
+    peak RSS of the largest (waited for) child process
+    """
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str, bot: multiprocessing.Process):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if not bot.is_alive():
+            raise RuntimeError("The bot exited before getting ready")
+        try:
+            async with session.get(f"{url}/ready") as res:
+                if res.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise TimeoutError("The bot didn't get ready in time")
+
+
+async def converse(
+        session: aiohttp.ClientSession,
+        url: str,
+        service_url: str,
+        user_id: str,
+        texts: List[str],
+        latencies: List[float],
+        failures: List[int],
+):
+    """
+    send texts as the user, one turn at a time (the bot replies within the turn's request)
+    """
+    conversation_id = str(uuid.uuid4())
+    for text in texts:
+        activity = {
+            "type": "message",
+            "id": str(uuid.uuid4()),
+            "channelId": "emulator",
+            "serviceUrl": service_url,
+            "conversation": {"id": conversation_id},
+            "from": {"id": user_id, "name": user_id},
+            "recipient": {"id": "felix", "name": "Felix"},
+            "text": text,
+        }
+        start = time.perf_counter()
+        async with session.post(f"{url}/api/messages", json=activity) as res:
+            await res.read()
+            if res.status >= 400:
+                failures.append(res.status)
+        latencies.append(time.perf_counter() - start)
+
+
+async def main(args: argparse.Namespace):
+    quiet_logs()
+    azure = AzureManagementStub(
+        subscriptions_count=args.subscriptions,
+        vms_per_subscription=args.vms,
+        running_ratio=args.running_ratio,
+        page_size=args.azure_page_size,
+        latency=args.latency,
+        throttle_ratio=args.throttle_ratio,
+        retry_after=args.retry_after,
+    )
+    gcp = GcpComputeStub(
+        projects_count=args.projects,
+        instances_per_project=args.instances,
+        page_size=args.gcp_page_size,
+        projects_page_size=args.projects_page_size,
+        latency=args.latency,
+        throttle_ratio=args.throttle_ratio,
+        retry_after=args.retry_after,
+    )
+    channel = ChannelStub()
+    stubs = web.Application(client_max_size=16 * 1024 * 1024)
+    stubs.add_routes(azure.routes() + gcp.routes() + channel.routes())
+    runner, stubs_port = await start_app(stubs)
+
+    port = get_free_port()
+    bot = multiprocessing.Process(target=run_bot, args=(port, stubs_port, args.workers))
+    bot.start()
+    url, service_url = f"http://127.0.0.1:{port}", f"http://127.0.0.1:{stubs_port}"
+    latencies, failures = [], []
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None)) as session:
+            await wait_ready(session, url, bot)
+
+            async def simulate_user(user: int):
+                for i in range(args.conversations):
+                    conversations = CONVERSATIONS[args.cloud]
+                    texts = conversations[(user + i) % len(conversations)]
+                    await converse(session, url, service_url, f"user-{user}", texts, latencies, failures)
+
+            start = time.perf_counter()
+            await asyncio.gather(*[simulate_user(user) for user in range(args.users)])
+            elapsed = time.perf_counter() - start
+    finally:
+        os.kill(bot.pid, signal.SIGTERM)
+        await asyncio.get_event_loop().run_in_executor(None, bot.join)
+        await runner.cleanup()
+
+    latencies.sort()
+    print(f"{args.users} users x {args.conversations} conversations ({args.cloud}), {args.workers} worker(s)")
+    print(f"{'turns':>8}{'failed':>8}{'turns/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'max (ms)':>10}{'peak RSS (MiB)':>16}")
+    print(
+        f"{len(latencies):>8}{len(failures) + channel.errors:>8}{len(latencies) / elapsed:>10.1f}"
+        f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}"
+        f"{latencies[-1] * 1000:>10.1f}{get_peak_rss_mib():>16.1f}"
+    )
+    print("requests:", dict(azure.requests + gcp.requests + channel.requests))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--conversations", type=int, default=3, help="conversations per user, one after the other")
+    parser.add_argument("--cloud", choices=sorted(CONVERSATIONS), default="both")
+    parser.add_argument("--workers", type=int, default=1, help="bot worker processes (>1 requires a StateStorage)")
+    parser.add_argument("--subscriptions", type=int, default=5, help="Azure subscriptions")
+    parser.add_argument("--vms", type=int, default=200, help="VMs per Azure subscription")
+    parser.add_argument("--running-ratio", type=float, default=0.25, help="share of running Azure VMs")
+    parser.add_argument("--azure-page-size", type=int, default=1000)
+    parser.add_argument("--projects", type=int, default=20, help="GCP projects")
+    parser.add_argument("--projects-page-size", type=int, default=500)
+    parser.add_argument("--instances", type=int, default=50, help="running instances per GCP project")
+    parser.add_argument("--gcp-page-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the cloud APIs take to respond")
+    parser.add_argument("--throttle-ratio", type=float, default=0.0, help="share of cloud requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of the 429s (seconds)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
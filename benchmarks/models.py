@@ -0,0 +1,58 @@
+"""
+objects per second for validated vs trusted construction of the cloud models
+
+    python -m benchmarks.models
+"""
+import time
+from typing import Callable
+
+from benchmarks.azure_running_vms_filter import make_raw_vm
+from benchmarks.stubs import quiet_logs
+from cloud_models.azure import Subscription, Vm, VmPowerState
+from cloud_models.gcp import Instance, InstanceState, Project
+
+ROUNDS = 50_000
+
+
+def objects_per_second(build: Callable[[], object], rounds: int = ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        build()
+    return rounds / (time.perf_counter() - start)
+
+
+def validated_vm_from_raw_data(data: dict) -> Vm:
+    # how Vm.from_raw_data used to build vms
+    return Vm(
+        id=data["properties"]["vmId"],
+        name=data["name"],
+        rg=data["id"].split("/")[4],
+        power_state=data["properties"]["instanceView"]["statuses"][1]["code"].split("/")[1],
+    )
+
+
+def main():
+    quiet_logs()
+    raw_vm = make_raw_vm(0, running=True)
+    vm = dict(id="vm-id", name="vm", rg="rg", power_state=VmPowerState.running)
+    subscription = dict(id="sub-id", name="sub")
+    project = dict(id="project-id", name="project")
+    instance = dict(id="1234", name="instance", zone="us-central1-a", project="project-id", state=InstanceState.running)
+
+    benchmarks = (
+        ("Vm.from_raw_data", lambda: validated_vm_from_raw_data(raw_vm), lambda: Vm.from_raw_data(raw_vm)),
+        ("Vm", lambda: Vm(**vm), lambda: Vm.from_trusted(**vm)),
+        ("Subscription", lambda: Subscription(**subscription), lambda: Subscription.from_trusted(**subscription)),
+        ("Project", lambda: Project(**project), lambda: Project.from_trusted(**project)),
+        ("Instance", lambda: Instance(**instance), lambda: Instance.from_trusted(**instance)),
+    )
+
+    print(f"{'model':<20}{'validated (obj/s)':>20}{'trusted (obj/s)':>20}{'speedup':>10}")
+    for name, validated, trusted in benchmarks:
+        before = objects_per_second(validated)
+        after = objects_per_second(trusted)
+        print(f"{name:<20}{before:>20,.0f}{after:>20,.0f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
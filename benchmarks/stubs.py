@@ -0,0 +1,411 @@
+"""
+local stand-ins for the cloud APIs (and the Bot Framework services) Felix talks to, for benchmarking only
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import structlog
+from aiohttp import web
+
+GCP_ZONES_LIST = [
+    'us-central1-a', 'us-central1-b', 'us-central1-c', 'us-central1-f',
+    'us-east1-b', 'us-east1-c', 'us-east1-d',
+    'us-east4-a', 'us-east4-b', 'us-east4-c',
+    'us-west1-a', 'us-west1-b', 'us-west1-c',
+    'us-west2-a', 'us-west2-b', 'us-west2-c',
+    'us-west3-a', 'us-west3-b', 'us-west3-c',
+    'us-west4-a', 'us-west4-b', 'us-west4-c',
+    'europe-west1-b', 'europe-west1-c', 'europe-west1-d',
+    'europe-west4-a', 'europe-west4-b', 'europe-west4-c',
+    'asia-east1-a', 'asia-east1-b', 'asia-east1-c',
+    'asia-northeast1-a', 'asia-northeast1-b', 'asia-northeast1-c',
+    'australia-southeast1-a', 'australia-southeast1-b', 'australia-southeast1-c',
+    'southamerica-east1-a', 'southamerica-east1-b', 'southamerica-east1-c',
+]
+
+# what's left of instances in partial responses
+INSTANCE_FIELDS = ("id", "name", "status")
+
+
+def _page(items: list, request: web.Request, page_size: int, token_param: str) -> Tuple[list, Optional[str]]:
+    start = int(request.query.get(token_param, 0))
+    end = start + page_size
+    return items[start:end], (str(end) if end < len(items) else None)
+
+
+@dataclass
+class ApiStub:
+    """
+    base of the stand-ins: every request waits out latency, is counted per endpoint (in requests)
+    and a throttle_ratio share of them is answered with 429 & Retry-After.
+    the bytes of the (JSON) responses are counted per endpoint too (in response_bytes) where they're large.
+    with etags, GETs of resources and lists carry an ETag and are answered with 304 when it's matched (If-None-Match)
+    """
+    latency: float = 0.02
+    throttle_ratio: float = 0.0
+    retry_after: float = 1.0
+    seed: int = 0
+    etags: bool = True
+    requests: Counter = field(default_factory=Counter)
+    response_bytes: Counter = field(default_factory=Counter)
+
+    def __post_init__(self):
+        self._throttle_random = random.Random(self.seed)
+
+    def routes(self) -> List[web.RouteDef]:
+        raise NotImplementedError
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes(self.routes())
+        return app
+
+    async def _serve(self, endpoint: str) -> Optional[web.Response]:
+        """
+        count the request and wait out the latency. returns the response of throttled requests
+        """
+        self.requests[endpoint] += 1
+        await asyncio.sleep(self.latency)
+        if self.throttle_ratio and self._throttle_random.random() < self.throttle_ratio:
+            self.requests["throttled"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(self.retry_after)})
+        return None
+
+    def _json_response(self, endpoint: str, request: web.Request, data: dict) -> web.Response:
+        body = json.dumps(data).encode()
+        headers = {}
+        if self.etags:
+            headers["ETag"] = etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if request.headers.get("If-None-Match") == etag:
+                self.requests["not_modified"] += 1
+                return web.Response(status=304, headers=headers)
+        self.response_bytes[endpoint] += len(body)
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+
+@dataclass
+class GcpComputeStub(ApiStub):
+    """
+    serves the zonal and aggregated instances list endpoints of the Compute API, its projects lookup
+    (the last compute_disabled_projects projects answer 403, like projects without the Compute API)
+    and the projects list of the Resource Manager API.
+    instances carry a share of the fields real ones do; a fields mask (any) is taken as the one Felix sends -
+    the instances are cut down to INSTANCE_FIELDS and, in the aggregated list, zones without matches are left out
+    """
+    projects_count: int = 50
+    instances_per_project: int = 20
+    zones_per_project: int = 2
+    page_size: int = 500
+    projects_page_size: int = 500
+    compute_disabled_projects: int = 0
+    instances: Dict[str, Dict[str, List[dict]]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        super().__post_init__()
+        rand = random.Random(self.seed)
+        for p in range(self.projects_count):
+            project = f"project-{p}"
+            zones = rand.sample(GCP_ZONES_LIST, self.zones_per_project)
+            self.instances[project] = {zone: [] for zone in zones}
+            for i in range(self.instances_per_project):
+                zone = zones[i % len(zones)]
+                self.instances[project][zone].append(
+                    {
+                        "id": f"{p}{i}",
+                        "name": f"{project}-vm-{i}",
+                        "status": "RUNNING",
+                        "zone": zone,
+                        "machineType": f"zones/{zone}/machineTypes/e2-standard-4",
+                        "creationTimestamp": "2020-11-01T10:00:00.000-07:00",
+                        "networkInterfaces": [
+                            {"network": "global/networks/default", "networkIP": f"10.0.{p % 256}.{i % 256}"}
+                        ],
+                        "disks": [{"boot": True, "source": f"zones/{zone}/disks/{project}-vm-{i}", "diskSizeGb": "10"}],
+                        "labels": {"env": "benchmark"},
+                    }
+                )
+
+    @staticmethod
+    def _masked(instances: List[dict], request: web.Request) -> List[dict]:
+        if "fields" not in request.query:
+            return instances
+        return [{key: instance[key] for key in INSTANCE_FIELDS} for instance in instances]
+
+    @property
+    def projects(self) -> List[str]:
+        return list(self.instances)
+
+    def routes(self) -> List[web.RouteDef]:
+        return [
+            web.get("/compute/beta/projects/{project}/zones/{zone}/instances", self.list_zonal),
+            web.get("/compute/beta/projects/{project}/aggregated/instances", self.list_aggregated),
+            web.get("/compute/v1/projects/{project}", self.get_project),
+            web.get("/v1/projects", self.list_projects),
+        ]
+
+    def _page(self, items: list, request: web.Request):
+        return _page(items, request, self.page_size, "pageToken")
+
+    async def list_projects(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("projects")
+        if throttled is not None:
+            return throttled
+        projects = [
+            {"projectId": project, "name": project, "lifecycleState": "ACTIVE"} for project in self.projects
+        ]
+        page, next_page_token = _page(projects, request, self.projects_page_size, "pageToken")
+        data = {"projects": page}
+        if next_page_token:
+            data["nextPageToken"] = next_page_token
+        return self._json_response("projects", request, data)
+
+    async def get_project(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("project")
+        if throttled is not None:
+            return throttled
+        project = request.match_info["project"]
+        if project not in self.instances:
+            return web.Response(status=404)
+        disabled = self._compute_disabled(project)
+        if disabled is not None:
+            return disabled
+        return self._json_response("project", request, {"kind": "compute#project", "name": project})
+
+    def _compute_disabled(self, project: str) -> Optional[web.Response]:
+        """
+        the error response of the Compute API for projects it isn't enabled in
+        """
+        enabled_count = self.projects_count - self.compute_disabled_projects
+        if project not in self.instances or self.projects.index(project) < enabled_count:
+            return None
+        error = {
+            "code": 403,
+            "message": f"Compute Engine API has not been used in project {project} before or it is disabled.",
+            "errors": [{"reason": "accessNotConfigured", "domain": "usageLimits"}],
+            "status": "PERMISSION_DENIED",
+        }
+        return web.json_response({"error": error}, status=403)
+
+    async def list_zonal(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("zonal")
+        if throttled is not None:
+            return throttled
+        project, zone = request.match_info["project"], request.match_info["zone"]
+        disabled = self._compute_disabled(project)
+        if disabled is not None:
+            return disabled
+        items, next_page_token = self._page(self.instances.get(project, {}).get(zone, []), request)
+        data = {"kind": "compute#instanceList", "items": self._masked(items, request)}
+        if next_page_token:
+            data["nextPageToken"] = next_page_token
+        return self._json_response("zonal", request, data)
+
+    async def list_aggregated(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("aggregated")
+        if throttled is not None:
+            return throttled
+        disabled = self._compute_disabled(request.match_info["project"])
+        if disabled is not None:
+            return disabled
+        project_instances = self.instances.get(request.match_info["project"], {})
+        flat = [instance for zone in GCP_ZONES_LIST for instance in project_instances.get(zone, [])]
+        page, next_page_token = self._page(flat, request)
+        # like the real API, every zone shows up - zones without matches only carry a warning
+        items = {f"zones/{zone}": {"warning": {"code": "NO_RESULTS_ON_PAGE"}} for zone in GCP_ZONES_LIST}
+        for instance in page:
+            scoped_list = items[f"zones/{instance['zone']}"]
+            scoped_list.pop("warning", None)
+            scoped_list.setdefault("instances", []).append(instance)
+        if "fields" in request.query:
+            items = {
+                scope: {"instances": self._masked(scoped_list["instances"], request)}
+                for scope, scoped_list in items.items() if "instances" in scoped_list
+            }
+        data = {"kind": "compute#instanceAggregatedList", "items": items}
+        if next_page_token:
+            data["nextPageToken"] = next_page_token
+        return self._json_response("aggregated", request, data)
+
+
+@dataclass
+class AzureManagementStub(ApiStub):
+    """
+    serves the subscriptions list and the VMs list (statusOnly) endpoints of Azure Resource Manager,
+    and Resource Graph queries (every query is answered with the running VMs of its subscriptions)
+    """
+    subscriptions_count: int = 5
+    vms_per_subscription: int = 200
+    # every 1 / running_ratio VM is running
+    running_ratio: float = 0.25
+    page_size: int = 1000
+    vms: Dict[str, List[dict]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        super().__post_init__()
+        running_every = max(int(1 / self.running_ratio), 1) if self.running_ratio else self.vms_per_subscription + 1
+        for s in range(self.subscriptions_count):
+            subscription_id = f"00000000-0000-0000-0000-{s:012}"
+            self.vms[subscription_id] = [
+                self._make_vm(subscription_id, s, i, running=i % running_every == 0)
+                for i in range(self.vms_per_subscription)
+            ]
+
+    @staticmethod
+    def _make_vm(subscription_id: str, s: int, i: int, running: bool) -> dict:
+        name = f"vm-{s}-{i}"
+        power_state = "running" if running else "deallocated"
+        return {
+            "name": name,
+            "id": f"/subscriptions/{subscription_id}/resourceGroups/rg-{i % 10}"
+                  f"/providers/Microsoft.Compute/virtualMachines/{name}",
+            "type": "Microsoft.Compute/virtualMachines",
+            "location": "westeurope",
+            "properties": {
+                "vmId": f"{s:08}-0000-0000-0000-{i:012}",
+                "instanceView": {
+                    "statuses": [
+                        {"code": "ProvisioningState/succeeded", "level": "Info"},
+                        {"code": f"PowerState/{power_state}", "level": "Info"},
+                    ],
+                },
+            },
+        }
+
+    def routes(self) -> List[web.RouteDef]:
+        return [
+            web.get("/subscriptions", self.list_subscriptions),
+            web.get("/subscriptions/{subscription}/providers/Microsoft.Compute/virtualMachines", self.list_vms),
+            web.post("/providers/Microsoft.ResourceGraph/resources", self.query_resource_graph),
+        ]
+
+    async def list_subscriptions(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("subscriptions")
+        if throttled is not None:
+            return throttled
+        value = [
+            {"subscriptionId": subscription_id, "displayName": f"Subscription {s}"}
+            for s, subscription_id in enumerate(self.vms)
+        ]
+        return self._json_response("subscriptions", request, {"value": value})
+
+    async def list_vms(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("vms")
+        if throttled is not None:
+            return throttled
+        vms = self.vms.get(request.match_info["subscription"])
+        if vms is None:
+            return web.Response(status=404)
+        page, next_skip_token = _page(vms, request, self.page_size, "$skiptoken")
+        data = {"value": page}
+        if next_skip_token:
+            data["nextLink"] = str(request.url.update_query({"$skiptoken": next_skip_token}))
+        return self._json_response("vms", request, data)
+
+    async def query_resource_graph(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("resource-graph")
+        if throttled is not None:
+            return throttled
+        body = await request.json()
+        rows = [
+            {
+                "vmId": vm["properties"]["vmId"],
+                "name": vm["name"],
+                "resourceGroup": vm["id"].split("/")[4],
+                "subscriptionId": subscription_id,
+            }
+            for subscription_id in sorted(body["subscriptions"])
+            for vm in self.vms.get(subscription_id, [])
+            if vm["properties"]["instanceView"]["statuses"][1]["code"] == "PowerState/running"
+        ]
+        options = body.get("options", {})
+        start = int(options.get("$skipToken", 0))
+        end = start + min(options.get("$top", self.page_size), self.page_size)
+        page = rows[start:end]
+        data = {"totalRecords": len(rows), "count": len(page), "resultTruncated": "false", "data": page}
+        if end < len(rows):
+            data["$skipToken"] = str(end)
+        return web.json_response(data)
+
+
+@dataclass
+class ChannelStub(ApiStub):
+    """
+    serves what the bot calls back on a channel's service url: the Connector API (replies & updates)
+    and the token service - every user is signed in to every connection (with a token of its own)
+    """
+    latency: float = 0.002
+    # replies whose text starts with one of these are counted as errors
+    error_texts: Sequence[str] = ("The bot encountered an error",)
+    errors: int = 0
+
+    def __post_init__(self):
+        super().__post_init__()
+        self._ids = itertools.count()
+
+    def routes(self) -> List[web.RouteDef]:
+        return [
+            web.post("/v3/conversations/{conversation}/activities", self.send_activity),
+            web.post("/v3/conversations/{conversation}/activities/{activity}", self.send_activity),
+            web.put("/v3/conversations/{conversation}/activities/{activity}", self.update_activity),
+            web.get("/api/usertoken/GetToken", self.get_token),
+            web.delete("/api/usertoken/SignOut", self.sign_out),
+        ]
+
+    async def send_activity(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("activities")
+        if throttled is not None:
+            return throttled
+        activity = await request.json()
+        if (activity.get("text") or "").startswith(tuple(self.error_texts)):
+            self.errors += 1
+        return web.json_response({"id": str(next(self._ids))})
+
+    async def update_activity(self, request: web.Request) -> web.Response:
+        throttled = await self._serve("updates")
+        if throttled is not None:
+            return throttled
+        return web.json_response({"id": request.match_info["activity"]})
+
+    async def get_token(self, request: web.Request) -> web.Response:
+        self.requests["tokens"] += 1
+        connection_name = request.query["connectionName"]
+        return web.json_response({
+            "channelId": request.query.get("channelId"),
+            "connectionName": connection_name,
+            "token": f"{connection_name}-{request.query['userId']}",
+            "expiration": "2099-01-01T00:00:00Z",
+        })
+
+    async def sign_out(self, request: web.Request) -> web.Response:
+        self.requests["sign-outs"] += 1
+        return web.json_response({})
+
+
+async def start_app(app: web.Application) -> Tuple[web.AppRunner, int]:
+    """
+    start app on a random local port and return its runner & port
+    """
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, port
+
+
+def quiet_logs(levels: Sequence[str] = ("debug",)):
+    """
+    drop the per-request debug logs (or the logs of other levels) so they don't drown the benchmark output
+    """
+    def drop_levels(logger, method_name, event_dict):
+        if method_name in levels:
+            raise structlog.DropEvent
+        return event_dict
+
+    structlog.configure(processors=[drop_levels] + structlog.get_config()["processors"])
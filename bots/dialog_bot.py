@@ -1,10 +1,13 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+import asyncio
+
 from botbuilder.core import ConversationState, UserState, TurnContext
 from botbuilder.core.teams import TeamsActivityHandler
 from botbuilder.dialogs import Dialog
 from helpers.dialog_helper import DialogHelper
+from telemetry import DEFAULT_TRACER
 
 
 class DialogBot(TeamsActivityHandler):
@@ -28,11 +31,21 @@ class DialogBot(TeamsActivityHandler):
         self.dialog = dialog
 
     async def on_turn(self, turn_context: TurnContext):
-        await super().on_turn(turn_context)
+        # the root span of everything the turn does
+        with DEFAULT_TRACER.span(
+            "turn",
+            activity_type=turn_context.activity.type,
+            channel_id=turn_context.activity.channel_id,
+        ):
+            await super().on_turn(turn_context)
 
-        # Save any state changes that might have occurred during the turn.
-        await self.conversation_state.save_changes(turn_context, False)
-        await self.user_state.save_changes(turn_context, False)
+            # Save any state changes that might have occurred during the turn.
+            # only changed states are written, together (a single batch with the durable storages)
+            with DEFAULT_TRACER.span("save_state"):
+                await asyncio.gather(
+                    self.conversation_state.save_changes(turn_context, False),
+                    self.user_state.save_changes(turn_context, False),
+                )
 
     async def on_message_activity(self, turn_context: TurnContext):
         await DialogHelper.run_dialog(
@@ -1,9 +1,16 @@
-from .azure import get_azure_vms_card, AZURE_VMS_CARD_MAX_VMS
-from .gcp import get_gcp_instances_card, GCP_INSTANCES_CARD_MAX_INSTANCES
+from .engine import TableCard, CardPacker, group_by_size, MESSAGE_MAX_BYTES
+from .azure import get_azure_vms_cards, get_azure_vm_row, AZURE_VMS_CARD
+from .gcp import get_gcp_instances_cards, get_gcp_instance_row, GCP_INSTANCES_CARD
 
 __all__ = [
-    "get_azure_vms_card",
-    "AZURE_VMS_CARD_MAX_VMS",
-    "get_gcp_instances_card",
-    "GCP_INSTANCES_CARD_MAX_INSTANCES",
+    "TableCard",
+    "CardPacker",
+    "group_by_size",
+    "MESSAGE_MAX_BYTES",
+    "get_azure_vms_cards",
+    "get_azure_vm_row",
+    "AZURE_VMS_CARD",
+    "get_gcp_instances_cards",
+    "get_gcp_instance_row",
+    "GCP_INSTANCES_CARD",
 ]
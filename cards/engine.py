@@ -0,0 +1,232 @@
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from botbuilder.core import CardFactory
+from botbuilder.schema import Attachment
+
+from telemetry import DEFAULT_TRACER
+
+# Bot Framework channels (Teams in particular) reject messages larger than ~28KB.
+# keep some room for the activity envelope
+MESSAGE_MAX_BYTES = 26 * 1024
+
+INDEX_COLUMN_WIDTH = "10"
+
+# separator added when appending to a JSON list (json.dumps default separators)
+_ITEM_SEPARATOR_BYTES = len(", ")
+
+# appended to the text of a cell that was cut so its row fits in a card
+ELLIPSIS = "\u2026"
+
+
+def _text_block(text: str, wrap: bool = False, is_subtle: bool = False) -> dict:
+    return {
+        "type": "TextBlock",
+        "text": text,
+        "wrap": wrap,
+        "isSubtle": is_subtle,
+    }
+
+
+def _serialized_size(data) -> int:
+    # ensure_ascii (the default) makes the length equal to the number of bytes on the wire
+    return len(json.dumps(data))
+
+
+def _serialized_text_size(text: str) -> int:
+    # how much longer a TextBlock gets with text instead of an empty one (not counting the quotes)
+    return len(encode_basestring_ascii(text)) - 2
+
+
+def _truncate_text(text: str, max_size: int) -> str:
+    """
+    the longest prefix of text (followed by an ellipsis) whose serialized size is at most max_size
+    """
+    max_size -= _serialized_text_size(ELLIPSIS)
+    if max_size < 0:
+        return ""
+    size = 0
+    for end, char in enumerate(text):
+        size += _serialized_text_size(char)
+        if size > max_size:
+            return text[:end] + ELLIPSIS
+    return text
+
+
+def _truncate_row(row: Sequence[str], excess: int) -> List[str]:
+    """
+    cut the texts of row, longest first, until they're excess (serialized) bytes shorter
+    """
+    row = list(row)
+    sizes = list(map(_serialized_text_size, row))
+    while excess > 0 and any(sizes):
+        i = max(range(len(sizes)), key=sizes.__getitem__)
+        row[i] = _truncate_text(row[i], max(sizes[i] - excess, 0))
+        size = _serialized_text_size(row[i])
+        excess -= sizes[i] - size
+        sizes[i] = size
+    return row
+
+
+class TableCard:
+    """
+    adaptive card template of a numbered table of text columns (a header row followed by the rows).
+    the card scaffold is built once and shared (never mutated) by the cards rendered from it;
+    rows are packed into cards by their serialized size so every card fits in a single message
+    """
+
+    def __init__(self, columns: Sequence[Tuple[str, str]], max_bytes: int = MESSAGE_MAX_BYTES):
+        """
+        columns are (header, width) pairs, not including the index column
+        """
+        self.max_bytes = max_bytes
+        self.widths = (INDEX_COLUMN_WIDTH,) + tuple(width for _, width in columns)
+        self.header = {
+            "type": "ColumnSet",
+            "columns": [
+                {
+                    "type": "Column",
+                    "width": INDEX_COLUMN_WIDTH,
+                    "items": [{"type": "TextBlock", "text": "", "wrap": True}],
+                },
+            ] + [
+                {
+                    "type": "Column",
+                    "width": width,
+                    "items": [_text_block(text=header, wrap=True, is_subtle=True)],
+                }
+                for header, width in columns
+            ],
+        }
+        self.index_block = _text_block(text="", is_subtle=True)
+        self.cell_block = _text_block(text="")
+        # the size of a row's blocks with empty texts - only the texts vary between rows so they're serialized alone
+        self.row_base_size = (
+            _serialized_size(self.index_block) + _ITEM_SEPARATOR_BYTES
+            + (_serialized_size(self.cell_block) + _ITEM_SEPARATOR_BYTES) * (len(self.widths) - 1)
+        )
+        self.empty_card_size = _serialized_size(self._get_card(title=None, columns_items=[[] for _ in self.widths]))
+
+    def packer(self, title: Optional[str] = None, start_idx: int = 1) -> "CardPacker":
+        return CardPacker(template=self, title=title, next_idx=start_idx)
+
+    def render(self, rows: Iterable[Sequence[str]], title: Optional[str] = None, start_idx: int = 1) -> List[Attachment]:
+        """
+        render rows (a text per column) into as many cards as needed
+        """
+        with DEFAULT_TRACER.span("render_cards") as span:
+            packer = self.packer(title=title, start_idx=start_idx)
+            cards = [card for card in map(packer.add, rows) if card]
+            card = packer.flush()
+            if card:
+                cards.append(card)
+            span.set_attribute("rows", packer.next_idx - start_idx)
+            span.set_attribute("cards", len(cards))
+            return cards
+
+    def get_title_size(self, title: Optional[str]) -> int:
+        if not title:
+            return 0
+        return _serialized_size(self._get_title(title)) + _ITEM_SEPARATOR_BYTES
+
+    def get_attachment(self, title: Optional[str], columns_items: List[List[dict]]) -> Attachment:
+        return CardFactory.adaptive_card(card=self._get_card(title=title, columns_items=columns_items))
+
+    def _get_card(self, title: Optional[str], columns_items: List[List[dict]]) -> dict:
+        body = [
+            self.header,
+            {
+                "type": "ColumnSet",
+                "columns": [
+                    {"type": "Column", "width": width, "items": items}
+                    for width, items in zip(self.widths, columns_items)
+                ],
+            },
+        ]
+        if title:
+            body.insert(0, self._get_title(title))
+        return {
+            "type": "AdaptiveCard",
+            "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+            "version": "1.2",
+            "body": body,
+        }
+
+    @staticmethod
+    def _get_title(title: str) -> dict:
+        title_block = _text_block(text=title, wrap=True)
+        title_block["weight"] = "Bolder"
+        return title_block
+
+
+class CardPacker:
+    """
+    packs rows, one at a time, into cards of a TableCard template.
+    add() hands back the current card once the next row doesn't fit in it.
+    a row that doesn't fit even in a card of its own has its longest texts cut (see _truncate_row)
+    """
+
+    def __init__(self, template: TableCard, title: Optional[str], next_idx: int):
+        self.template = template
+        self.title = title
+        self.next_idx = next_idx
+        self._base_size = template.empty_card_size + template.get_title_size(title)
+        self._reset()
+
+    def add(self, row: Sequence[str]) -> Optional[Attachment]:
+        """
+        add a row; returns the previous card if it's full
+        """
+        index_text = f"{self.next_idx}."
+        row_size = self.template.row_base_size + len(index_text) + sum(map(_serialized_text_size, row))
+        excess = self._base_size + row_size - self.template.max_bytes
+        if excess > 0:
+            row = _truncate_row(row, excess)
+            row_size = self.template.row_base_size + len(index_text) + sum(map(_serialized_text_size, row))
+        card = None
+        if self._rows and self._size + row_size > self.template.max_bytes:
+            card = self.flush()
+
+        # literals rather than copies of the template's blocks - this is the hot path
+        self._index_items.append({"type": "TextBlock", "text": index_text, "wrap": False, "isSubtle": True})
+        for items, text in zip(self._cells_items, row):
+            items.append({"type": "TextBlock", "text": text, "wrap": False, "isSubtle": False})
+        self._size += row_size
+        self._rows += 1
+        self.next_idx += 1
+        return card
+
+    def flush(self) -> Optional[Attachment]:
+        """
+        return the current card (None if it has no rows)
+        """
+        if not self._rows:
+            return None
+        card = self.template.get_attachment(title=self.title, columns_items=self._columns_items)
+        self._reset()
+        return card
+
+    def _reset(self):
+        self._columns_items = [[] for _ in self.template.widths]
+        self._index_items, *self._cells_items = self._columns_items
+        self._size = self._base_size
+        self._rows = 0
+
+
+def group_by_size(cards: List[Attachment], max_bytes: int = MESSAGE_MAX_BYTES) -> List[List[Attachment]]:
+    """
+    group cards into messages that fit in max_bytes (every card gets a message of its own if it's too big)
+    """
+    groups = []
+    group, group_size = [], 0
+    for card in cards:
+        card_size = _serialized_size(card.content) + _ITEM_SEPARATOR_BYTES
+        if group and group_size + card_size > max_bytes:
+            groups.append(group)
+            group, group_size = [], 0
+        group.append(card)
+        group_size += card_size
+    if group:
+        groups.append(group)
+    return groups
@@ -1,5 +1,31 @@
-from .azure import Client as AzureClient
+from .azure import Client as AzureClient, VmsBackend
 from .gcp import Client as GcpClient
+from .cache import InventoryCache
+from .capabilities import COMPUTE_ENGINE_API, CapabilityIndex
+from .coalescer import RequestCoalescer
+from .credentials import AzureClientCredential, GcpMetadataCredential, ServiceCredential
+from .factory import ClientFactory
+from .page_memo import PageMemo
+from .pool import ConnectionPool
+from .response_cache import ResponseCache
+from .scheduler import Priority, Scheduler, priority
 
-__all__ = ["AzureClient", "GcpClient"]
-
+__all__ = [
+    "AzureClient",
+    "VmsBackend",
+    "GcpClient",
+    "ClientFactory",
+    "AzureClientCredential",
+    "GcpMetadataCredential",
+    "ServiceCredential",
+    "ConnectionPool",
+    "InventoryCache",
+    "ResponseCache",
+    "PageMemo",
+    "RequestCoalescer",
+    "CapabilityIndex",
+    "COMPUTE_ENGINE_API",
+    "Priority",
+    "Scheduler",
+    "priority",
+]
@@ -1,70 +1,286 @@
-import urllib.parse as urlparse
-from typing import List, Tuple, Optional, Callable, Dict
-from dataclasses import dataclass
-from http_noah.async_client import AsyncHTTPClient
+import functools
+from enum import Enum
+from http import HTTPStatus
+from typing import AsyncIterator, Hashable, List, Tuple, Optional, Callable, Union
+from dataclasses import dataclass, field
+from http_noah.async_client import HTTPError, JSONData
 
 from cloud_models.azure import Subscription, Vm, VmPowerState
+from .cache import InventoryCache, cached
+from .coalescer import DEFAULT_COALESCER, RequestCoalescer
+from .http import HTTPClient
+from .page_memo import PageMemo
+from .paging import iter_pipelined
+from .pool import DEFAULT_POOL, ConnectionPool
+from .response_cache import ResponseCache
+from .scheduler import DEFAULT_SCHEDULER, Scheduler
 
 
 @dataclass
 class Subscriptions:
-    client: AsyncHTTPClient
+    client: HTTPClient
+    cache: Optional[InventoryCache] = None
     list_path: str = "subscriptions"
     api_version: str = "2020-01-01"
 
     async def list(self) -> List[Subscription]:
+        return await cached(self.cache, self.client.identity, ("subscriptions",), self._list)
+
+    async def _list(self) -> List[Subscription]:
         data = await self.client.get(
             path=self.list_path,
             query_params={"api-version": self.api_version},
             response_type=dict,
         )
-        return [Subscription(id=sub["subscriptionId"], name=sub["displayName"]) for sub in data["value"]]
+        return [Subscription.from_trusted(id=sub["subscriptionId"], name=sub["displayName"]) for sub in data["value"]]
+
+
+RUNNING_POWER_STATE_CODE = f"PowerState/{VmPowerState.running.value}"
 
 
 @dataclass
 class Vms:
-    client: AsyncHTTPClient
+    client: HTTPClient
+    cache: Optional[InventoryCache] = None
     list_all_path: str = "subscriptions/{subscription_id}/providers/Microsoft.Compute/virtualMachines"
     api_version: str = "2020-06-01"
 
     async def list_all(
-            self, subscription: Subscription, filter_func: Callable[[Vm], bool] = None, next_link: str = None
+            self,
+            subscription: Subscription,
+            filter_func: Callable[[Vm], bool] = None,
+            next_link: str = None,
+            on_next_link: Callable[[Optional[str]], None] = None,
+            raw_filter_func: Callable[[dict], bool] = None,
+            build_key: Optional[Hashable] = None,
     ) -> Tuple[List[Vm], Optional[str]]:
         """
         list all VMs in subscriptions
         next link is for getting the next page of results
         filter func for filtering only vms that match filter conditions
+        on next link is called with the next link as soon as the page is done
+        raw filter func is a cheaper pre-filter on the raw vm data - vms it rejects are never built
+        the page is parsed as it streams in, one vm at a time, so its raw data is never held in memory as a whole.
+        build key names what the filters make of a page - a page whose body didn't change since is returned as it was
+        built rather than built again (see PageMemo; None - always built)
         """
+        async def build(vms_data: AsyncIterator[dict]) -> List[Vm]:
+            vms = []
+            async for vm_data in vms_data:
+                if raw_filter_func and not raw_filter_func(vm_data):
+                    continue
+                vm = Vm.from_raw_data(data=vm_data)
+                if not filter_func or filter_func(vm):
+                    vms.append(vm)
+            return vms
+
+        extra = {}
         if next_link:
-            next_link_parsed = urlparse.urlparse(next_link)
-            path = next_link_parsed.path
-            parsed_query_params: Dict[str, List] = urlparse.parse_qs(next_link_parsed.query)
-            query_params: Dict[str, str] = dict((k, v[0]) for k, v in parsed_query_params.items())  # convert dict style
+            # next link is a complete URL (including the query params) - request it as is
+            vms = await self.client.get_json_items_page("value", build, build_key, url=next_link, extra=extra)
         else:
-            path = self.list_all_path.format(subscription_id=subscription.id)
-            query_params = {"api-version": self.api_version, "statusOnly": "true"}
+            vms = await self.client.get_json_items_page(
+                "value",
+                build,
+                build_key,
+                path=self.list_all_path.format(subscription_id=subscription.id),
+                query_params={"api-version": self.api_version, "statusOnly": "true"},
+                extra=extra,
+            )
 
-        data = await self.client.get(
-            path=path,
-            query_params=query_params,
-            response_type=dict,
-        )
+        next_link = extra.get("nextLink")
+        if on_next_link:
+            on_next_link(next_link)
 
-        vms = []
-        for vm_data in data["value"]:
-            vm = Vm.from_raw_data(data=vm_data)
-            if not filter_func or filter_func(vm):
-                vms.append(vm)
+        return vms, next_link
 
-        return vms, data.get("nextLink")
+    async def can_list(self, subscription: Subscription) -> bool:
+        """
+        whether this user may list the VMs of the whole subscription (not just of some of its resource groups), cached.
+        VMs that weren't listed with the user's own token (e.g., snapshots) are only shown to the user if so
+        """
+        return await cached(
+            self.cache,
+            self.client.identity,
+            ("can-list-vms", subscription.id),
+            functools.partial(self._can_list, subscription=subscription),
+        )
+
+    async def _can_list(self, subscription: Subscription) -> bool:
+        try:
+            # the first page - it's cached for the listing that likely follows
+            await self.list_all_running_vms(subscription=subscription)
+        except HTTPError as e:
+            if e.status == HTTPStatus.FORBIDDEN:
+                return False
+            raise
+        return True
 
     async def list_all_running_vms(
-            self, subscription: Subscription, next_link: str = None
+            self, subscription: Subscription, next_link: str = None, on_next_link: Callable[[Optional[str]], None] = None
+    ) -> Tuple[List[Vm], Optional[str]]:
+        """
+        list running VMs in subscription (cached per page)
+        on next link is only called when the page isn't served from the cache
+        """
+        return await cached(
+            self.cache,
+            self.client.identity,
+            ("running-vms", subscription.id, next_link),
+            functools.partial(
+                self._list_all_running_vms, subscription=subscription, next_link=next_link, on_next_link=on_next_link
+            ),
+        )
+
+    async def _list_all_running_vms(
+            self, subscription: Subscription, next_link: str = None, on_next_link: Callable[[Optional[str]], None] = None
     ) -> Tuple[List[Vm], Optional[str]]:
-        def filter_func(vm: Vm):
-            return vm.power_state == VmPowerState.running
+        def raw_filter_func(vm_data: dict):
+            # the Compute API can't filter by power state - skip non running vms before building them
+            return Vm.get_raw_power_state_code(vm_data) == RUNNING_POWER_STATE_CODE
+
+        return await self.list_all(
+            subscription=subscription,
+            next_link=next_link,
+            on_next_link=on_next_link,
+            raw_filter_func=raw_filter_func,
+            build_key="running-vms",
+        )
+
+    async def iter_running_vms(self, subscription: Subscription) -> AsyncIterator[Vm]:
+        """
+        iterate over the running VMs in subscription (pages are pipelined)
+        """
+        async for vm in iter_pipelined(
+            lambda next_link, on_next_link: self.list_all_running_vms(
+                subscription=subscription, next_link=next_link, on_next_link=on_next_link
+            )
+        ):
+            yield vm
+
+
+RUNNING_VMS_QUERY = """
+Resources
+| where type =~ 'microsoft.compute/virtualmachines'
+| where properties.extended.instanceView.powerState.code =~ 'PowerState/running'
+| project vmId = tostring(properties.vmId), name, resourceGroup, subscriptionId
+| order by subscriptionId asc, name asc
+"""
+
+
+@dataclass
+class ResourceGraphVms:
+    """
+    running VMs backend that queries Azure Resource Graph.
+    VMs are filtered by power state on the server so non running VMs are never transferred nor parsed,
+    and a single (paginated) query covers any number of subscriptions
+    """
+    client: HTTPClient
+    cache: Optional[InventoryCache] = None
+    query_path: str = "providers/Microsoft.ResourceGraph/resources"
+    api_version: str = "2021-03-01"
+    page_size: int = 1000
 
-        return await self.list_all(subscription=subscription, filter_func=filter_func, next_link=next_link)
+    async def query(
+            self,
+            query: str,
+            subscription_ids: List[str],
+            skip_token: str = None,
+            on_skip_token: Callable[[Optional[str]], None] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        run a Resource Graph query over subscriptions
+        skip token is for getting the next page of results
+        on skip token is called with the next skip token as soon as the page arrives
+        """
+        options = {"$top": self.page_size, "resultFormat": "objectArray"}
+        if skip_token:
+            options["$skipToken"] = skip_token
+
+        data = await self.client.post(
+            path=self.query_path,
+            body=JSONData(data={"subscriptions": subscription_ids, "query": query, "options": options}),
+            query_params={"api-version": self.api_version},
+            response_type=dict,
+        )
+
+        skip_token = data.get("$skipToken")
+        if on_skip_token:
+            on_skip_token(skip_token)
+        return data["data"], skip_token
+
+    async def list_running_vms(
+            self,
+            subscriptions: List[Subscription],
+            skip_token: str = None,
+            on_skip_token: Callable[[Optional[str]], None] = None,
+    ) -> Tuple[List[Tuple[str, Vm]], Optional[str]]:
+        """
+        list running VMs in subscriptions as (subscription id, vm) pairs ordered by subscription (cached per page)
+        """
+        return await cached(
+            self.cache,
+            self.client.identity,
+            ("running-vms-resource-graph", tuple(sorted(sub.id for sub in subscriptions)), skip_token),
+            functools.partial(
+                self._list_running_vms, subscriptions=subscriptions, skip_token=skip_token, on_skip_token=on_skip_token
+            ),
+        )
+
+    async def _list_running_vms(
+            self,
+            subscriptions: List[Subscription],
+            skip_token: str = None,
+            on_skip_token: Callable[[Optional[str]], None] = None,
+    ) -> Tuple[List[Tuple[str, Vm]], Optional[str]]:
+        rows, skip_token = await self.query(
+            query=RUNNING_VMS_QUERY,
+            subscription_ids=[sub.id for sub in subscriptions],
+            skip_token=skip_token,
+            on_skip_token=on_skip_token,
+        )
+        vms = [
+            (
+                row["subscriptionId"],
+                Vm.from_trusted(
+                    id=row["vmId"], name=row["name"], rg=row["resourceGroup"], power_state=VmPowerState.running
+                ),
+            )
+            for row in rows
+        ]
+        return vms, skip_token
+
+    async def iter_running_vms_by_subscription(
+            self, subscriptions: List[Subscription]
+    ) -> AsyncIterator[Tuple[str, Vm]]:
+        """
+        iterate over the running VMs in all subscriptions with a single query (pages are pipelined)
+        """
+        async for item in iter_pipelined(
+            lambda skip_token, on_skip_token: self.list_running_vms(
+                subscriptions=subscriptions, skip_token=skip_token, on_skip_token=on_skip_token
+            )
+        ):
+            yield item
+
+    async def can_list(self, subscription: Subscription) -> bool:
+        """
+        whether this user may list the VMs of the whole subscription, cached.
+        checked with the Compute API - Resource Graph answers with whatever part of the subscription the user may see
+        """
+        return await Vms(self.client, cache=self.cache).can_list(subscription=subscription)
+
+    async def iter_running_vms(self, subscription: Subscription) -> AsyncIterator[Vm]:
+        """
+        iterate over the running VMs in subscription (pages are pipelined)
+        """
+        async for _, vm in self.iter_running_vms_by_subscription(subscriptions=[subscription]):
+            yield vm
+
+
+class VmsBackend(str, Enum):
+    compute = "compute"  # Compute API, one listing per subscription
+    resource_graph = "resource-graph"  # Resource Graph query, one query for all subscriptions
 
 
 @dataclass
@@ -73,11 +289,34 @@ class Client:
     port: int = 443
     scheme: str = "https"
     api_base: str = ""
+    token: Optional[str] = field(default=None, repr=False)
+    pool: ConnectionPool = DEFAULT_POOL
+    scheduler: Scheduler = DEFAULT_SCHEDULER
+    cache: Optional[InventoryCache] = None
+    response_cache: Optional[ResponseCache] = None
+    coalescer: Optional[RequestCoalescer] = DEFAULT_COALESCER
+    page_memo: Optional[PageMemo] = None
+    vms_backend: VmsBackend = VmsBackend.compute
 
     def __post_init__(self):
-        self.client = AsyncHTTPClient(host=self.host, port=self.port, scheme=self.scheme, api_base=self.api_base)
-        self.subscriptions = Subscriptions(self.client)
-        self.vms = Vms(self.client)
+        self.client = HTTPClient(
+            host=self.host,
+            port=self.port,
+            scheme=self.scheme,
+            api_base=self.api_base,
+            token=self.token,
+            pool=self.pool,
+            scheduler=self.scheduler,
+            response_cache=self.response_cache,
+            coalescer=self.coalescer,
+            page_memo=self.page_memo,
+        )
+        self.subscriptions = Subscriptions(self.client, cache=self.cache)
+        self.vms: Union[Vms, ResourceGraphVms] = (
+            ResourceGraphVms(self.client, cache=self.cache)
+            if self.vms_backend == VmsBackend.resource_graph
+            else Vms(self.client, cache=self.cache)
+        )
 
     def set_auth_token(self, token: object):
         self.client.set_auth_token(str(token))
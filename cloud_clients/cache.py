@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple, TypeVar
+
+import structlog
+
+from .single_flight import SingleFlight
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Entry:
+    expires_at: float
+    value: Any
+
+
+@dataclass
+class InventoryCache:
+    """
+    TTL + LRU cache for inventory listings (subscriptions, projects, running VMs, etc.).
+    entries are keyed by identity (token subject) and resource scope.
+    concurrent loads of the same key are de-duplicated (single-flight - see SingleFlight).
+    cached values are shared between callers and must not be mutated.
+    """
+    ttl: float = 300.0
+    max_entries: int = 1024
+
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _entries: "OrderedDict[Tuple, _Entry]" = field(default_factory=OrderedDict, init=False, repr=False)
+    _loads: SingleFlight = field(default_factory=SingleFlight, init=False, repr=False)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def get_or_load(
+            self, identity: str, scope: Tuple[Hashable, ...], loader: Callable[[], Awaitable[T]]
+    ) -> T:
+        """
+        get the cached value of scope for identity, loading it with loader if missing or expired
+        """
+        key = (identity, *scope)
+        entry = self._entries.get(key)
+        if entry and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+        if key in self._loads:
+            # somebody is already loading it - wait for their result
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        async def load():
+            value = await loader()
+            self._store(key, value)
+            return value
+
+        return await self._loads.run(key, load)
+
+    def invalidate(self, identity: str):
+        """
+        drop everything cached for identity
+        """
+        for key in [key for key in self._entries if key[0] == identity]:
+            del self._entries[key]
+        logger.info("Inventory cache invalidated", identity=identity)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _store(self, key: Tuple, value: Any):
+        self._entries[key] = _Entry(expires_at=time.monotonic() + self.ttl, value=value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+async def cached(
+        cache: Optional[InventoryCache], identity: str, scope: Tuple[Hashable, ...], loader: Callable[[], Awaitable[T]]
+) -> T:
+    """
+    load through cache (if there is one)
+    """
+    if cache is None:
+        return await loader()
+    return await cache.get_or_load(identity=identity, scope=scope, loader=loader)
@@ -0,0 +1,117 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# the capability of GCP projects with the Compute Engine API enabled
+COMPUTE_ENGINE_API = "compute.googleapis.com"
+
+
+class CapabilityIndex:
+    """
+    index of which capabilities (e.g., an enabled API) scopes (e.g., GCP projects) have.
+    capabilities are properties of the scopes rather than of who asks about them, so the index is shared by all users.
+    it's kept in memory and, given a path, persisted (SQLite) so it survives restarts.
+    entries older than max_age (disabled_max_age for missing capabilities, which are the likelier ones to change)
+    are considered unknown, so they're re-checked lazily - the next time they're needed.
+    every process loads the index on start; what other processes learn since isn't seen until it checks for itself
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age: float = 24 * 3600.0, disabled_max_age: float = 3600.0):
+        self.path = path
+        self.max_age = max_age
+        self.disabled_max_age = disabled_max_age
+        # (capability, scope) -> (enabled, checked at)
+        self._entries: Dict[Tuple[str, str], Tuple[bool, float]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capability-index") if path else None
+        self._db: Optional[sqlite3.Connection] = None
+
+    def get(self, capability: str, scope: str) -> Optional[bool]:
+        """
+        whether scope has capability (None if unknown or too old)
+        """
+        entry = self._entries.get((capability, scope))
+        if not entry:
+            return None
+        enabled, checked_at = entry
+        max_age = self.max_age if enabled else self.disabled_max_age
+        return enabled if checked_at + max_age > time.time() else None
+
+    async def set(self, capability: str, scope: str, enabled: bool):
+        checked_at = time.time()
+        self._entries[(capability, scope)] = (enabled, checked_at)
+        if self._executor:
+            await self._run(self._set, capability, scope, enabled, checked_at)
+
+    async def forget(self, capability: str, scope: str):
+        """
+        drop what's known about scope's capability (e.g., when it turns out to be wrong) so it's checked again
+        """
+        self._entries.pop((capability, scope), None)
+        if self._executor:
+            await self._run(self._forget, capability, scope)
+
+    async def load(self, *args):
+        """
+        load the persisted index (can be used as an aiohttp on_startup signal)
+        """
+        if self._executor:
+            for capability, scope, enabled, checked_at in await self._run(self._load):
+                self._entries[(capability, scope)] = (bool(enabled), checked_at)
+            logger.info("Capability index loaded", entries=len(self._entries))
+
+    async def close(self, *args):
+        """
+        (can be used as an aiohttp on_cleanup signal)
+        """
+        if self._executor:
+            await self._run(self._close)
+            self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._db:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            # readers (e.g., other bot processes) don't block the writer and vice versa
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # a write lost to a power failure is just checked again
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS capabilities ("
+                    " capability TEXT NOT NULL, scope TEXT NOT NULL,"
+                    " enabled INTEGER NOT NULL, checked_at REAL NOT NULL,"
+                    " PRIMARY KEY (capability, scope))"
+                )
+        return self._db
+
+    def _load(self):
+        oldest = time.time() - max(self.max_age, self.disabled_max_age)
+        return self._connect().execute(
+            "SELECT capability, scope, enabled, checked_at FROM capabilities WHERE checked_at > ?", (oldest,)
+        ).fetchall()
+
+    def _set(self, capability: str, scope: str, enabled: bool, checked_at: float):
+        db = self._connect()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO capabilities (capability, scope, enabled, checked_at) VALUES (?, ?, ?, ?)",
+                (capability, scope, int(enabled), checked_at),
+            )
+
+    def _forget(self, capability: str, scope: str):
+        db = self._connect()
+        with db:
+            db.execute("DELETE FROM capabilities WHERE capability = ? AND scope = ?", (capability, scope))
+
+    def _close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
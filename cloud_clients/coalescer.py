@@ -0,0 +1,115 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+from .single_flight import SingleFlight
+
+T = TypeVar("T")
+
+_END = object()
+
+
+class _SharedStream:
+    def __init__(self):
+        # a queue per consumer
+        self.queues: List[asyncio.Queue] = []
+        self.started = False
+        self.task: Optional[asyncio.Future] = None
+
+
+class RequestCoalescer:
+    """
+    single-flight for requests: concurrent callers of the same key (e.g., identity, URL & query) share one request.
+    a request's result (or error) is shared by everyone who asked for it while it was in flight;
+    a streamed request is shared by everyone who asked for it before its first chunk arrived
+    (later callers make a request of their own - the chunks that were already consumed aren't kept).
+    every consumer of a stream has up to max_buffered_chunks chunks buffered - the stream is read as fast as its
+    slowest consumer reads it
+    """
+
+    def __init__(self, max_buffered_chunks: int = 16):
+        self.max_buffered_chunks = max_buffered_chunks
+        # callers that made a request / joined one in flight
+        self.requests = 0
+        self.coalesced = 0
+        self._in_flight = SingleFlight()
+        self._streams: Dict[Hashable, _SharedStream] = {}
+
+    @property
+    def coalesced_ratio(self) -> float:
+        total = self.requests + self.coalesced
+        return self.coalesced / total if total else 0.0
+
+    async def run(self, key: Hashable, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        the result of request, or of the request of key that's already in flight.
+        a caller that's cancelled (e.g., the one that made the request) doesn't cancel it for the rest
+        """
+        if key in self._in_flight:
+            self.coalesced += 1
+        else:
+            self.requests += 1
+        return await self._in_flight.run(key, request)
+
+    async def iter_shared(self, key: Hashable, stream: Callable[[], AsyncIterator[bytes]]) -> AsyncIterator[bytes]:
+        """
+        iterate over the chunks of stream, or of the stream of key that's in flight and hasn't started yet.
+        the stream is read by a task of its own (so one caller that stops iterating doesn't stop it for the rest),
+        which is cancelled once no caller is iterating
+        """
+        shared = self._streams.get(key)
+        if shared is None:
+            self.requests += 1
+            shared = self._streams[key] = _SharedStream()
+            shared.task = asyncio.ensure_future(self._pump(key, shared, stream()))
+        else:
+            self.coalesced += 1
+
+        queue = asyncio.Queue(maxsize=self.max_buffered_chunks)
+        shared.queues.append(queue)
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is _END:
+                    return
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield chunk
+        finally:
+            shared.queues.remove(queue)
+            # a pump that's waiting for room in the queue doesn't wait for it forever
+            while not queue.empty():
+                queue.get_nowait()
+            if not shared.queues:
+                shared.task.cancel()
+
+    async def _pump(self, key: Hashable, shared: _SharedStream, chunks: AsyncIterator[bytes]):
+        end = _END
+        try:
+            async for chunk in chunks:
+                if not shared.started:
+                    # too late to join
+                    shared.started = True
+                    self._release(key, shared)
+                await self._put(shared, chunk)
+        except asyncio.CancelledError:
+            # nobody's iterating anymore
+            raise
+        except Exception as e:
+            end = e
+        finally:
+            self._release(key, shared)
+        await self._put(shared, end)
+
+    @staticmethod
+    async def _put(shared: _SharedStream, chunk):
+        for queue in list(shared.queues):
+            # the consumer may have stopped iterating while waiting for another consumer's queue
+            if queue in shared.queues:
+                await queue.put(chunk)
+
+    def _release(self, key: Hashable, shared: _SharedStream):
+        if self._streams.get(key) is shared:
+            del self._streams[key]
+
+
+DEFAULT_COALESCER = RequestCoalescer()
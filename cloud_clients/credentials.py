@@ -0,0 +1,96 @@
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from http_noah.async_client import FormData
+
+from .http import HTTPClient
+from .pool import DEFAULT_POOL, ConnectionPool
+from .scheduler import DEFAULT_SCHEDULER, Scheduler
+
+
+class ServiceCredential(ABC):
+    """
+    credential the bot uses on its own behalf (e.g., for background crawls) rather than on behalf of a user.
+    tokens are cached until shortly before they expire
+    """
+    refresh_margin: float = 300.0
+
+    _token: Optional[str] = None
+    _expires_at: float = 0.0
+    _lock: Optional[asyncio.Lock] = None
+
+    async def get_token(self) -> str:
+        if not self._lock:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            loop = asyncio.get_event_loop()
+            if not self._token or loop.time() >= self._expires_at - self.refresh_margin:
+                self._token, expires_in = await self._fetch_token()
+                self._expires_at = loop.time() + expires_in
+            return self._token
+
+    @abstractmethod
+    async def _fetch_token(self) -> Tuple[str, float]:
+        """
+        return a new token and the number of seconds it's valid for
+        """
+
+
+@dataclass
+class AzureClientCredential(ServiceCredential):
+    """
+    Azure AD application (service principal) credential, using the OAuth client credentials flow
+    """
+    tenant_id: str
+    client_id: str
+    client_secret: str = field(repr=False)
+    scope: str = "https://management.azure.com/.default"
+    host: str = "login.microsoftonline.com"
+    port: int = 443
+    scheme: str = "https"
+    pool: ConnectionPool = DEFAULT_POOL
+    scheduler: Scheduler = DEFAULT_SCHEDULER
+
+    async def _fetch_token(self) -> Tuple[str, float]:
+        client = HTTPClient(
+            host=self.host, port=self.port, scheme=self.scheme, api_base="", pool=self.pool, scheduler=self.scheduler
+        )
+        data = await client.post(
+            path=f"{self.tenant_id}/oauth2/v2.0/token",
+            body=FormData(data={
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "scope": self.scope,
+            }),
+            response_type=dict,
+        )
+        return data["access_token"], float(data["expires_in"])
+
+
+@dataclass
+class GcpMetadataCredential(ServiceCredential):
+    """
+    credential of the service account attached to the GCP resource the bot runs on (taken from the metadata server)
+    """
+    host: str = "metadata.google.internal"
+    port: int = 80
+    scheme: str = "http"
+    token_path: str = "computeMetadata/v1/instance/service-accounts/default/token"
+    pool: ConnectionPool = DEFAULT_POOL
+    scheduler: Scheduler = DEFAULT_SCHEDULER
+
+    async def _fetch_token(self) -> Tuple[str, float]:
+        client = HTTPClient(
+            host=self.host,
+            port=self.port,
+            scheme=self.scheme,
+            api_base="",
+            headers={"Metadata-Flavor": "Google"},
+            pool=self.pool,
+            scheduler=self.scheduler,
+        )
+        data = await client.get(path=self.token_path, response_type=dict)
+        return data["access_token"], float(data["expires_in"])
@@ -0,0 +1,67 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .azure import Client as AzureClient
+from .cache import InventoryCache
+from .capabilities import CapabilityIndex
+from .coalescer import DEFAULT_COALESCER, RequestCoalescer
+from .gcp import Client as GcpClient
+from .identity import token_identity
+from .page_memo import PageMemo
+from .pool import DEFAULT_POOL, ConnectionPool
+from .response_cache import ResponseCache
+from .scheduler import DEFAULT_SCHEDULER, Scheduler
+
+
+@dataclass
+class ClientFactory:
+    """
+    creates per-turn client views.
+    each view carries its own token; all views share the pooled connections, the scheduler, the request coalescer,
+    the inventory cache, the response cache, the page memo and the capability index.
+    azure/gcp options are passed as is to the clients (e.g., for pointing them to other hosts)
+    """
+    pool: ConnectionPool = DEFAULT_POOL
+    scheduler: Scheduler = DEFAULT_SCHEDULER
+    coalescer: Optional[RequestCoalescer] = DEFAULT_COALESCER
+    cache: Optional[InventoryCache] = None
+    capabilities: Optional[CapabilityIndex] = None
+    response_cache: Optional[ResponseCache] = None
+    page_memo: Optional[PageMemo] = None
+    azure_options: dict = field(default_factory=dict)
+    gcp_options: dict = field(default_factory=dict)
+
+    def azure(self, token: object) -> AzureClient:
+        return AzureClient(
+            token=str(token),
+            pool=self.pool,
+            scheduler=self.scheduler,
+            cache=self.cache,
+            response_cache=self.response_cache,
+            coalescer=self.coalescer,
+            page_memo=self.page_memo,
+            **self.azure_options,
+        )
+
+    def gcp(self, token: object) -> GcpClient:
+        return GcpClient(
+            token=str(token),
+            pool=self.pool,
+            scheduler=self.scheduler,
+            cache=self.cache,
+            capabilities=self.capabilities,
+            response_cache=self.response_cache,
+            coalescer=self.coalescer,
+            page_memo=self.page_memo,
+            **self.gcp_options,
+        )
+
+    def forget(self, token: object):
+        """
+        drop everything cached for the token's subject
+        """
+        if self.cache is not None:
+            self.cache.invalidate(token_identity(str(token)))
+
+    async def close(self):
+        await self.pool.close()
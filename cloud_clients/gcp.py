@@ -1,49 +1,152 @@
-from typing import List, Tuple, Optional
-from dataclasses import dataclass
+import functools
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple, Optional
+from dataclasses import dataclass, field
 from http import HTTPStatus
-from http_noah.async_client import AsyncHTTPClient, HTTPError
+from http_noah.async_client import HTTPError
 from cloud_models.gcp import Instance, InstanceState, Project
+from .cache import InventoryCache, cached
+from .coalescer import DEFAULT_COALESCER, RequestCoalescer
+from .capabilities import COMPUTE_ENGINE_API, CapabilityIndex
+from .http import HTTPClient
+from .page_memo import PageMemo
+from .paging import iter_pipelined
+from .pool import DEFAULT_POOL, ConnectionPool
+from .response_cache import ResponseCache
+from .scheduler import DEFAULT_SCHEDULER, Scheduler
+
+
+# the project's name alone - the smallest response that still tells whether the Compute Engine API is enabled
+COMPUTE_ENGINE_API_PROBE_PARAMS = {"fields": "name"}
+# 403 reasons of requests to an API that isn't enabled in the project (rather than of missing permissions)
+SERVICE_DISABLED_REASONS = {"accessNotConfigured", "SERVICE_DISABLED"}
+
+# partial responses (the fields system parameter) - only what Instance is built from, the rest of every instance
+# (disks, network interfaces, metadata..) and, in the aggregated list, the entries of zones without matches are left out
+RUNNING_INSTANCES_FIELDS = "items(id,name,status),nextPageToken"
+AGGREGATED_RUNNING_INSTANCES_FIELDS = "items/*/instances(id,name,status),nextPageToken"
+# a single instance's kind - the smallest listing that still tells whether the user may list the project's instances
+INSTANCES_ACCESS_PROBE_PARAMS = {"maxResults": "1", "fields": "kind"}
+# projects being deleted (or deleted) aren't listed at all
+ACTIVE_PROJECTS_QUERY_PARAMS = {"filter": "lifecycleState:ACTIVE"}
+
+
+def _is_service_disabled(error_body) -> bool:
+    error = error_body.get("error") if isinstance(error_body, dict) else None
+    if not isinstance(error, dict):
+        return False
+    reasons = {item.get("reason") for item in error.get("errors", []) + error.get("details", [])}
+    return bool(reasons & SERVICE_DISABLED_REASONS)
 
 
 @dataclass
 class Projects:
-    resource_manager_client: AsyncHTTPClient
-    compute_client: AsyncHTTPClient
+    resource_manager_client: HTTPClient
+    compute_client: HTTPClient
+    cache: Optional[InventoryCache] = None
+    capabilities: Optional[CapabilityIndex] = None
     list_projects_path: str = "v1/projects"
     filter_compute_engine_enabled_projects_path = "compute/v1/projects/{project}"
 
     async def list(self) -> List[Project]:
         """
-        list all available projects
+        list all active projects (cached per page)
+        """
+        return [project async for project in self.iter_active()]
+
+    async def iter_active(self) -> AsyncIterator[Project]:
+        """
+        iterate over the active projects as they're listed, page after page (pages are pipelined)
         """
-        data = await self.resource_manager_client.get(path=self.list_projects_path, response_type=dict)
-        projects = []
-        filtered_out = []
-        for project_data in data.get("projects", []):
-            if project_data["lifecycleState"] != "ACTIVE":
-                # skip not active projects
-                continue
-            projects.append(Project(id=project_data["projectId"], name=project_data["name"]))
-        return projects
+        async for project in iter_pipelined(
+            lambda page_token, on_next_page_token: self.list_page(
+                page_token=page_token, on_next_page_token=on_next_page_token
+            )
+        ):
+            yield project
+
+    async def list_page(
+            self, page_token: str = None, on_next_page_token: Callable[[Optional[str]], None] = None
+    ) -> Tuple[List[Project], Optional[str]]:
+        """
+        list a page of the active projects (cached per page)
+        on next page token is only called when the page isn't served from the cache
+        """
+        return await cached(
+            self.cache,
+            self.resource_manager_client.identity,
+            ("projects", page_token),
+            functools.partial(self._list_page, page_token=page_token, on_next_page_token=on_next_page_token),
+        )
+
+    async def _list_page(
+            self, page_token: str = None, on_next_page_token: Callable[[Optional[str]], None] = None
+    ) -> Tuple[List[Project], Optional[str]]:
+        query_params = dict(ACTIVE_PROJECTS_QUERY_PARAMS)
+        if page_token:
+            query_params["pageToken"] = page_token
+
+        async def build(projects_data: AsyncIterator[dict]) -> List[Project]:
+            projects = []
+            async for project_data in projects_data:
+                if project_data["lifecycleState"] != "ACTIVE":
+                    # filtered by the server - just in case
+                    continue
+                projects.append(Project.from_trusted(id=project_data["projectId"], name=project_data["name"]))
+            return projects
+
+        extra = {}
+        projects = await self.resource_manager_client.get_json_items_page(
+            "projects", build, "projects", path=self.list_projects_path, query_params=query_params, extra=extra
+        )
+
+        next_page_token = extra.get("nextPageToken")
+        if on_next_page_token:
+            on_next_page_token(next_page_token)
+
+        return projects, next_page_token
 
     async def validate_compute_engine_api_available(self, project: Project) -> Optional[Project]:
         """
-        return the project if Compute Engine available else None
+        return the project if Compute Engine available else None.
+        answered from the capability index where it's known (and fresh), otherwise probed (cached).
+        the API being enabled doesn't mean this user may list the project's instances - the listing itself tells
         """
-        try:
-            path = self.filter_compute_engine_enabled_projects_path.format(project=project.id)
-            await self.compute_client.get(path=path, response_type=dict)
-        except HTTPError as e:
-            if e.status == HTTPStatus.FORBIDDEN:
-                return None
-            raise e
+        if self.capabilities:
+            enabled = self.capabilities.get(COMPUTE_ENGINE_API, project.id)
+            if enabled is not None:
+                return project if enabled else None
+        return await cached(
+            self.cache,
+            self.compute_client.identity,
+            ("compute-engine-api", project.id),
+            functools.partial(self._validate_compute_engine_api_available, project=project),
+        )
+
+    async def _validate_compute_engine_api_available(self, project: Project) -> Optional[Project]:
+        path = self.filter_compute_engine_enabled_projects_path.format(project=project.id)
+        status, body = await self.compute_client.get_with_status(
+            path=path, query_params=COMPUTE_ENGINE_API_PROBE_PARAMS, accept_statuses=(HTTPStatus.FORBIDDEN,)
+        )
+        if status == HTTPStatus.FORBIDDEN:
+            # only a disabled API is the project's - missing permissions are the user's (cached for them alone)
+            if self.capabilities and _is_service_disabled(body):
+                await self.capabilities.set(COMPUTE_ENGINE_API, project.id, False)
+            return None
+        if self.capabilities:
+            await self.capabilities.set(COMPUTE_ENGINE_API, project.id, True)
         return project
 
 
 @dataclass
 class Instances:
-    client: AsyncHTTPClient
+    client: HTTPClient
+    cache: Optional[InventoryCache] = None
+    capabilities: Optional[CapabilityIndex] = None
     list_instances_path: str = "compute/beta/projects/{project}/zones/{zone}/instances"
+    aggregated_list_instances_path: str = "compute/beta/projects/{project}/aggregated/instances"
+    # None for full responses
+    list_instances_fields: Optional[str] = RUNNING_INSTANCES_FIELDS
+    aggregated_list_instances_fields: Optional[str] = AGGREGATED_RUNNING_INSTANCES_FIELDS
 
     async def list_running(
             self, project: str, zone: str, next_page_token: str = None
@@ -54,32 +157,128 @@ class Instances:
         """
         path = self.list_instances_path.format(project=project, zone=zone)
         query_params = {"filter": f"status = {InstanceState.running}"}
+        if self.list_instances_fields:
+            query_params["fields"] = self.list_instances_fields
         if next_page_token:
             query_params["pageToken"] = next_page_token
 
-        data = await self.client.get(
-            path=path,
-            query_params=query_params,
-            response_type=dict,
+        async def build(instances_data: AsyncIterator[dict]) -> List[Instance]:
+            running_instances = []
+            async for instance_data in instances_data:
+
+                instance_state = instance_data["status"]
+                if instance_state != InstanceState.running:
+                    raise ValueError(f"Got an instance that is not in RUNNING state. instance_state={instance_state}")
+
+                instance = Instance.from_trusted(
+                     id=instance_data["id"],
+                     name=instance_data["name"],
+                     zone=zone,
+                     project=project,
+                     state=InstanceState.running,
+                )
+                running_instances.append(instance)
+            return running_instances
+
+        extra = {}
+        running_instances = await self.client.get_json_items_page(
+            "items", build, "running-instances", path=path, query_params=query_params, extra=extra
         )
+        return running_instances, extra.get("nextPageToken")
 
-        running_instances = []
-        for instance_data in data.get("items", []):
+    async def can_list(self, project: str) -> bool:
+        """
+        whether this user may list the instances of project (cached).
+        instances that weren't listed with the user's own token (e.g., snapshots) are only shown to the user if so
+        """
+        return await cached(
+            self.cache,
+            self.client.identity,
+            ("can-list-instances", project),
+            functools.partial(self._can_list, project=project),
+        )
+
+    async def _can_list(self, project: str) -> bool:
+        status, _ = await self._probe(project)
+        return status != HTTPStatus.FORBIDDEN
 
-            instance_state = instance_data["status"]
-            if instance_state != InstanceState.running:
-                raise ValueError(f"Got an instance that is not in RUNNING state. instance_state={instance_state}")
+    async def _probe(self, project: str) -> Tuple[int, Any]:
+        return await self.client.get_with_status(
+            path=self.aggregated_list_instances_path.format(project=project),
+            query_params=INSTANCES_ACCESS_PROBE_PARAMS,
+            accept_statuses=(HTTPStatus.FORBIDDEN,),
+        )
 
-            instance = Instance(
-                 id=instance_data["id"],
-                 name=instance_data["name"],
-                 zone=zone,
-                 project=project,
-                 state=instance_state,
+    async def list_running_aggregated(
+            self, project: str, next_page_token: str = None
+    ) -> Tuple[Dict[str, List[Instance]], Optional[str]]:
+        """
+        list running instances in all zones of project using a single (paginated) aggregated list call
+        results are grouped by zone; zones without running instances are omitted
+        next page token is for getting the next page of results (cached per page)
+        """
+        try:
+            return await cached(
+                self.cache,
+                self.client.identity,
+                ("running-instances", project, next_page_token),
+                functools.partial(self._list_running_aggregated, project=project, next_page_token=next_page_token),
             )
-            running_instances.append(instance)
+        except HTTPError as e:
+            if e.status == HTTPStatus.FORBIDDEN and self.capabilities:
+                # the API may have been disabled since it was checked - but it may just as well be this user's missing
+                # permissions, which aren't the project's (and mustn't change what everyone else gets)
+                status, body = await self._probe(project)
+                if status == HTTPStatus.FORBIDDEN and _is_service_disabled(body):
+                    await self.capabilities.set(COMPUTE_ENGINE_API, project, False)
+            raise
+
+    async def _list_running_aggregated(
+            self, project: str, next_page_token: str = None
+    ) -> Tuple[Dict[str, List[Instance]], Optional[str]]:
+        path = self.aggregated_list_instances_path.format(project=project)
+        query_params = {"filter": f"status = {InstanceState.running}"}
+        if self.aggregated_list_instances_fields:
+            query_params["fields"] = self.aggregated_list_instances_fields
+        if next_page_token:
+            query_params["pageToken"] = next_page_token
 
-        return running_instances, data.get("nextPageToken")
+        async def build(scoped_lists: AsyncIterator[Tuple[str, dict]]) -> Dict[str, List[Instance]]:
+            running_instances_by_zone = {}
+            # items is an object keyed by scope - it's streamed one scope at a time
+            async for scope, scoped_list in scoped_lists:
+                # scope is of the form "zones/<zone>"; zones without matches only carry a "warning" entry (or, in
+                # partial responses, nothing at all or aren't there)
+                instances_data = scoped_list.get("instances")
+                if not instances_data:
+                    continue
+
+                zone = scope.split("/", 1)[-1]
+                zone_instances = []
+                for instance_data in instances_data:
+
+                    instance_state = instance_data["status"]
+                    if instance_state != InstanceState.running:
+                        raise ValueError(
+                            f"Got an instance that is not in RUNNING state. instance_state={instance_state}"
+                        )
+
+                    instance = Instance.from_trusted(
+                        id=instance_data["id"],
+                        name=instance_data["name"],
+                        zone=zone,
+                        project=project,
+                        state=InstanceState.running,
+                    )
+                    zone_instances.append(instance)
+                running_instances_by_zone[zone] = zone_instances
+            return running_instances_by_zone
+
+        extra = {}
+        running_instances_by_zone = await self.client.get_json_items_page(
+            "items", build, "running-instances-aggregated", path=path, query_params=query_params, extra=extra
+        )
+        return running_instances_by_zone, extra.get("nextPageToken")
 
 
 @dataclass
@@ -89,19 +288,47 @@ class Client:
     port: int = 443
     scheme: str = "https"
     api_base: str = ""
+    token: Optional[str] = field(default=None, repr=False)
+    pool: ConnectionPool = DEFAULT_POOL
+    scheduler: Scheduler = DEFAULT_SCHEDULER
+    cache: Optional[InventoryCache] = None
+    capabilities: Optional[CapabilityIndex] = None
+    response_cache: Optional[ResponseCache] = None
+    coalescer: Optional[RequestCoalescer] = DEFAULT_COALESCER
+    page_memo: Optional[PageMemo] = None
 
     def __post_init__(self):
-        self.cloud_resource_manager_client = AsyncHTTPClient(
-            host=self.cloud_resource_manager_host, port=self.port, scheme=self.scheme, api_base=self.api_base
+        self.cloud_resource_manager_client = HTTPClient(
+            host=self.cloud_resource_manager_host,
+            port=self.port,
+            scheme=self.scheme,
+            api_base=self.api_base,
+            token=self.token,
+            pool=self.pool,
+            scheduler=self.scheduler,
+            response_cache=self.response_cache,
+            coalescer=self.coalescer,
+            page_memo=self.page_memo,
         )
-        self.compute_client = AsyncHTTPClient(
-            host=self.compute_host, port=self.port, scheme=self.scheme, api_base=self.api_base
+        self.compute_client = HTTPClient(
+            host=self.compute_host,
+            port=self.port,
+            scheme=self.scheme,
+            api_base=self.api_base,
+            token=self.token,
+            pool=self.pool,
+            scheduler=self.scheduler,
+            response_cache=self.response_cache,
+            coalescer=self.coalescer,
+            page_memo=self.page_memo,
         )
         self.projects = Projects(
             resource_manager_client=self.cloud_resource_manager_client,
             compute_client=self.compute_client,
+            cache=self.cache,
+            capabilities=self.capabilities,
         )
-        self.instances = Instances(self.compute_client)
+        self.instances = Instances(self.compute_client, cache=self.cache, capabilities=self.capabilities)
 
     def set_auth_token(self, token: object):
         token = str(token)
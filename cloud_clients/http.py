@@ -0,0 +1,350 @@
+import asyncio
+import functools
+import hashlib
+import itertools
+import json
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Collection, Dict, Hashable, List, Optional, Tuple, Type, TypeVar
+)
+
+import structlog
+import yarl
+from http_noah.async_client import AsyncHTTPClient, HTTPError, Timeout
+from http_noah.common import parse_response_data
+
+from telemetry import DEFAULT_TRACER, Span
+from .coalescer import DEFAULT_COALESCER, RequestCoalescer
+from .identity import token_identity
+from .instrumentation import get_path_template
+from .page_memo import PageMemo
+from .pool import DEFAULT_POOL, ConnectionPool
+from .response_cache import ResponseCache
+from .scheduler import DEFAULT_SCHEDULER, Scheduler
+from .streaming import JsonItemsParser
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+async def _iter_parsed(parser: JsonItemsParser, chunks: List[bytes]) -> AsyncIterator[Any]:
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.close():
+        yield item
+
+
+@dataclass
+class HTTPClient(AsyncHTTPClient):
+    """
+    lightweight AsyncHTTPClient view.
+    carries its own auth token, borrows a pooled session and dispatches its requests through the scheduler.
+    concurrent identical GETs are coalesced into one (see RequestCoalescer)
+    and GETs go through the response cache, if there is one (JSON responses only).
+    pages that are built into models can skip the build when their body didn't change (see PageMemo)
+    """
+    token: Optional[str] = field(default=None, repr=False)
+    token_type: str = "Bearer"
+    # sent with every request (on top of the auth header)
+    headers: Dict[str, str] = field(default_factory=dict)
+    pool: ConnectionPool = DEFAULT_POOL
+    scheduler: Scheduler = DEFAULT_SCHEDULER
+    response_cache: Optional[ResponseCache] = None
+    coalescer: Optional[RequestCoalescer] = DEFAULT_COALESCER
+    page_memo: Optional[PageMemo] = None
+
+    def __post_init__(self):
+        self.url = yarl.URL.build(host=self.host, port=self.port, scheme=self.scheme, path=self.api_base)
+        self.session = self.pool.get_session(scheme=self.scheme, host=self.host, port=self.port)
+
+    @property
+    def identity(self) -> str:
+        return token_identity(self.token)
+
+    def set_auth_token(self, token: str, type: str = "Bearer"):
+        # never touch the session's default headers - the session is shared with other users
+        self.token = token
+        self.token_type = type
+
+    async def get_url(self, url: str, response_type: Optional[Type] = None, timeout: Optional[Timeout] = None):
+        """
+        GET an absolute URL (e.g., a next page link) as is.
+        the URL must point to this client's host as the request carries the client's token
+        """
+        url = self._get_request_url(url=url)
+        return await self._request(self.session.get, url, response_type=response_type, timeout=timeout)
+
+    async def get_with_status(
+        self, path: str, query_params: Optional[dict] = None, accept_statuses: Collection[int] = ()
+    ) -> Tuple[int, Any]:
+        """
+        GET path and return the response's status and JSON body (None if it has none).
+        responses with error statuses in accept_statuses are returned (with their error bodies) rather than raised
+        """
+        url = self._get_request_url(path)
+        kwargs = self._convert_options(self.options)
+
+        with DEFAULT_TRACER.span(f"GET {get_path_template(url.path)}", host=self.host, path=url.path):
+            status, body = await self._get_body(url, query_params, accept_statuses=accept_statuses, **kwargs)
+        try:
+            return status, json.loads(body) if body else None
+        except ValueError:
+            return status, None
+
+    async def iter_json_items(
+        self,
+        items_key: str,
+        path: Optional[str] = None,
+        url: Optional[str] = None,
+        query_params: Optional[dict] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        timeout: Optional[Timeout] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        GET a JSON object and iterate over the items under its items_key as they arrive from the socket
+        (see JsonItemsParser), instead of loading the whole response at once.
+        either path (like get()) or an absolute url of this client's host (like get_url()) should be given.
+        the object's other top level members (e.g., next page links) are put into extra once the response is done.
+        """
+        url = self._get_request_url(path, url)
+        logger.debug("Performing streamed request", url=url, query_params=query_params)
+
+        # not made current - the generator runs in its consumer's context
+        span = DEFAULT_TRACER.start_span(f"GET {get_path_template(url.path)}", host=self.host, path=url.path)
+        error = None
+        try:
+            parser = JsonItemsParser(items_key)
+            async for chunk in self._iter_chunks(url, query_params, span, timeout):
+                for item in parser.feed(chunk):
+                    yield item
+            for item in parser.close():
+                yield item
+            if extra is not None:
+                extra.update(parser.extra)
+        except GeneratorExit:
+            # the consumer stopped iterating - not an error
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            DEFAULT_TRACER.end_span(span, error)
+
+    async def get_json_items_page(
+        self,
+        items_key: str,
+        build: Callable[[AsyncIterator[Any]], Awaitable[T]],
+        build_key: Optional[Hashable],
+        path: Optional[str] = None,
+        url: Optional[str] = None,
+        query_params: Optional[dict] = None,
+        extra: Optional[Dict[str, Any]] = None,
+        timeout: Optional[Timeout] = None,
+    ) -> T:
+        """
+        GET a page of a JSON collection (like iter_json_items) and return what build makes of its items.
+        with a page memo, the page's body is fingerprinted as it arrives: a page whose body didn't change since
+        build_key's build last made something of it (for this identity) is neither parsed nor built again
+        (None build key - the page is always built).
+        the body is then parsed once it's complete, rather than as it arrives
+        """
+        if self.page_memo is None or build_key is None:
+            return await build(
+                self.iter_json_items(
+                    items_key, path=path, url=url, query_params=query_params, extra=extra, timeout=timeout
+                )
+            )
+
+        url = self._get_request_url(path, url)
+        page_key = (build_key, str(url.update_query(query_params) if query_params else url))
+        with DEFAULT_TRACER.span(f"GET {get_path_template(url.path)}", host=self.host, path=url.path) as span:
+            chunks = []
+            digest = hashlib.sha256()
+            async for chunk in self._iter_chunks(url, query_params, span, timeout):
+                digest.update(chunk)
+                chunks.append(chunk)
+            fingerprint = digest.hexdigest()
+            page = self.page_memo.get(self.identity, page_key, fingerprint)
+            span.set_attribute("unchanged", page is not None)
+            if page is None:
+                parser = JsonItemsParser(items_key)
+                page = (await build(_iter_parsed(parser, chunks)), parser.extra)
+                self.page_memo.put(self.identity, page_key, fingerprint, page)
+
+        value, page_extra = page
+        if extra is not None:
+            extra.update(page_extra)
+        return value
+
+    def _iter_chunks(
+            self, url: yarl.URL, query_params: Optional[dict], span: Span, timeout: Optional[Timeout] = None
+    ) -> AsyncIterator[bytes]:
+        kwargs = self._convert_options(self.options)
+        if timeout:
+            kwargs.update(self._convert_timeout(timeout))
+        if self.coalescer is None:
+            return self._iter_body(url, query_params, span, **kwargs)
+        return self.coalescer.iter_shared(
+            self._get_coalescing_key(url, query_params),
+            lambda: self._iter_body(url, query_params, span, **kwargs),
+        )
+
+    async def _iter_body(
+            self, url: yarl.URL, query_params: Optional[dict], span: Span, **kwargs
+    ) -> AsyncIterator[bytes]:
+        """
+        GET url and iterate over the chunks of the response's body as they arrive
+        (through the response cache, if there is one - a kept body is a single chunk)
+        """
+        token = self.token or ""
+        conditional = True
+        for attempt in itertools.count():
+            delay = None
+            headers, cache_key = self._prepare_get(url, query_params, conditional)
+            async with self.scheduler.slot(self.host, token):
+                async with self.session.get(url, params=query_params, headers=headers, **kwargs) as res:
+                    if res.status == HTTPStatus.NOT_MODIFIED and cache_key:
+                        body = self.response_cache.get_not_modified(self.identity, cache_key)
+                        if body is None:
+                            # evicted since the request was sent - ask for the whole response
+                            conditional = False
+                            continue
+                        span.set_attribute("not_modified", True)
+                        yield body
+                        return
+                    elif res.status >= 400:
+                        err_body = await res.text()
+                        try:
+                            res.raise_for_status()
+                        except HTTPError as err:
+                            delay = self.scheduler.backoff(self.host, token, err.status, err.headers, attempt)
+                            if delay is None:
+                                logger.error("Request failed", err=err, err_body=err_body)
+                                raise
+                    else:
+                        # the body is kept as it streams in (for the response cache), up to the size it may keep
+                        keep = cache_key is not None and self.response_cache.is_cacheable(res.headers)
+                        chunks, size = [], 0
+                        async for chunk in res.content.iter_any():
+                            if keep:
+                                chunks.append(chunk)
+                                size += len(chunk)
+                                if size > self.response_cache.max_entry_bytes:
+                                    keep, chunks = False, []
+                            yield chunk
+                        if cache_key is not None:
+                            body = b"".join(chunks) if keep else None
+                            self.response_cache.put(self.identity, cache_key, res.headers, body)
+                        return
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        # the session is owned by the pool
+        pass
+
+    def _get_request_url(self, path: Optional[str] = None, url: Optional[str] = None) -> yarl.URL:
+        if path is not None:
+            return self.url / path.lstrip("/")
+        url = yarl.URL(url, encoded=True)
+        if url.host != self.host:
+            raise ValueError(f"Refusing to send a request for {self.host} to {url.host}")
+        return url
+
+    def _get_headers(self) -> Dict[str, str]:
+        if not self.token:
+            return self.headers
+        return {**self.headers, "Authorization": f"{self.token_type} {self.token}"}
+
+    def _get_coalescing_key(self, url: yarl.URL, query_params: Optional[dict]) -> Tuple:
+        # requests are shared by callers of the same identity (token subject) - the same authorization - only
+        request_url = str(url.update_query(query_params) if query_params else url)
+        return self.identity, request_url, frozenset(self.headers.items())
+
+    def _prepare_get(
+            self, url: yarl.URL, query_params: Optional[dict], conditional: bool = True
+    ) -> Tuple[Dict[str, str], Optional[str]]:
+        """
+        the headers of a GET of url and its response cache key (None without a response cache).
+        conditional - whether to revalidate the kept body (if any) rather than ask for the whole response
+        """
+        headers = self._get_headers()
+        if self.response_cache is None:
+            return headers, None
+        cache_key = str(url.update_query(query_params) if query_params else url)
+        if conditional:
+            headers = {**headers, **self.response_cache.get_conditional_headers(self.identity, cache_key)}
+        return headers, cache_key
+
+    async def _get_body(
+            self, url: yarl.URL, query_params: Optional[dict], accept_statuses: Collection[int] = (), **kwargs
+    ) -> Tuple[int, bytes]:
+        """
+        GET url and return the response's status & body (through the coalescer and the response cache, if there are).
+        responses with error statuses in accept_statuses are returned rather than raised.
+        only the request that's actually sent goes through the scheduler - callers that join one in flight don't hold
+        slots while they wait for it
+        """
+        request = functools.partial(
+            self.scheduler.run,
+            host=self.host,
+            token=self.token or "",
+            request=functools.partial(self._get_body_once, url, query_params, accept_statuses, **kwargs),
+        )
+        if self.coalescer is None:
+            return await request()
+        return await self.coalescer.run(
+            (self._get_coalescing_key(url, query_params), tuple(accept_statuses)), request
+        )
+
+    async def _get_body_once(
+            self, url: yarl.URL, query_params: Optional[dict], accept_statuses: Collection[int] = (), **kwargs
+    ) -> Tuple[int, bytes]:
+        conditional = True
+        while True:
+            headers, cache_key = self._prepare_get(url, query_params, conditional)
+            async with self.session.get(url, params=query_params, headers=headers, **kwargs) as res:
+                if res.status == HTTPStatus.NOT_MODIFIED and cache_key:
+                    body = self.response_cache.get_not_modified(self.identity, cache_key)
+                    if body is not None:
+                        return HTTPStatus.OK, body
+                    # evicted since the request was sent - ask for the whole response
+                    conditional = False
+                    continue
+                if res.status >= 400 and res.status not in accept_statuses:
+                    err_body = await res.text()
+                    try:
+                        res.raise_for_status()
+                    except HTTPError as err:
+                        logger.error("Request failed", err=err, err_body=err_body)
+                        raise
+                body = await res.read()
+                if cache_key and res.status == HTTPStatus.OK:
+                    self.response_cache.put(self.identity, cache_key, res.headers, body)
+                return res.status, body
+
+    async def _get_json(
+            self,
+            url: yarl.URL,
+            query_params: Optional[dict] = None,
+            response_type: Optional[Type] = None,
+            timeout: Optional[Timeout] = None,
+    ):
+        kwargs = self._convert_options(self.options)
+        if timeout:
+            kwargs.update(self._convert_timeout(timeout))
+        status, body = await self._get_body(url, query_params, **kwargs)
+        return parse_response_data(json.loads(body) if body else None, response_type)
+
+    async def _request(self, method, url, *args, **kwargs):
+        # the span covers the time waiting for the scheduler and the retries
+        span_name = f"{method.__name__.upper()} {get_path_template(url.path)}"
+        with DEFAULT_TRACER.span(span_name, host=self.host, path=url.path):
+            if method == self.session.get:
+                # GETs go through the coalescer (before the scheduler) and the response cache (if there are)
+                return await self._get_json(url, *args, **kwargs)
+            kwargs["headers"] = {**kwargs.get("headers", {}), **self._get_headers()}
+            request = functools.partial(super()._request, method, url, *args, **kwargs)
+            return await self.scheduler.run(host=self.host, token=self.token or "", request=request)
@@ -0,0 +1,36 @@
+import base64
+import binascii
+import hashlib
+import json
+from typing import Optional
+
+
+def token_identity(token: Optional[str]) -> str:
+    """
+    stable identity of the token's subject (e.g., for keying caches).
+    JWTs (Azure AD) are identified by their tenant & subject claims.
+    opaque tokens (GCP) are identified by their hash.
+    the token is *not* validated here - it's expected to come from the bot's token service.
+    """
+    if not token:
+        return "anonymous"
+
+    claims = _get_jwt_claims(token)
+    if claims:
+        subject = claims.get("oid") or claims.get("sub")
+        if subject:
+            return f"{claims.get('tid', '')}:{subject}"
+
+    return "sha256:" + hashlib.sha256(token.encode()).hexdigest()
+
+
+def _get_jwt_claims(token: str) -> Optional[dict]:
+    parts = token.split(".")
+    if len(parts) != 3:
+        return None
+    payload = parts[1] + "=" * (-len(parts[1]) % 4)
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (binascii.Error, ValueError):
+        return None
+    return claims if isinstance(claims, dict) else None
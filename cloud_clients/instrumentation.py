@@ -0,0 +1,69 @@
+import re
+import time
+from types import SimpleNamespace
+
+import aiohttp
+
+from telemetry import CallbackGauge, Gauge, Histogram
+from .scheduler import DEFAULT_SCHEDULER
+
+CLOUD_REQUEST_SECONDS = Histogram(
+    "felix_cloud_request_duration_seconds",
+    "Time until the response headers of cloud API requests arrive (every attempt counts)",
+    ["host", "path", "status"],
+)
+CLOUD_REQUESTS_IN_FLIGHT = Gauge("felix_cloud_requests_in_flight", "Cloud API requests in flight", ["host"])
+CLOUD_REQUESTS_QUEUED = CallbackGauge(
+    "felix_cloud_requests_queued",
+    "Cloud API requests waiting for the scheduler",
+    lambda: DEFAULT_SCHEDULER.queued,
+)
+
+# collections whose next path segment is the name / id of one of their resources
+_COLLECTIONS = {
+    "subscriptions", "resourcegroups", "virtualmachines", "projects", "zones", "regions", "instances", "operations"
+}
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$", re.IGNORECASE)
+
+
+def get_path_template(path: str) -> str:
+    """
+    the path with resource names & ids replaced by placeholders (keeps the number of label values bounded)
+    """
+    segments = path.split("/")
+    for i, segment in enumerate(segments):
+        if segment and ((i and segments[i - 1].lower() in _COLLECTIONS) or _ID_SEGMENT.match(segment)):
+            segments[i] = "{id}"
+    return "/".join(segments)
+
+
+async def _on_request_start(session, context: SimpleNamespace, params: aiohttp.TraceRequestStartParams):
+    context.start = time.perf_counter()
+    context.host = params.url.host
+    CLOUD_REQUESTS_IN_FLIGHT.inc(host=context.host)
+
+
+async def _on_request_end(session, context: SimpleNamespace, params: aiohttp.TraceRequestEndParams):
+    _record(context, params.url, str(params.response.status))
+
+
+async def _on_request_exception(session, context: SimpleNamespace, params: aiohttp.TraceRequestExceptionParams):
+    _record(context, params.url, "error")
+
+
+def _record(context: SimpleNamespace, url, status: str):
+    CLOUD_REQUESTS_IN_FLIGHT.dec(host=context.host)
+    CLOUD_REQUEST_SECONDS.observe(
+        time.perf_counter() - context.start, host=context.host, path=get_path_template(url.path), status=status
+    )
+
+
+def get_trace_config() -> aiohttp.TraceConfig:
+    """
+    aiohttp hooks that record the metrics of the requests of a session
+    """
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_request_end.append(_on_request_end)
+    trace_config.on_request_exception.append(_on_request_exception)
+    return trace_config
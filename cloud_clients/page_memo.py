@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Hashable, Optional, Tuple
+
+
+@dataclass
+class _Page:
+    fingerprint: str
+    value: Any
+
+
+@dataclass
+class PageMemo:
+    """
+    what was built from the latest body of every page (e.g., its models), by identity (token subject) and page key,
+    along with the body's fingerprint (a hash of the raw bytes).
+    a page that comes back with the same fingerprint is answered with what was already built from it rather than parsed
+    and built again - unlike the inventory cache, the page is still requested, so the API decides what's fresh.
+    pages are kept (LRU) up to max_entries
+    """
+    max_entries: int = 1024
+
+    # pages that didn't change since they were built / pages that were built
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _pages: "OrderedDict[Tuple[str, Hashable], _Page]" = field(default_factory=OrderedDict, init=False, repr=False)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, identity: str, key: Hashable, fingerprint: str) -> Optional[Any]:
+        """
+        what was built from the page if its body is still the one with fingerprint (None if it isn't or wasn't kept)
+        """
+        page = self._pages.get((identity, key))
+        if not page or page.fingerprint != fingerprint:
+            self.misses += 1
+            return None
+        self._pages.move_to_end((identity, key))
+        self.hits += 1
+        return page.value
+
+    def put(self, identity: str, key: Hashable, fingerprint: str, value: Any):
+        self._pages[(identity, key)] = _Page(fingerprint=fingerprint, value=value)
+        self._pages.move_to_end((identity, key))
+        while len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
+
+    def clear(self):
+        self._pages.clear()
+
+    def __len__(self) -> int:
+        return len(self._pages)
@@ -0,0 +1,60 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# get page is called with a page token (None for the first page) and a callback it should call with the
+# next page token as soon as it's known. it returns the page items and the next page token
+PageGetter = Callable[[Optional[str], Callable[[Optional[str]], None]], Awaitable[Tuple[List[T], Optional[str]]]]
+
+
+async def iter_pipelined(get_page: PageGetter, max_prefetch: int = 1) -> AsyncIterator[T]:
+    """
+    iterate over the items of all pages.
+    pages are pipelined - the following page is requested as soon as its token arrives,
+    so it's in flight while the current page is being parsed and consumed.
+    at most max_prefetch pages are requested ahead of the page being consumed - the rest wait for the consumer
+    """
+    prefetched: Dict[str, asyncio.Future] = {}
+    # tokens of pages too far ahead to request yet
+    deferred: List[str] = []
+    # the iteration is over. get_page may still call back - e.g., a cached() load that's shared with other callers
+    # isn't cancelled along with ours
+    closed = False
+
+    def prefetch(token: Optional[str]):
+        if closed or not token or token in prefetched or token in deferred:
+            return
+        if len(prefetched) < max_prefetch:
+            prefetched[token] = asyncio.ensure_future(get_page(token, prefetch))
+        else:
+            deferred.append(token)
+
+    def take(token: str) -> asyncio.Future:
+        page = prefetched.pop(token, None)
+        if page is None:
+            if token in deferred:
+                deferred.remove(token)
+            page = asyncio.ensure_future(get_page(token, prefetch))
+        # the consumer moved on - there's room for another page ahead
+        while deferred and len(prefetched) < max_prefetch:
+            next_token = deferred.pop(0)
+            prefetched[next_token] = asyncio.ensure_future(get_page(next_token, prefetch))
+        return page
+
+    page = asyncio.ensure_future(get_page(None, prefetch))
+    try:
+        while page is not None:
+            items, token = await page
+            prefetch(token)  # in case get_page didn't call back (e.g., the page came from a cache)
+            for item in items:
+                yield item
+            page = take(token) if token else None
+    finally:
+        # e.g., the consumer stopped iterating - don't leave requests of pages nobody will read in flight
+        closed = True
+        deferred.clear()
+        for future in [page, *prefetched.values()]:
+            if future is not None:
+                future.cancel()
+        prefetched.clear()
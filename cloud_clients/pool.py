@@ -0,0 +1,42 @@
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+import aiohttp
+
+from .instrumentation import get_trace_config
+
+
+@dataclass
+class ConnectionPool:
+    """
+    one keep-alive aiohttp session (with its own connector & DNS cache) per host.
+    sessions are shared by all client views so users don't pay for a new TCP/TLS connection per request.
+    """
+    limit_per_host: int = 64
+    keepalive_timeout: float = 60.0
+    dns_cache_ttl: int = 300
+
+    _sessions: Dict[Tuple[str, str, int], aiohttp.ClientSession] = field(default_factory=dict, init=False, repr=False)
+
+    def get_session(self, scheme: str, host: str, port: int) -> aiohttp.ClientSession:
+        key = (scheme, host, port)
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=0,  # bounded per host below (and by the scheduler)
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            session = aiohttp.ClientSession(connector=connector, trace_configs=[get_trace_config()])
+            self._sessions[key] = session
+        return session
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+
+DEFAULT_POOL = ConnectionPool()
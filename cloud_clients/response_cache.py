@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Mapping, Optional, Tuple
+
+
+@dataclass
+class _Entry:
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+@dataclass
+class ResponseCache:
+    """
+    HTTP response cache for conditional requests.
+    bodies of GET responses that carry a validator (ETag / Last-Modified) are kept by identity (token subject) and URL;
+    the following requests for them are sent with If-None-Match / If-Modified-Since and a 304 is answered with the
+    kept body - the API still decides what's fresh, the body just isn't sent again (so, unlike the inventory cache,
+    there's nothing to drop on refreshes).
+    bodies are kept (LRU) within max_bytes; larger ones than max_entry_bytes aren't kept at all
+    """
+    max_bytes: int = 32 * 1024 * 1024
+    max_entry_bytes: int = 4 * 1024 * 1024
+
+    # 304s answered from the cache
+    hits: int = field(default=0, init=False)
+    # full responses to requests that could have been conditional (whether kept or not)
+    misses: int = field(default=0, init=False)
+    size: int = field(default=0, init=False)
+    _entries: "OrderedDict[Tuple[str, str], _Entry]" = field(default_factory=OrderedDict, init=False, repr=False)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_conditional_headers(self, identity: str, url: str) -> Dict[str, str]:
+        """
+        the headers that make the request for url conditional (none if there's no kept body to revalidate)
+        """
+        entry = self._entries.get((identity, url))
+        if not entry:
+            return {}
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def get_not_modified(self, identity: str, url: str) -> Optional[bytes]:
+        """
+        the kept body a 304 response to the request for url refers to (None if it was evicted meanwhile)
+        """
+        entry = self._entries.get((identity, url))
+        if not entry:
+            return None
+        self._entries.move_to_end((identity, url))
+        self.hits += 1
+        return entry.body
+
+    def is_cacheable(self, headers: Mapping[str, str]) -> bool:
+        if "no-store" in headers.get("Cache-Control", ""):
+            return False
+        return "ETag" in headers or "Last-Modified" in headers
+
+    def put(self, identity: str, url: str, headers: Mapping[str, str], body: Optional[bytes]):
+        """
+        keep the body of a full (200) response to the request for url, if it can be revalidated.
+        None body - the response was too large to keep
+        """
+        self.misses += 1
+        self._pop((identity, url))
+        if body is None or len(body) > self.max_entry_bytes or not self.is_cacheable(headers):
+            return
+        self._entries[(identity, url)] = _Entry(
+            body=body, etag=headers.get("ETag"), last_modified=headers.get("Last-Modified")
+        )
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            key, entry = self._entries.popitem(last=False)
+            self.size -= len(entry.body)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def _pop(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= len(entry.body)
@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import itertools
+import random
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from enum import IntEnum
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple, TypeVar
+
+import structlog
+from http_noah.async_client import HTTPError
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+RETRY_STATUSES = (HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE)
+
+
+class Priority(IntEnum):
+    # lower value is served first
+    interactive = 0
+    background = 1
+
+
+_priority_ctx: ContextVar[Priority] = ContextVar("priority", default=Priority.interactive)
+
+
+@contextmanager
+def priority(value: Priority):
+    """
+    set the priority of the requests issued within the block (including tasks spawned from it)
+    """
+    token = _priority_ctx.set(value)
+    try:
+        yield
+    finally:
+        _priority_ctx.reset(token)
+
+
+# a request waiting for a slot: (priority, seq, future) - ordered by priority, then first come first served
+_Waiter = Tuple[int, int, asyncio.Future]
+
+
+@dataclass
+class Scheduler:
+    """
+    caps the number of in-flight cloud API requests per host and per token.
+    requests that can't be dispatched right away wait in a priority queue per host & token (interactive before
+    background); a freed slot is handed out from the queues of its host or token only.
+    requests that fail with 429/503 are retried with exponential backoff, honoring Retry-After;
+    while backing off, no new requests are dispatched for the same host & token.
+    """
+    max_in_flight_per_host: int = 32
+    max_in_flight_per_token: int = 16
+    max_retries: int = 5
+    backoff_base: float = 0.5
+    backoff_max: float = 60.0
+
+    _in_flight_per_host: Counter = field(default_factory=Counter, init=False, repr=False)
+    _in_flight_per_token: Counter = field(default_factory=Counter, init=False, repr=False)
+    _paused_until: Dict[Tuple[str, str], float] = field(default_factory=dict, init=False, repr=False)
+    # (host, token) -> heap of waiters. cancelled waiters are dropped once they get to the top
+    _queues: Dict[Tuple[str, str], List[_Waiter]] = field(default_factory=dict, init=False, repr=False)
+    _queues_per_host: Dict[str, Set[Tuple[str, str]]] = field(
+        default_factory=lambda: defaultdict(set), init=False, repr=False
+    )
+    _queues_per_token: Dict[str, Set[Tuple[str, str]]] = field(
+        default_factory=lambda: defaultdict(set), init=False, repr=False
+    )
+    _queued: int = field(default=0, init=False, repr=False)
+    _seq: Any = field(default_factory=itertools.count, init=False, repr=False)
+
+    async def run(self, host: str, token: str, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        run request once there's capacity for host & token, retrying it on throttling
+        """
+        for attempt in itertools.count():
+            async with self.slot(host, token):
+                try:
+                    return await request()
+                except HTTPError as e:
+                    delay = self.backoff(host, token, e.status, e.headers, attempt)
+                    if delay is None:
+                        raise
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def slot(self, host: str, token: str):
+        """
+        hold an in-flight slot for host & token for the duration of the block.
+        for requests that can't be wrapped by run() (e.g., streamed responses); use backoff() to handle throttling
+        """
+        await self._acquire(host, token)
+        try:
+            yield
+        finally:
+            self._release(host, token)
+
+    def backoff(self, host: str, token: str, status: int, headers: Optional[Mapping], attempt: int) -> Optional[float]:
+        """
+        if a response with status should be retried, pause host & token and return how long to wait before retrying.
+        returns None if it shouldn't be retried
+        """
+        if status not in RETRY_STATUSES or attempt >= self.max_retries:
+            return None
+        delay = self._get_retry_delay(headers, attempt)
+        logger.warning("Request throttled, backing off", host=host, status=status, delay=delay)
+        self._pause(host, token, delay)
+        return delay
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def _has_capacity(self, host: str, token: str) -> bool:
+        loop = asyncio.get_event_loop()
+        return (
+            self._in_flight_per_host[host] < self.max_in_flight_per_host
+            and self._in_flight_per_token[token] < self.max_in_flight_per_token
+            and self._paused_until.get((host, token), 0) <= loop.time()
+        )
+
+    def _take(self, host: str, token: str):
+        self._in_flight_per_host[host] += 1
+        self._in_flight_per_token[token] += 1
+
+    async def _acquire(self, host: str, token: str):
+        if self._has_capacity(host, token):
+            self._take(host, token)
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        key = (host, token)
+        if key not in self._queues:
+            self._queues[key] = []
+            self._queues_per_host[host].add(key)
+            self._queues_per_token[token].add(key)
+        heapq.heappush(self._queues[key], (_priority_ctx.get(), next(self._seq), future))
+        self._queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                # still queued - it's dropped once it gets to the top of its queue
+                self._queued -= 1
+            else:
+                # the slot was handed to us right before we got cancelled
+                self._release(host, token)
+            raise
+
+    def _release(self, host: str, token: str):
+        self._in_flight_per_host[host] -= 1
+        if not self._in_flight_per_host[host]:
+            del self._in_flight_per_host[host]
+        self._in_flight_per_token[token] -= 1
+        if not self._in_flight_per_token[token]:
+            del self._in_flight_per_token[token]
+        # the freed slot is the host's and the token's - only their queues may have waiters that fit now
+        self._dispatch(self._queues_per_host.get(host, set()) | self._queues_per_token.get(token, set()))
+
+    def _dispatch(self, keys: Iterable[Tuple[str, str]]):
+        # hand out slots to the waiters at the top of the queues of keys (by priority) for as long as they fit
+        tops = []
+        for key in keys:
+            waiter = self._get_top(key) if self._has_capacity(*key) else None
+            if waiter:
+                tops.append((*waiter[:2], key))
+        heapq.heapify(tops)
+        while tops:
+            *_, key = heapq.heappop(tops)
+            if not self._has_capacity(*key):
+                continue
+            *_, future = heapq.heappop(self._queues[key])
+            self._queued -= 1
+            self._take(*key)
+            future.set_result(None)
+            waiter = self._get_top(key)
+            if waiter:
+                heapq.heappush(tops, (*waiter[:2], key))
+
+    def _get_top(self, key: Tuple[str, str]) -> Optional[_Waiter]:
+        """
+        the first waiter in the queue of key that's still waiting (None if there's none)
+        """
+        queue = self._queues.get(key)
+        if queue is None:
+            return None
+        while queue and queue[0][2].done():
+            heapq.heappop(queue)
+        if queue:
+            return queue[0]
+        host, token = key
+        del self._queues[key]
+        self._queues_per_host[host].discard(key)
+        if not self._queues_per_host[host]:
+            del self._queues_per_host[host]
+        self._queues_per_token[token].discard(key)
+        if not self._queues_per_token[token]:
+            del self._queues_per_token[token]
+        return None
+
+    def _pause(self, host: str, token: str, delay: float):
+        loop = asyncio.get_event_loop()
+        until = loop.time() + delay
+        if until > self._paused_until.get((host, token), 0):
+            self._paused_until[(host, token)] = until
+            loop.call_at(until, self._resume, host, token, until)
+
+    def _resume(self, host: str, token: str, until: float):
+        if self._paused_until.get((host, token)) == until:
+            del self._paused_until[(host, token)]
+        self._dispatch([(host, token)])
+
+    def _get_retry_delay(self, headers: Optional[Mapping], attempt: int) -> float:
+        retry_after = _parse_retry_after((headers or {}).get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Retry-After is either a number of seconds or an HTTP date
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+DEFAULT_SCHEDULER = Scheduler()
+
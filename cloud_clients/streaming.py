@@ -0,0 +1,243 @@
+import codecs
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_WHITESPACE = " \t\n\r"
+_SEPARATORS = _WHITESPACE + ","
+# a whole string, a bracket or the opening quote of a string that isn't complete yet
+_STRUCTURE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}"]')
+# the rest of a string (after its opening quote), up to and including its closing quote
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"')
+
+
+class _ValueEnd:
+    """
+    finds where a JSON container (or string) ends as its text arrives, scanning every chunk once.
+    the text is assumed to be valid JSON - it's decoded for real once complete
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        # the chunk ended with a backslash escaping the next chunk's first char
+        self.escape = False
+
+    def feed(self, text: str) -> Optional[int]:
+        """
+        scan the next text of the value and return the position (in text) right after its end (None if not in text)
+        """
+        pos = 0
+        if self.in_string:
+            if self.escape:
+                if not text:
+                    return None
+                pos, self.escape = 1, False
+            match = _STRING_REST.match(text, pos)
+            if not match:
+                self.escape = self._ends_with_escape(text, pos)
+                return None
+            pos = match.end()
+            self.in_string = False
+            if not self.depth:
+                return pos
+
+        for match in _STRUCTURE.finditer(text, pos):
+            token = match.group()
+            if token == '"':
+                self.in_string = True
+                self.escape = self._ends_with_escape(text, match.end())
+                return None
+            if token in "[{":
+                self.depth += 1
+            elif token in "]}":
+                self.depth -= 1
+            if not self.depth:
+                return match.end()
+        return None
+
+    @staticmethod
+    def _ends_with_escape(text: str, pos: int) -> bool:
+        rest = text[pos:]
+        return (len(rest) - len(rest.rstrip("\\"))) % 2 == 1
+
+
+class JsonItemsParser:
+    """
+    incremental parser for a JSON object that holds a (possibly large) collection under items_key.
+    feed it bytes as they arrive and it returns the collection's items as soon as each is complete,
+    so the whole document is never held in memory (neither as text nor as objects).
+    an array collection yields its elements; an object collection yields (key, value) pairs.
+    the object's other top level members (e.g., next page links) are collected into extra.
+    """
+
+    def __init__(self, items_key: str):
+        self.items_key = items_key
+        self.extra: Dict[str, Any] = {}
+        self.done = False
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._text = ""
+        self._pos = 0
+        # the value being decoded isn't complete - the chunks that arrived since are kept aside (rather than added to
+        # the text one at a time) until its end does
+        self._pending_end: Optional[_ValueEnd] = None
+        self._pending_chunks: List[str] = []
+        self._eof = False
+        self._state = self._object_start
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        parse the next chunk of the document and return the items completed by it
+        """
+        return self._parse(self._utf8.decode(chunk))
+
+    def close(self) -> List[Any]:
+        """
+        mark the end of the document and return the remaining items. raise ValueError if it's incomplete
+        """
+        self._eof = True
+        items = self._parse(self._utf8.decode(b"", final=True))
+        if not self.done:
+            raise ValueError("Incomplete JSON document")
+        return items
+
+    def _parse(self, text: str) -> List[Any]:
+        if self._pending_end is not None:
+            self._pending_chunks.append(text)
+            if self._pending_end.feed(text) is None and not self._eof:
+                return []
+            text = "".join(self._pending_chunks)
+            self._pending_end = None
+            self._pending_chunks = []
+        # drop what was already consumed
+        self._text = self._text[self._pos:] + text
+        self._pos = 0
+        items = []
+        while not self.done and self._state(items):
+            pass
+        return items
+
+    def _skip(self, chars: str = _WHITESPACE) -> Optional[str]:
+        """
+        skip chars and return the next char (None if we ran out of text)
+        """
+        text, pos, end = self._text, self._pos, len(self._text)
+        while pos < end and text[pos] in chars:
+            pos += 1
+        self._pos = pos
+        return text[pos] if pos < end else None
+
+    def _decode(self) -> Tuple[bool, Any]:
+        """
+        decode the value at the current position. returns (False, None) if it's not complete yet
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._text, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            if self._text[self._pos] in "[{\"":
+                # don't decode it again with every chunk - only once its end arrives
+                pending_end = _ValueEnd()
+                if pending_end.feed(self._text[self._pos:]) is not None:
+                    # it's all there - it's just not valid
+                    raise
+                self._pending_end = pending_end
+            return False, None
+        if type(value) in (int, float) and not self._eof and (end == len(self._text) or self._text[end] in ".eE"):
+            # a number at the very end of the text (or of its integer part) might continue in the next chunk
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _expect(self, char: str):
+        if self._text[self._pos] != char:
+            raise ValueError(f"Expected {char!r} at {self._pos} but got {self._text[self._pos]!r}")
+        self._pos += 1
+
+    @staticmethod
+    def _expect_key(key: Any, pos: int):
+        if not isinstance(key, str):
+            raise ValueError(f"Expected a string key at {pos} but got {key!r}")
+
+    def _object_start(self, items: List[Any]) -> bool:
+        if self._skip() is None:
+            return False
+        self._expect("{")
+        self._state = self._member
+        return True
+
+    def _member(self, items: List[Any]) -> bool:
+        char = self._skip(_SEPARATORS)
+        if char is None:
+            return False
+        if char == "}":
+            self._pos += 1
+            self.done = True
+            return False
+
+        start = self._pos
+        decoded, key = self._decode()
+        if not decoded or self._skip() is None:
+            self._pos = start
+            return False
+        self._expect_key(key, start)
+        self._expect(":")
+        char = self._skip()
+        if char is None:
+            self._pos = start
+            return False
+
+        if key == self.items_key and char in "[{":
+            self._pos += 1
+            self._state = self._array_item if char == "[" else self._object_item
+            return True
+
+        decoded, value = self._decode()
+        if not decoded:
+            self._pos = start
+            return False
+        self.extra[key] = value
+        return True
+
+    def _array_item(self, items: List[Any]) -> bool:
+        char = self._skip(_SEPARATORS)
+        if char is None:
+            return False
+        if char == "]":
+            self._pos += 1
+            self._state = self._member
+            return True
+
+        decoded, item = self._decode()
+        if not decoded:
+            return False
+        items.append(item)
+        return True
+
+    def _object_item(self, items: List[Any]) -> bool:
+        char = self._skip(_SEPARATORS)
+        if char is None:
+            return False
+        if char == "}":
+            self._pos += 1
+            self._state = self._member
+            return True
+
+        start = self._pos
+        decoded, key = self._decode()
+        if not decoded or self._skip() is None:
+            self._pos = start
+            return False
+        self._expect_key(key, start)
+        self._expect(":")
+        if self._skip() is None:
+            self._pos = start
+            return False
+        decoded, value = self._decode()
+        if not decoded:
+            self._pos = start
+            return False
+        items.append((key, value))
+        return True
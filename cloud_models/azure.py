@@ -1,12 +1,13 @@
 import structlog
 from typing import Optional
-from pydantic import BaseModel
 from enum import Enum
 
+from .base import CloudModel
+
 logger = structlog.get_logger(__name__)
 
 
-class AzureResource(BaseModel):
+class AzureResource(CloudModel):
     id: str
     name: str
     rg: Optional[str]
@@ -30,15 +31,27 @@ class VmPowerState(str, Enum):
 class Vm(AzureResource):
     power_state: VmPowerState
 
+    @staticmethod
+    def get_raw_power_state_code(data: dict) -> Optional[str]:
+        """
+        power state code (e.g., "PowerState/running") of raw vm data without building a model
+        None if not available
+        """
+        try:
+            return data["properties"]["instanceView"]["statuses"][1]["code"]
+        except (KeyError, IndexError, TypeError):
+            return None
+
     @classmethod
     def from_raw_data(cls, data: dict):
         vm_id = data["properties"]["vmId"]
         name = data["name"]
-        rg = data["id"].split("/")[4]
+        # /subscriptions/<id>/resourceGroups/<rg>/... - no need to split the rest of it
+        rg = data["id"].split("/", 5)[4]
         try:
-            power_state = data["properties"]["instanceView"]["statuses"][1]["code"].split("/")[1]
+            power_state = VmPowerState(cls.get_raw_power_state_code(data).split("/")[1])
         except Exception:
             logger.exception("could not extract power state for vm", vm_id=vm_id, name=name, rg=rg)
-            power_state = VmPowerState.na.value
+            power_state = VmPowerState.na
 
-        return cls(id=vm_id, name=name, rg=rg, power_state=power_state)
+        return cls.from_trusted(id=vm_id, name=name, rg=rg, power_state=power_state)
@@ -0,0 +1,20 @@
+from typing import Type, TypeVar
+
+from pydantic import BaseModel
+
+M = TypeVar("M", bound="CloudModel")
+
+
+class CloudModel(BaseModel):
+    """
+    base for models of cloud resources.
+    building a model validates its fields (e.g., when loading it from the bot's state).
+    data parsed by the cloud clients is already known to be well typed and can skip that with from_trusted()
+    """
+
+    @classmethod
+    def from_trusted(cls: Type[M], **fields) -> M:
+        """
+        build without validation. fields must already have their declared types (e.g., enums rather than strings)
+        """
+        return cls.construct(**fields)
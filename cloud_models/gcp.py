@@ -1,8 +1,9 @@
-from pydantic import BaseModel
 from enum import Enum
 
+from .base import CloudModel
 
-class Project(BaseModel):
+
+class Project(CloudModel):
     id: str
     name: str
 
@@ -23,7 +24,7 @@ class InstanceState(str, Enum):
     suspended = "SUSPENDED"
 
 
-class Instance(BaseModel):
+class Instance(CloudModel):
     id: str
     name: str
     zone: str
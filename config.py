@@ -10,8 +10,55 @@ import os
 class DefaultConfig:
     """ Bot Configuration """
 
-    PORT = 3978
+    HOST = os.environ.get("Host", "localhost")
+    PORT = int(os.environ.get("Port", 3978))
+    # worker processes (several of them require a shared StateStorage, i.e., sqlite / redis)
+    WORKERS = int(os.environ.get("Workers", 1))
+    # when set, worker i also listens on WorkerPortBase + i
+    # for reaching a specific worker (e.g., to scrape its metrics)
+    WORKER_PORT_BASE = int(os.environ["WorkerPortBase"]) if os.environ.get("WorkerPortBase") else None
+    # when set, trace spans (of turns, dialog steps, cloud requests & card rendering)
+    # are appended to this file as JSON lines
+    TRACE_FILE = os.environ.get("TraceFile")
+    # on SIGTERM: seconds to keep serving while not ready, then seconds to wait for the requests in flight
+    DRAIN_DELAY = float(os.environ.get("DrainDelay", 0))
+    SHUTDOWN_TIMEOUT = float(os.environ.get("ShutdownTimeout", 60))
     APP_ID = os.environ["MicrosoftAppId"]
     APP_PASSWORD = os.environ["MicrosoftAppPassword"]
+    # inbound (channel) tokens: the number of validated ones remembered and how often the signing keys are refreshed
+    TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("TokenCacheMaxEntries", 4096))
+    OPENID_METADATA_REFRESH_INTERVAL = float(os.environ.get("OpenIdMetadataRefreshInterval", 24 * 3600))
     AAD_CONNECTION_NAME = os.environ.get("AadConnectionName")
     GCP_CONNECTION_NAME = os.environ.get("GcpConnectionName")
+    AZURE_VMS_BACKEND = os.environ.get("AzureVmsBackend", "compute")  # compute / resource-graph
+    INVENTORY_CACHE_TTL = float(os.environ.get("InventoryCacheTtl", 300))
+    INVENTORY_CACHE_MAX_ENTRIES = int(os.environ.get("InventoryCacheMaxEntries", 1024))
+    # bodies of cloud API responses kept for revalidation (ETag / Last-Modified), in bytes (0 - none)
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("ResponseCacheMaxBytes", 32 * 1024 * 1024))
+    RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("ResponseCacheMaxEntryBytes", 4 * 1024 * 1024))
+    # models built from cloud API pages, reused while the pages' bodies don't change (0 - none)
+    PAGE_MEMO_MAX_ENTRIES = int(os.environ.get("PageMemoMaxEntries", 1024))
+    # inventory snapshots: the dialogs answer from them when SnapshotDbPath is set.
+    # the background crawler runs when a service credential is configured for a cloud
+    SNAPSHOT_DB_PATH = os.environ.get("SnapshotDbPath")
+    SNAPSHOT_INTERVAL = float(os.environ.get("SnapshotInterval", 900))
+    SNAPSHOT_MAX_AGE = float(os.environ.get("SnapshotMaxAge", 3600))
+    SNAPSHOT_AZURE_TENANT_ID = os.environ.get("SnapshotAzureTenantId")
+    SNAPSHOT_AZURE_CLIENT_ID = os.environ.get("SnapshotAzureClientId")
+    SNAPSHOT_AZURE_CLIENT_SECRET = os.environ.get("SnapshotAzureClientSecret")
+    SNAPSHOT_AZURE_SUBSCRIPTIONS = [s for s in os.environ.get("SnapshotAzureSubscriptions", "").split(",") if s]
+    SNAPSHOT_GCP_USE_METADATA_SERVER = os.environ.get("SnapshotGcpUseMetadataServer", "").lower() == "true"
+    SNAPSHOT_GCP_PROJECTS = [p for p in os.environ.get("SnapshotGcpProjects", "").split(",") if p]
+    # which GCP projects have the Compute Engine API enabled, persisted when a path is given (re-checked once too old)
+    CAPABILITY_DB_PATH = os.environ.get("CapabilityDbPath")
+    CAPABILITY_MAX_AGE = float(os.environ.get("CapabilityMaxAge", 24 * 3600))
+    CAPABILITY_DISABLED_MAX_AGE = float(os.environ.get("CapabilityDisabledMaxAge", 3600))
+    # bot (conversation/user) state storage: memory / sqlite / redis.
+    # sqlite and redis keep the state across restarts and share it between bot processes
+    STATE_STORAGE = os.environ.get("StateStorage", "memory")
+    STATE_DB_PATH = os.environ.get("StateDbPath", "state.db")
+    STATE_REDIS_HOST = os.environ.get("StateRedisHost", "localhost")
+    STATE_REDIS_PORT = int(os.environ.get("StateRedisPort", 6379))
+    STATE_REDIS_PASSWORD = os.environ.get("StateRedisPassword")
+    STATE_REDIS_DB = int(os.environ.get("StateRedisDb", 0))
+    STATE_TTL = int(os.environ.get("StateTtl", 0))  # seconds, redis only (0 - no expiration)
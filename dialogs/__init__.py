@@ -1,5 +1,7 @@
+from .instrumented_waterfall_dialog import InstrumentedWaterfallDialog
 from .logout_dialog import LogoutDialog
+from .result_stream import ResultStream
 from .azure_dialog import AzureDialog
 from .main_dialog import MainDialog
 
-__all__ = ["LogoutDialog", "MainDialog"]
+__all__ = ["InstrumentedWaterfallDialog", "LogoutDialog", "MainDialog", "ResultStream"]
@@ -1,9 +1,9 @@
-from typing import List, Optional
+import asyncio
+import structlog
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from botbuilder.schema import ActivityTypes, Activity
-from botbuilder.core import MessageFactory
+from botbuilder.core import MessageFactory, TurnContext
 from botbuilder.dialogs import (
-    WaterfallDialog,
     WaterfallStepContext,
     DialogTurnResult,
     PromptOptions,
@@ -12,18 +12,37 @@ from botbuilder.dialogs import (
 )
 from botbuilder.dialogs.prompts import OAuthPrompt, OAuthPromptSettings
 
-from cards import get_azure_vms_card, AZURE_VMS_CARD_MAX_VMS
-from dialogs import LogoutDialog
+from cards import AZURE_VMS_CARD, get_azure_vm_row
+from dialogs import InstrumentedWaterfallDialog, LogoutDialog, ResultStream
+from dialogs.snapshots import get_snapshots_note, is_live_scan
 
-from cloud_clients import AzureClient
+from cloud_clients import AzureClient, ClientFactory, VmsBackend
+from cloud_models import Cloud
 from cloud_models.azure import Subscription, Vm
+from inventory import Snapshot, SnapshotStore
+from http_noah.async_client import HTTPError
+
+logger = structlog.get_logger(__name__)
+
+ALL_SUBSCRIPTIONS = "All subscriptions"
+MAX_CONCURRENT_SUBSCRIPTION_SCANS = 8
 
 
 @dataclass
 class AzureDialogData:
+    """
+    per dialog run data. kept in the dialog's state (step values) so conversations don't share it
+    """
     subscriptions: List[Subscription] = None
     running_vms: List[Vm] = None
 
+    @classmethod
+    def load(cls, values: dict) -> "AzureDialogData":
+        return cls(subscriptions=[Subscription(**sub) for sub in values.get("subscriptions", [])])
+
+    def save(self, values: dict):
+        values["subscriptions"] = [sub.dict() for sub in self.subscriptions]
+
     @property
     def running_vms_string(self) -> str:
         return "\n\n".join([f"{i+1}. {vm.name} (rg: {vm.rg})" for i, vm in enumerate(self.running_vms)])
@@ -36,11 +55,13 @@ class AzureDialogData:
 
 
 class AzureDialog(LogoutDialog):
-    def __init__(self, connection_name: str):
+    def __init__(
+            self, connection_name: str, client_factory: ClientFactory = None, snapshot_store: SnapshotStore = None
+    ):
         super(AzureDialog, self).__init__(AzureDialog.__name__, connection_name)
 
-        self.azclient = AzureClient()
-        self.data = AzureDialogData()
+        self.client_factory = client_factory or ClientFactory()
+        self.snapshot_store = snapshot_store
 
         self.add_dialog(
             OAuthPrompt(
@@ -55,7 +76,7 @@ class AzureDialog(LogoutDialog):
         )
         self.add_dialog(ChoicePrompt(ChoicePrompt.__name__))
         self.add_dialog(
-            WaterfallDialog(
+            InstrumentedWaterfallDialog(
                 "AzureDialog",
                 [
                     self.get_token_step,
@@ -67,6 +88,14 @@ class AzureDialog(LogoutDialog):
 
         self.initial_dialog_id = "AzureDialog"
 
+    async def refresh(self, context: TurnContext):
+        """
+        drop the cached inventory of the signed in user
+        """
+        token = await self.get_token(context)
+        if token:
+            self.client_factory.forget(token)
+
     async def get_token_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
         # There is no reason to store the token locally in the bot because we can always just call
         # the OAuth prompt to get the token or get a new token if needed.
@@ -76,13 +105,14 @@ class AzureDialog(LogoutDialog):
         token = step_context.result.token
         if token:
             await step_context.context.send_activity("You're in! Let's start...")
-            self.azclient.set_auth_token(token)
-            self.data.subscriptions = await self.azclient.subscriptions.list()
+            azclient = self.client_factory.azure(token)
+            data = AzureDialogData(subscriptions=await azclient.subscriptions.list())
+            data.save(step_context.values)
             return await step_context.prompt(
                 ChoicePrompt.__name__,
                 PromptOptions(
                     prompt=MessageFactory.text("Please choose a subscription"),
-                    choices=[Choice(sub.name) for sub in self.data.subscriptions],
+                    choices=[Choice(ALL_SUBSCRIPTIONS)] + [Choice(sub.name) for sub in data.subscriptions],
                 )
             )
 
@@ -91,39 +121,158 @@ class AzureDialog(LogoutDialog):
         )
         return await step_context.end_dialog()
 
+    async def _get_client(self, step_context: WaterfallStepContext) -> Optional[AzureClient]:
+        token = await self.get_token(step_context.context)
+        if not token:
+            await step_context.context.send_activity("Your session has expired. Please try again.")
+            return None
+        return self.client_factory.azure(token)
+
+    @staticmethod
+    def _describe_error(error: Exception) -> str:
+        return f"{error.status} {error.message}" if isinstance(error, HTTPError) else type(error).__name__
+
+    @staticmethod
+    def _add_snapshot(snapshot: Snapshot, stream: ResultStream, title: str = None) -> List[Vm]:
+        running_vms = [Vm(**vm) for vm in snapshot.items]
+        for vm in running_vms:
+            stream.add(get_azure_vm_row(vm), title=title)
+        return running_vms
+
+    @staticmethod
+    async def _scan_subscription(
+            azclient: AzureClient, subscription: Subscription, stream: ResultStream, title: str = None
+    ) -> List[Vm]:
+        """
+        list the running VMs in subscription, streaming them to the chat as they arrive
+        """
+        running_vms = []
+        async for vm in azclient.vms.iter_running_vms(subscription=subscription):
+            running_vms.append(vm)
+            stream.add(get_azure_vm_row(vm), title=title)
+        return running_vms
+
+    async def _scan_all_subscriptions(
+            self, azclient: AzureClient, subscriptions: List[Subscription], stream: ResultStream
+    ) -> Tuple[List[Vm], List[str]]:
+        """
+        scan all subscriptions concurrently (bounded).
+        results are titled by subscription; subscriptions that fail to scan are reported without aborting the rest
+        """
+        if azclient.vms_backend == VmsBackend.resource_graph:
+            return await self._query_all_subscriptions(azclient, subscriptions, stream)
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SUBSCRIPTION_SCANS)
+
+        async def scan(subscription: Subscription):
+            async with semaphore:
+                try:
+                    return await self._scan_subscription(azclient, subscription, stream, title=subscription.name)
+                except Exception as e:
+                    logger.exception("Failed to scan subscription", subscription=subscription.id)
+                    return e
+
+        running_vms = []
+        failures = []
+        for subscription, result in zip(subscriptions, await asyncio.gather(*[scan(sub) for sub in subscriptions])):
+            if isinstance(result, Exception):
+                failures.append(f"{subscription.name} ({self._describe_error(result)})")
+                continue
+            running_vms += result
+        return running_vms, failures
+
+    async def _query_all_subscriptions(
+            self, azclient: AzureClient, subscriptions: List[Subscription], stream: ResultStream
+    ) -> Tuple[List[Vm], List[str]]:
+        """
+        query all subscriptions at once (Resource Graph backend); results are titled by subscription
+        """
+        subscription_names = {sub.id.lower(): sub.name for sub in subscriptions}
+        running_vms = []
+        try:
+            async for subscription_id, vm in azclient.vms.iter_running_vms_by_subscription(subscriptions):
+                running_vms.append(vm)
+                title = subscription_names.get(subscription_id.lower(), subscription_id)
+                stream.add(get_azure_vm_row(vm), title=title)
+        except Exception as e:
+            logger.exception("Failed to query subscriptions")
+            return running_vms, [f"{ALL_SUBSCRIPTIONS.lower()} ({self._describe_error(e)})"]
+        return running_vms, []
+
+    async def _get_visible_snapshots(
+            self, azclient: AzureClient, subscriptions: List[Subscription]
+    ) -> Dict[str, Snapshot]:
+        """
+        the snapshots of the subscriptions whose VMs the user may list.
+        snapshots are crawled with the service credential - the rest of the subscriptions are scanned with the user's
+        token instead
+        """
+        snapshots = await self.snapshot_store.get_many(Cloud.azure, [sub.id for sub in subscriptions])
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SUBSCRIPTION_SCANS)
+
+        async def can_list(subscription: Subscription) -> bool:
+            async with semaphore:
+                try:
+                    return await azclient.vms.can_list(subscription=subscription)
+                except Exception:
+                    # the live scan reports it
+                    return False
+
+        candidates = [sub for sub in subscriptions if sub.id in snapshots]
+        visible = await asyncio.gather(*[can_list(sub) for sub in candidates])
+        return {sub.id: snapshots[sub.id] for sub, can in zip(candidates, visible) if can}
+
     async def list_running_vms_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
+        data = AzureDialogData.load(step_context.values)
         chosen_subscription_name = step_context.result.value
-        subscription = self.data.get_subscription_by_name(name=chosen_subscription_name)
-        if not subscription:
-            await step_context.context.send_activity(f"Can't find such option. Please try again.")
+        if chosen_subscription_name == ALL_SUBSCRIPTIONS:
+            subscriptions = data.subscriptions
+            scope = "all your subscriptions"
+        else:
+            subscription = data.get_subscription_by_name(name=chosen_subscription_name)
+            if not subscription:
+                await step_context.context.send_activity(f"Can't find such option. Please try again.")
+                return await step_context.end_dialog()
+            subscriptions = [subscription]
+            scope = subscription.name
+
+        azclient = await self._get_client(step_context)
+        if not azclient:
             return await step_context.end_dialog()
 
-        await step_context.context.send_activity(f"OK! Let's check for running VMs in {subscription.name}...")
+        # answer from the inventory snapshots where there are ones, unless asked for a live scan
+        snapshots = {}
+        if self.snapshot_store and not is_live_scan(step_context):
+            snapshots = await self._get_visible_snapshots(azclient, subscriptions)
+        live_subscriptions = [sub for sub in subscriptions if sub.id not in snapshots]
 
-        next_link = None
-        self.data.running_vms = []
-        while True:
-            # aggregate running vms
-            vms, next_link = await self.azclient.vms.list_all_running_vms(
-                subscription=subscription, next_link=next_link
-            )
-            self.data.running_vms += vms
-            if not next_link:
-                # no more vms
-                break
-
-        if self.data.running_vms:
-            vm_cards = []
-            for i in range(0, len(self.data.running_vms), AZURE_VMS_CARD_MAX_VMS):
-                vm_cards.append(
-                    get_azure_vms_card(vms=self.data.running_vms[i:i+AZURE_VMS_CARD_MAX_VMS], start_idx=i+1)
-                )
-            msg = Activity(
-                type=ActivityTypes.message,
-                attachments=vm_cards,
-            )
-        else:
-            msg = f"Looks like there are no running VMs in {subscription.name}"
-        await step_context.context.send_activity(msg)
+        # results are sent as they arrive; the summary follows once the scan is done
+        stream = ResultStream(step_context.context, template=AZURE_VMS_CARD)
+        await stream.start(f"OK! Let's check for running VMs in {scope}...")
+
+        data.running_vms = []
+        failures = []
+        try:
+            for subscription in subscriptions:
+                if subscription.id in snapshots:
+                    title = subscription.name if chosen_subscription_name == ALL_SUBSCRIPTIONS else None
+                    data.running_vms += self._add_snapshot(snapshots[subscription.id], stream, title=title)
+
+            if chosen_subscription_name == ALL_SUBSCRIPTIONS and live_subscriptions:
+                running_vms, failures = await self._scan_all_subscriptions(azclient, live_subscriptions, stream)
+                data.running_vms += running_vms
+            elif live_subscriptions:
+                data.running_vms += await self._scan_subscription(azclient, live_subscriptions[0], stream)
+        finally:
+            await stream.finish()
+
+        if data.running_vms:
+            await step_context.context.send_activity(f"That's it! Found {len(data.running_vms)} running VMs in {scope}")
+        elif not failures:
+            await step_context.context.send_activity(f"Looks like there are no running VMs in {scope}")
+        if failures:
+            await step_context.context.send_activity(f"I couldn't check these subscriptions: {', '.join(failures)}")
+        if snapshots:
+            await step_context.context.send_activity(get_snapshots_note(snapshots))
 
         return await step_context.end_dialog()
@@ -1,12 +1,11 @@
 import structlog
 import asyncio
 from enum import Enum
-from typing import List, Optional
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from botbuilder.schema import ActivityTypes, Activity
-from botbuilder.core import MessageFactory
+from botbuilder.core import MessageFactory, TurnContext
 from botbuilder.dialogs import (
-    WaterfallDialog,
     WaterfallStepContext,
     DialogTurnResult,
     PromptOptions,
@@ -15,38 +14,19 @@ from botbuilder.dialogs import (
 )
 from botbuilder.dialogs.prompts import OAuthPrompt, OAuthPromptSettings
 
-from dialogs import LogoutDialog
+from dialogs import InstrumentedWaterfallDialog, LogoutDialog, ResultStream
+from dialogs.snapshots import get_snapshots_note, is_live_scan
 
-from cards import get_gcp_instances_card, GCP_INSTANCES_CARD_MAX_INSTANCES
-from cloud_clients import GcpClient
+from cards import GCP_INSTANCES_CARD, get_gcp_instance_row
+from cloud_clients import ClientFactory, GcpClient
+from cloud_models import Cloud
 from cloud_models.gcp import Instance, Project
+from inventory import Snapshot, SnapshotStore
+from http_noah.async_client import HTTPError
 
 logger = structlog.get_logger(__name__)
 
-US_ZONES_LIST = [
-    'us-central1-a',
-    'us-central1-b',
-    'us-central1-c',
-    'us-central1-f',
-    'us-east1-b',
-    'us-east1-c',
-    'us-east1-d',
-    'us-east4-a',
-    'us-east4-b',
-    'us-east4-c',
-    'us-west1-a',
-    'us-west1-b',
-    'us-west1-c',
-    'us-west2-a',
-    'us-west2-b',
-    'us-west2-c',
-    'us-west3-a',
-    'us-west3-b',
-    'us-west3-c',
-    'us-west4-a',
-    'us-west4-b',
-    'us-west4-c',
-]
+MAX_CONCURRENT_PROJECT_SCANS = 8
 
 
 class ChosenProjectType(str, Enum):
@@ -56,10 +36,20 @@ class ChosenProjectType(str, Enum):
 
 @dataclass
 class GcpDialogData:
+    """
+    per dialog run data. kept in the dialog's state (step values) so conversations don't share it
+    """
     projects: List[Project] = None
     selected_projects: List[Project] = None
     running_instances: List[Instance] = None
 
+    @classmethod
+    def load(cls, values: dict) -> "GcpDialogData":
+        return cls(projects=[Project(**project) for project in values.get("projects", [])])
+
+    def save(self, values: dict):
+        values["projects"] = [project.dict() for project in self.projects]
+
     def get_project_by_name(self, name: str) -> Optional[Project]:
         for project in self.projects:
             if project.name == name:
@@ -68,11 +58,13 @@ class GcpDialogData:
 
 
 class GcpDialog(LogoutDialog):
-    def __init__(self, connection_name: str):
+    def __init__(
+            self, connection_name: str, client_factory: ClientFactory = None, snapshot_store: SnapshotStore = None
+    ):
         super(GcpDialog, self).__init__(GcpDialog.__name__, connection_name)
 
-        self.gclient = GcpClient()
-        self.data = GcpDialogData()
+        self.client_factory = client_factory or ClientFactory()
+        self.snapshot_store = snapshot_store
 
         self.add_dialog(
             OAuthPrompt(
@@ -86,7 +78,7 @@ class GcpDialog(LogoutDialog):
             )
         )
         self.add_dialog(
-            WaterfallDialog(
+            InstrumentedWaterfallDialog(
                 "GcpDialog",
                 [
                     self.get_token_step,
@@ -99,6 +91,14 @@ class GcpDialog(LogoutDialog):
 
         self.initial_dialog_id = "GcpDialog"
 
+    async def refresh(self, context: TurnContext):
+        """
+        drop the cached inventory of the signed in user
+        """
+        token = await self.get_token(context)
+        if token:
+            self.client_factory.forget(token)
+
     async def get_token_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
         # There is no reason to store the token locally in the bot because we can always just call
         # the OAuth prompt to get the token or get a new token if needed.
@@ -112,8 +112,6 @@ class GcpDialog(LogoutDialog):
             )
             return await step_context.end_dialog()
 
-        self.gclient.set_auth_token(token)
-
         await step_context.context.send_activity("You're in! Let's start..")
         return await step_context.prompt(
             ChoicePrompt.__name__,
@@ -123,93 +121,191 @@ class GcpDialog(LogoutDialog):
             )
         )
 
-    async def _filter_out_projects_without_compute_engine_api(self, projects: List[Project]) -> List[Project]:
-        tasks = []
-        filtered_projects = []
-        for project in projects:
-            tasks.append(self.gclient.projects.validate_compute_engine_api_available(project=project))
+    @staticmethod
+    async def _filter_out_projects_without_compute_engine_api(
+            gclient: GcpClient, projects: List[Project]
+    ) -> List[Project]:
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROJECT_SCANS)
+
+        async def validate(project: Project) -> Optional[Project]:
+            async with semaphore:
+                return await gclient.projects.validate_compute_engine_api_available(project=project)
 
-        for project in await asyncio.gather(*tasks):
+        filtered_projects = []
+        for project in await asyncio.gather(*[validate(project) for project in projects]):
             if project is not None:
                 filtered_projects.append(project)
 
         logger.info("Projects with Compute Engine API disabled", projects=set(projects)-set(filtered_projects))
         return filtered_projects
 
+    async def _get_client(self, step_context: WaterfallStepContext) -> Optional[GcpClient]:
+        token = await self.get_token(step_context.context)
+        if not token:
+            await step_context.context.send_activity("Your session has expired. Please try again.")
+            return None
+        return self.client_factory.gcp(token)
+
     async def choose_specific_project_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
-        # we need all projects either way (SPECIFIC/ALL)
-        projects = await self.gclient.projects.list()
-        self.data.projects = await self._filter_out_projects_without_compute_engine_api(projects=projects)
+        gclient = await self._get_client(step_context)
+        if not gclient:
+            return await step_context.end_dialog()
 
         chosen_project_type = str(step_context.result.value)
         if chosen_project_type == ChosenProjectType.ALL:
+            # the projects are scanned as they're listed (see _scan_all_projects)
             await step_context.context.send_activity("All projects it is!")
             return await step_context.next(result=ChosenProjectType.ALL)
 
+        projects = await gclient.projects.list()
+        data = GcpDialogData(
+            projects=await self._filter_out_projects_without_compute_engine_api(gclient=gclient, projects=projects)
+        )
+        data.save(step_context.values)
+
         # specific project selection
         return await step_context.prompt(
             ChoicePrompt.__name__,
             PromptOptions(
                 prompt=MessageFactory.text("OK. Which one?"),
-                choices=[Choice(project.name) for project in self.data.projects],
+                choices=[Choice(project.name) for project in data.projects],
             )
         )
 
-    async def _list_running_instances_in_a_single_project_and_zone(self, project: Project, zone: str):
+    @staticmethod
+    def _add_snapshot(snapshot: Snapshot, stream: ResultStream) -> List[Instance]:
+        running_instances = [Instance(**instance) for instance in snapshot.items]
+        for instance in running_instances:
+            stream.add(get_gcp_instance_row(instance))
+        return running_instances
+
+    @staticmethod
+    async def _list_running_instances_in_a_single_project(
+            gclient: GcpClient, project: Project, stream: ResultStream
+    ) -> List[Instance]:
         running_instances = []
         next_page_token = None
         while True:
-            # aggregate running instances
-            instances, next_page_token = await self.gclient.instances.list_running(
-                project=project.id, zone=zone, next_page_token=next_page_token,
+            # aggregate running instances across all zones
+            instances_by_zone, next_page_token = await gclient.instances.list_running_aggregated(
+                project=project.id, next_page_token=next_page_token,
             )
-            running_instances += instances
+            for instances in instances_by_zone.values():
+                running_instances += instances
+                for instance in instances:
+                    stream.add(get_gcp_instance_row(instance))
             if not next_page_token:
                 # no more instances
                 break
         return running_instances
 
+    async def _scan_all_projects(
+            self, gclient: GcpClient, stream: ResultStream, use_snapshots: bool
+    ) -> Tuple[List[Instance], Dict[str, Snapshot]]:
+        """
+        scan the projects as a pipeline: every project is checked for Compute Engine and scanned (or answered from its
+        snapshot) as soon as it's listed, while the following ones are still being listed.
+        up to MAX_CONCURRENT_PROJECT_SCANS projects are scanned at a time - the listing waits for a free one
+        """
+        snapshots = {}
+        disabled_projects = []
+        forbidden_projects = []
+
+        async def scan(project: Project) -> List[Instance]:
+            if use_snapshots:
+                snapshot = (await self.snapshot_store.get_many(Cloud.gcp, [project.id])).get(project.id)
+                # snapshots are crawled with the service credential - only shown to users who may list the instances
+                if snapshot and await gclient.instances.can_list(project.id):
+                    snapshots[project.id] = snapshot
+                    return self._add_snapshot(snapshot, stream)
+            if not await gclient.projects.validate_compute_engine_api_available(project=project):
+                disabled_projects.append(project)
+                return []
+            try:
+                return await self._list_running_instances_in_a_single_project(
+                    gclient=gclient, project=project, stream=stream
+                )
+            except HTTPError as e:
+                if e.status != HTTPStatus.FORBIDDEN:
+                    raise
+                # e.g., the user may not list the project's instances - skip it rather than fail the whole scan
+                forbidden_projects.append(project)
+                return []
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROJECT_SCANS)
+        tasks = []
+        running_instances = []
+        try:
+            async for project in gclient.projects.iter_active():
+                await semaphore.acquire()
+                task = asyncio.ensure_future(scan(project))
+                task.add_done_callback(lambda _: semaphore.release())
+                tasks.append(task)
+            for project_running_instances in await asyncio.gather(*tasks):
+                running_instances += project_running_instances
+        finally:
+            # e.g., listing the projects failed - don't leave the scans running
+            for task in tasks:
+                task.cancel()
+
+        logger.info("Projects with Compute Engine API disabled", projects=set(disabled_projects))
+        if forbidden_projects:
+            logger.warning("Projects with instances that can't be listed", projects=set(forbidden_projects))
+        return running_instances, snapshots
+
     async def list_running_instances_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
+        data = GcpDialogData.load(step_context.values)
+        use_snapshots = self.snapshot_store is not None and not is_live_scan(step_context)
         if step_context.result == ChosenProjectType.ALL:
-            self.data.selected_projects = self.data.projects
-            await step_context.context.send_activity(
-                f"OK! Let's check for running instances across all your projects...(US zones only)"
-            )
+            gclient = await self._get_client(step_context)
+            if not gclient:
+                return await step_context.end_dialog()
+
+            # results are sent as they arrive; the summary follows once the scan is done
+            stream = ResultStream(step_context.context, template=GCP_INSTANCES_CARD)
+            await stream.start(f"OK! Let's check for running instances across all your projects...")
+            try:
+                data.running_instances, snapshots = await self._scan_all_projects(gclient, stream, use_snapshots)
+            finally:
+                await stream.finish()
         else:
             project_name = str(step_context.result.value)
-            project: Project = self.data.get_project_by_name(name=project_name)
+            project: Project = data.get_project_by_name(name=project_name)
             if not project:
                 return await step_context.end_dialog()
-            self.data.selected_projects = [project]
-            await step_context.context.send_activity(
-                f"OK! Let's check for running instances in {project.name}...(US zones only)"
-            )
 
-        tasks = []
-        for project in self.data.selected_projects:
-            for zone in US_ZONES_LIST:
-                tasks.append(self._list_running_instances_in_a_single_project_and_zone(project=project, zone=zone))
-
-        self.data.running_instances = []
-        for running_instances in await asyncio.gather(*tasks):
-            self.data.running_instances += running_instances
-
-        if self.data.running_instances:
-            instance_cards = []
-            for i in range(0, len(self.data.running_instances), GCP_INSTANCES_CARD_MAX_INSTANCES):
-                instance_card = get_gcp_instances_card(
-                    instances=self.data.running_instances[i:i+GCP_INSTANCES_CARD_MAX_INSTANCES],
-                    start_idx=i+1,
-                )
-                instance_cards.append(instance_card)
-            msg = Activity(
-                type=ActivityTypes.message,
-                attachments=instance_cards,
+            gclient = await self._get_client(step_context)
+            if not gclient:
+                return await step_context.end_dialog()
+
+            # answer from the project's snapshot if there's one the user may see, unless asked for a live scan
+            snapshots = {}
+            if use_snapshots and await gclient.instances.can_list(project.id):
+                snapshots = await self.snapshot_store.get_many(Cloud.gcp, [project.id])
+
+            stream = ResultStream(step_context.context, template=GCP_INSTANCES_CARD)
+            await stream.start(f"OK! Let's check for running instances in {project.name}...")
+            try:
+                if project.id in snapshots:
+                    data.running_instances = self._add_snapshot(snapshots[project.id], stream)
+                else:
+                    data.running_instances = await self._list_running_instances_in_a_single_project(
+                        gclient=gclient, project=project, stream=stream
+                    )
+            finally:
+                await stream.finish()
+
+        if data.running_instances:
+            await step_context.context.send_activity(
+                f"That's it! Found {len(data.running_instances)} running instances"
             )
         elif step_context.result == ChosenProjectType.ALL:
-            msg = f"Looks like there are no running instances in all of your GCP projects (US zones only)"
+            await step_context.context.send_activity(
+                f"Looks like there are no running instances in all of your GCP projects"
+            )
         else:
-            msg = f"Looks like there are no running instances in {project.name} (US zones only)"
-        await step_context.context.send_activity(msg)
+            await step_context.context.send_activity(f"Looks like there are no running instances in {project.name}")
+        if snapshots:
+            await step_context.context.send_activity(get_snapshots_note(snapshots))
 
         return await step_context.end_dialog()
@@ -0,0 +1,19 @@
+from botbuilder.dialogs import DialogTurnResult, WaterfallDialog, WaterfallStepContext
+
+from telemetry import DEFAULT_TRACER, Histogram
+
+DIALOG_STEP_SECONDS = Histogram(
+    "felix_dialog_step_duration_seconds", "Time to run waterfall dialog steps", ["dialog", "step"]
+)
+
+
+class InstrumentedWaterfallDialog(WaterfallDialog):
+    """
+    WaterfallDialog that records the latency of its steps and traces them.
+    a step that moves on to the next one (step_context.next()) runs it within its own span
+    """
+
+    async def on_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
+        step = self.get_step_name(step_context.index)
+        with DEFAULT_TRACER.span(step, dialog=self.id), DIALOG_STEP_SECONDS.time(dialog=self.id, step=step):
+            return await super().on_step(step_context)
@@ -1,8 +1,10 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # Licensed under the MIT License.
 
+from typing import Optional
+
 from botbuilder.dialogs import DialogTurnResult, ComponentDialog, DialogContext
-from botbuilder.core import BotFrameworkAdapter
+from botbuilder.core import BotFrameworkAdapter, TurnContext
 from botbuilder.schema import ActivityTypes
 
 
@@ -26,6 +28,14 @@ class LogoutDialog(ComponentDialog):
             return result
         return await super().on_continue_dialog(inner_dc)
 
+    async def get_token(self, context: TurnContext) -> Optional[str]:
+        """
+        get the token of the signed in user (None if the user is not signed in)
+        """
+        bot_adapter: BotFrameworkAdapter = context.adapter
+        token_response = await bot_adapter.get_user_token(context, self.connection_name)
+        return token_response.token if token_response else None
+
     async def _interrupt(self, inner_dc: DialogContext):
         if inner_dc.context.activity.type == ActivityTypes.message:
             text = inner_dc.context.activity.text.lower()
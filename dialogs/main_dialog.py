@@ -1,6 +1,6 @@
 from botbuilder.core import MessageFactory
 from botbuilder.dialogs import (
-    WaterfallDialog,
+    DialogContext,
     WaterfallStepContext,
     DialogTurnResult,
     PromptOptions,
@@ -8,14 +8,25 @@ from botbuilder.dialogs import (
     ChoicePrompt,
 )
 from botbuilder.dialogs import ComponentDialog
+from botbuilder.schema import ActivityTypes
 
 from .azure_dialog import AzureDialog
 from .gcp_dialog import GcpDialog
+from .instrumented_waterfall_dialog import InstrumentedWaterfallDialog
+from .snapshots import LIVE_SCAN_OPTION
+from cloud_clients import ClientFactory
 from cloud_models import Cloud
+from inventory import SnapshotStore
 
 
 class MainDialog(ComponentDialog):
-    def __init__(self, azure_connection_name: str = None, gcp_connection_name: str = None):
+    def __init__(
+            self,
+            azure_connection_name: str = None,
+            gcp_connection_name: str = None,
+            client_factory: ClientFactory = None,
+            snapshot_store: SnapshotStore = None,
+    ):
         super(MainDialog, self).__init__(MainDialog.__name__)
 
         if not azure_connection_name and not gcp_connection_name:
@@ -26,16 +37,20 @@ class MainDialog(ComponentDialog):
 
         # add the dialogs
         if azure_connection_name:
-            self.azure_dialog = AzureDialog(connection_name=azure_connection_name)
+            self.azure_dialog = AzureDialog(
+                connection_name=azure_connection_name, client_factory=client_factory, snapshot_store=snapshot_store
+            )
             self.add_dialog(self.azure_dialog)
 
         if gcp_connection_name:
-            self.gcp_dialog = GcpDialog(connection_name=gcp_connection_name)
+            self.gcp_dialog = GcpDialog(
+                connection_name=gcp_connection_name, client_factory=client_factory, snapshot_store=snapshot_store
+            )
             self.add_dialog(self.gcp_dialog)
 
         self.add_dialog(ChoicePrompt(ChoicePrompt.__name__))
         self.add_dialog(
-            WaterfallDialog(
+            InstrumentedWaterfallDialog(
                 "MainDialog",
                 [
                     self.choose_cloud_step,
@@ -46,6 +61,30 @@ class MainDialog(ComponentDialog):
 
         self.initial_dialog_id = "MainDialog" # Indicating with what dialog to start
 
+    async def on_begin_dialog(self, inner_dc: DialogContext, options: object) -> DialogTurnResult:
+        result = await self._interrupt(inner_dc)
+        if result:
+            return result
+        return await super().on_begin_dialog(inner_dc, options)
+
+    async def on_continue_dialog(self, inner_dc: DialogContext) -> DialogTurnResult:
+        result = await self._interrupt(inner_dc)
+        if result:
+            return result
+        return await super().on_continue_dialog(inner_dc)
+
+    async def _interrupt(self, inner_dc: DialogContext):
+        if inner_dc.context.activity.type == ActivityTypes.message:
+            text = (inner_dc.context.activity.text or "").lower()
+            if text == "refresh":
+                # drop cached inventory and start over, scanning live this time
+                for cloud_dialog in (self.azure_dialog, self.gcp_dialog):
+                    if cloud_dialog:
+                        await cloud_dialog.refresh(inner_dc.context)
+                await inner_dc.context.send_activity("OK, I'll fetch fresh data from the cloud.")
+                await inner_dc.cancel_all_dialogs()
+                return await inner_dc.begin_dialog(self.initial_dialog_id, {LIVE_SCAN_OPTION: True})
+
     async def choose_cloud_step(self, step_context: WaterfallStepContext) -> DialogTurnResult:
         choices = []
         if self.azure_dialog:
@@ -65,9 +104,9 @@ class MainDialog(ComponentDialog):
         cloud = step_context.result.value
 
         if cloud == Cloud.azure:
-            return await step_context.begin_dialog(self.azure_dialog.id)
+            return await step_context.begin_dialog(self.azure_dialog.id, step_context.options)
 
         if cloud == Cloud.gcp:
-            return await step_context.begin_dialog(self.gcp_dialog.id)
+            return await step_context.begin_dialog(self.gcp_dialog.id, step_context.options)
 
         await step_context.context.send_activity("Sorry, I don't support such cloud. Please try again.")
@@ -0,0 +1,109 @@
+import asyncio
+from typing import Dict, List, Optional, Sequence
+
+import structlog
+from botbuilder.core import MessageFactory, TurnContext
+from botbuilder.schema import Activity, ActivityTypes, Attachment
+
+from cards import CardPacker, TableCard, group_by_size
+from telemetry import DEFAULT_TRACER
+
+logger = structlog.get_logger(__name__)
+
+FLUSH_INTERVAL = 1.0
+
+
+class ResultStream:
+    """
+    delivers result rows to the chat while a scan is still running.
+    rows are packed into cards (a card per title, e.g., per subscription) that are sent in size bounded messages
+    at most flush_interval after their first row arrives, so the time to first result doesn't grow with the scan.
+    a progress message is kept up to date as results are sent (on channels that support updating messages)
+    """
+
+    def __init__(self, context: TurnContext, template: TableCard, flush_interval: float = FLUSH_INTERVAL):
+        self.context = context
+        self.template = template
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._packers: Dict[Optional[str], CardPacker] = {}
+        self._cards: List[Attachment] = []
+        self._progress_text: Optional[str] = None
+        self._progress_id: Optional[str] = None
+        self._sent_count = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def start(self, text: str):
+        """
+        send the progress message
+        """
+        self._progress_text = text
+        response = await self.context.send_activity(text)
+        self._progress_id = response.id if response else None
+
+    def add(self, row: Sequence[str], title: Optional[str] = None):
+        """
+        add a result row (a text per column) under title
+        """
+        packer = self._packers.get(title)
+        if not packer:
+            packer = self._packers[title] = self.template.packer(title=title)
+        card = packer.add(row)
+        if card:
+            self._cards.append(card)
+        self.count += 1
+        if not self._flush_task:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def finish(self, summary: Optional[str] = None):
+        """
+        send whatever is left and then the summary
+        """
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if summary:
+            await self.context.send_activity(summary)
+
+    async def flush(self):
+        """
+        send every pending row, including ones of cards that aren't full yet
+        """
+        async with self._lock:
+            with DEFAULT_TRACER.span("render_cards") as span:
+                for packer in self._packers.values():
+                    card = packer.flush()
+                    if card:
+                        self._cards.append(card)
+                cards, self._cards = self._cards, []
+                messages = group_by_size(cards)
+                span.set_attribute("cards", len(cards))
+            with DEFAULT_TRACER.span("send_cards", messages=len(messages)):
+                for attachments in messages:
+                    await self.context.send_activity(Activity(type=ActivityTypes.message, attachments=attachments))
+            if self.count != self._sent_count:
+                self._sent_count = self.count
+                await self._update_progress()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        # rows added from now on schedule the next flush
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to send results")
+
+    async def _update_progress(self):
+        if not self._progress_id:
+            return
+        activity = MessageFactory.text(f"{self._progress_text} (found {self.count} so far)")
+        activity.id = self._progress_id
+        try:
+            await self.context.update_activity(activity)
+        except Exception:
+            # not every channel supports updating messages - the results are delivered anyway
+            logger.warning("Failed to update the progress message", exc_info=True)
+            self._progress_id = None
@@ -0,0 +1,39 @@
+from typing import Dict, List
+
+from botbuilder.dialogs import WaterfallStepContext
+
+from inventory import Snapshot
+
+# dialog option for scanning the cloud live rather than answering from the inventory snapshots
+LIVE_SCAN_OPTION = "live_scan"
+# the number of names listed per kind of change
+MAX_CHANGED_NAMES = 5
+
+
+def is_live_scan(step_context: WaterfallStepContext) -> bool:
+    return bool((step_context.options or {}).get(LIVE_SCAN_OPTION))
+
+
+def get_snapshots_note(snapshots: Dict[str, Snapshot]) -> str:
+    """
+    the note that goes with answers from snapshots: how old they are and what changed lately
+    """
+    as_of = min(snapshot.taken_at for snapshot in snapshots.values())
+    note = f"Data as of {as_of:%Y-%m-%d %H:%M} UTC. Say \"refresh\" for a live check."
+    changes = [snapshot.changes for snapshot in snapshots.values() if snapshot.changes]
+    if not changes:
+        return note
+    detected_at = max(change_set.detected_at for change_set in changes)
+    kinds = [
+        (kind, [item for change_set in changes for item in getattr(change_set, kind)])
+        for kind in ("started", "stopped", "new")
+    ]
+    summary = "; ".join(f"{len(items)} {kind} ({_get_names(items)})" for kind, items in kinds if items)
+    return f"{note}\nLatest changes (detected {detected_at:%Y-%m-%d %H:%M} UTC): {summary}."
+
+
+def _get_names(items: List[dict]) -> str:
+    names = ", ".join(item["name"] for item in items[:MAX_CHANGED_NAMES])
+    if len(items) > MAX_CHANGED_NAMES:
+        names += f" and {len(items) - MAX_CHANGED_NAMES} more"
+    return names
@@ -0,0 +1,9 @@
+from .store import ChangeSet, Snapshot, SnapshotStore
+from .snapshotter import Snapshotter
+
+__all__ = [
+    "ChangeSet",
+    "Snapshot",
+    "SnapshotStore",
+    "Snapshotter",
+]
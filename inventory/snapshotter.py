@@ -0,0 +1,147 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+import structlog
+from http_noah.async_client import HTTPError
+
+from cloud_clients import ClientFactory, Priority, ServiceCredential, priority
+from cloud_models import Cloud
+from cloud_models.azure import Subscription
+from cloud_models.gcp import Project
+from .store import SnapshotStore
+
+logger = structlog.get_logger(__name__)
+
+Scope = TypeVar("Scope", Subscription, Project)
+
+
+@dataclass
+class Snapshotter:
+    """
+    background worker that periodically crawls the running VMs/instances into the snapshot store,
+    using service credentials. subscriptions/projects default to everything the credential can see.
+    crawl requests have background priority so they never delay users' requests
+    """
+    store: SnapshotStore
+    client_factory: ClientFactory = field(default_factory=ClientFactory)
+    azure_credential: Optional[ServiceCredential] = None
+    azure_subscription_ids: List[str] = field(default_factory=list)
+    gcp_credential: Optional[ServiceCredential] = None
+    gcp_project_ids: List[str] = field(default_factory=list)
+    interval: float = 900.0
+    max_concurrent_scans: int = 4
+
+    _task: Optional[asyncio.Task] = field(default=None, init=False, repr=False)
+
+    async def start(self, *args):
+        """
+        start crawling in the background (can be used as an aiohttp on_startup signal)
+        """
+        if not self._task:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self, *args):
+        """
+        stop crawling (can be used as an aiohttp on_cleanup signal)
+        """
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.crawl()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Inventory crawl failed")
+            await asyncio.sleep(self.interval)
+
+    async def crawl(self):
+        """
+        crawl everything once
+        """
+        with priority(Priority.background):
+            await asyncio.gather(self._crawl_azure(), self._crawl_gcp())
+
+    async def _crawl_azure(self):
+        if not self.azure_credential:
+            return
+        azclient = self.client_factory.azure(await self.azure_credential.get_token())
+        subscriptions = await azclient.subscriptions.list()
+        if self.azure_subscription_ids:
+            wanted = {subscription_id.lower() for subscription_id in self.azure_subscription_ids}
+            subscriptions = [sub for sub in subscriptions if sub.id.lower() in wanted]
+
+        async def scan(subscription: Subscription) -> List[dict]:
+            return [vm.dict() async for vm in azclient.vms.iter_running_vms(subscription=subscription)]
+
+        await self._crawl_scopes(Cloud.azure, subscriptions, scan)
+
+    async def _crawl_gcp(self):
+        if not self.gcp_credential:
+            return
+        gclient = self.client_factory.gcp(await self.gcp_credential.get_token())
+        projects = await gclient.projects.list()
+        if self.gcp_project_ids:
+            projects = [project for project in projects if project.id in self.gcp_project_ids]
+
+        async def scan(project: Project) -> Optional[List[dict]]:
+            if not await gclient.projects.validate_compute_engine_api_available(project=project):
+                # not necessarily disabled for everyone else - leave it to live scans
+                return None
+            instances = []
+            next_page_token = None
+            while True:
+                instances_by_zone, next_page_token = await gclient.instances.list_running_aggregated(
+                    project=project.id, next_page_token=next_page_token,
+                )
+                for zone_instances in instances_by_zone.values():
+                    instances += [instance.dict() for instance in zone_instances]
+                if not next_page_token:
+                    return instances
+
+        await self._crawl_scopes(Cloud.gcp, projects, scan)
+
+    async def _crawl_scopes(
+            self, cloud: Cloud, scopes: List[Scope], scan: Callable[[Scope], Awaitable[Optional[List[dict]]]]
+    ):
+        """
+        scan scopes (bounded) and store the results of each as soon as its scan is done.
+        a failed scan leaves the scope's previous snapshot in place
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_scans)
+
+        async def crawl_scope(scope: Scope):
+            async with semaphore:
+                taken_at = datetime.now(timezone.utc)
+                try:
+                    items = await scan(scope)
+                except HTTPError as e:
+                    logger.warning("Failed to crawl scope", cloud=cloud, scope=scope.id, status=e.status)
+                    return
+                except Exception:
+                    logger.exception("Failed to crawl scope", cloud=cloud, scope=scope.id)
+                    return
+                if items is None:
+                    return
+                changes = await self.store.update(cloud, scope.id, items, taken_at=taken_at)
+                if changes:
+                    logger.info(
+                        "Inventory changed",
+                        cloud=cloud,
+                        scope=scope.id,
+                        started=len(changes.started),
+                        stopped=len(changes.stopped),
+                        new=len(changes.new),
+                    )
+
+        await asyncio.gather(*[crawl_scope(scope) for scope in scopes])
+        logger.info("Crawled inventory", cloud=cloud, scopes=len(scopes))
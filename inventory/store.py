@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Dict, List, Optional
+
+from cloud_models import Cloud
+
+MAX_SCOPES_PER_QUERY = 500
+# bumped whenever the tables change. snapshots are re-crawled anyway so an outdated database is just dropped
+SCHEMA_VERSION = 3
+
+
+@dataclass(frozen=True)
+class ChangeSet:
+    """
+    how the running VMs/instances of a scope changed from one snapshot to the next.
+    new ones were never seen running in the scope before, stopped ones aren't running anymore (or were deleted)
+    """
+    started: List[dict] = field(default_factory=list)
+    stopped: List[dict] = field(default_factory=list)
+    new: List[dict] = field(default_factory=list)
+    detected_at: Optional[datetime] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.started or self.stopped or self.new)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    items: List[dict]
+    taken_at: datetime
+    # the latest changes detected in the scope (not necessarily by the latest crawl)
+    changes: Optional[ChangeSet] = None
+
+
+def _from_timestamp(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class SnapshotStore:
+    """
+    on-disk (SQLite) store of the latest inventory snapshot per scope (an Azure subscription / a GCP project).
+    snapshots older than max_age are considered missing.
+    every snapshot has a fingerprint (a hash of its items) so a scope that didn't change since its previous snapshot
+    only has its time updated, and a scope that did is compared to its previous snapshot by item id.
+    the pages of an unchanged scope are still fetched by the crawl, but not parsed nor built again (see PageMemo);
+    here, its fingerprint saves loading, diffing and rewriting its previous snapshot.
+    ids seen running in a scope are remembered (to tell started ones from new ones) for seen_retention snapshots of the
+    scope - ids that weren't in any of its latest seen_retention (changed) snapshots are forgotten.
+    database calls run on a dedicated thread so they never block the event loop
+    """
+
+    def __init__(self, path: str, max_age: float = 3600.0, id_key: str = "id", seen_retention: int = 100):
+        self.path = path
+        self.max_age = max_age
+        self.id_key = id_key
+        self.seen_retention = seen_retention
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-store")
+        self._db: Optional[sqlite3.Connection] = None
+
+    async def update(self, cloud: Cloud, scope: str, items: List[dict], taken_at: datetime) -> Optional[ChangeSet]:
+        """
+        store the new snapshot of scope and return how it changed since the previous one
+        (None if there's no previous one to compare to)
+        """
+        return await self._run(self._update, cloud.value, scope, items, taken_at.timestamp())
+
+    async def get_many(self, cloud: Cloud, scopes: List[str]) -> Dict[str, Snapshot]:
+        """
+        return the (fresh enough) snapshots of scopes that have one
+        """
+        rows = await self._run(self._get_many, cloud.value, scopes, time.time() - self.max_age)
+        return {
+            scope: Snapshot(
+                items=json.loads(items),
+                taken_at=_from_timestamp(taken_at),
+                changes=ChangeSet(**json.loads(changes), detected_at=_from_timestamp(changed_at)) if changes else None,
+            )
+            for scope, taken_at, items, changes, changed_at in rows
+        }
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._db:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            # readers (e.g., other bot processes) don't block the writer and vice versa
+            self._db.execute("PRAGMA journal_mode=WAL")
+            with self._db:
+                if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    self._db.execute("DROP TABLE IF EXISTS snapshots")
+                    self._db.execute("DROP TABLE IF EXISTS seen")
+                    self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS snapshots ("
+                    " cloud TEXT NOT NULL, scope TEXT NOT NULL, taken_at REAL NOT NULL, items TEXT NOT NULL,"
+                    " fingerprint TEXT NOT NULL, changes TEXT, changed_at REAL, generation INTEGER NOT NULL,"
+                    " PRIMARY KEY (cloud, scope))"
+                )
+                # ids of what was seen running in a scope (and the generation of the scope's latest snapshot that had
+                # them) - tells started ones from new ones
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS seen ("
+                    " cloud TEXT NOT NULL, scope TEXT NOT NULL, id TEXT NOT NULL, first_seen REAL NOT NULL,"
+                    " last_generation INTEGER NOT NULL,"
+                    " PRIMARY KEY (cloud, scope, id))"
+                )
+        return self._db
+
+    def _update(self, cloud: str, scope: str, items: List[dict], taken_at: float) -> Optional[ChangeSet]:
+        db = self._connect()
+        # a stable order so the same items always have the same fingerprint (by name, which is also how they're shown)
+        serialized = json.dumps(sorted(items, key=itemgetter("name", self.id_key)), sort_keys=True)
+        fingerprint = hashlib.sha256(serialized.encode()).hexdigest()
+        row = db.execute(
+            "SELECT fingerprint, generation FROM snapshots WHERE cloud = ? AND scope = ?", (cloud, scope)
+        ).fetchone()
+
+        if row and row[0] == fingerprint:
+            # nothing changed - the previous snapshot is neither loaded nor rewritten
+            with db:
+                db.execute("UPDATE snapshots SET taken_at = ? WHERE cloud = ? AND scope = ?", (taken_at, cloud, scope))
+            return ChangeSet(detected_at=_from_timestamp(taken_at))
+
+        changes = self._get_changes(db, cloud, scope, items, taken_at) if row else None
+        # only changed snapshots count - an unchanged one has the same ids as the previous one
+        generation = row[1] + 1 if row else 1
+        with db:
+            if row:
+                db.execute(
+                    "UPDATE snapshots SET taken_at = ?, items = ?, fingerprint = ?, generation = ?"
+                    " WHERE cloud = ? AND scope = ?",
+                    (taken_at, serialized, fingerprint, generation, cloud, scope),
+                )
+            else:
+                db.execute(
+                    "INSERT INTO snapshots (cloud, scope, taken_at, items, fingerprint, generation)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (cloud, scope, taken_at, serialized, fingerprint, generation),
+                )
+            if changes:
+                db.execute(
+                    "UPDATE snapshots SET changes = ?, changed_at = ? WHERE cloud = ? AND scope = ?",
+                    (
+                        json.dumps({"started": changes.started, "stopped": changes.stopped, "new": changes.new}),
+                        taken_at,
+                        cloud,
+                        scope,
+                    ),
+                )
+            db.executemany(
+                "INSERT INTO seen (cloud, scope, id, first_seen, last_generation) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (cloud, scope, id) DO UPDATE SET last_generation = excluded.last_generation",
+                ((cloud, scope, item[self.id_key], taken_at, generation) for item in items),
+            )
+            db.execute(
+                "DELETE FROM seen WHERE cloud = ? AND scope = ? AND last_generation <= ?",
+                (cloud, scope, generation - self.seen_retention),
+            )
+        return changes
+
+    def _get_changes(
+            self, db: sqlite3.Connection, cloud: str, scope: str, items: List[dict], taken_at: float
+    ) -> ChangeSet:
+        (previous_items,) = db.execute(
+            "SELECT items FROM snapshots WHERE cloud = ? AND scope = ?", (cloud, scope)
+        ).fetchone()
+        previous = {item[self.id_key]: item for item in json.loads(previous_items)}
+        current = {item[self.id_key]: item for item in items}
+        seen = {
+            item_id for item_id, in db.execute("SELECT id FROM seen WHERE cloud = ? AND scope = ?", (cloud, scope))
+        }
+        return ChangeSet(
+            started=[item for item_id, item in current.items() if item_id not in previous and item_id in seen],
+            stopped=[item for item_id, item in previous.items() if item_id not in current],
+            new=[item for item_id, item in current.items() if item_id not in seen],
+            detected_at=_from_timestamp(taken_at),
+        )
+
+    def _get_many(self, cloud: str, scopes: List[str], min_taken_at: float) -> List[tuple]:
+        rows = []
+        # keep clear of SQLite's limit on the number of query parameters
+        for i in range(0, len(scopes), MAX_SCOPES_PER_QUERY):
+            chunk = scopes[i:i+MAX_SCOPES_PER_QUERY]
+            placeholders = ", ".join("?" * len(chunk))
+            rows += self._connect().execute(
+                f"SELECT scope, taken_at, items, changes, changed_at FROM snapshots"
+                f" WHERE cloud = ? AND scope IN ({placeholders}) AND taken_at >= ?",
+                (cloud, *chunk, min_taken_at),
+            ).fetchall()
+        return rows
+
+    def _close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,175 @@
+"""
+production serving: pre-forked worker processes that share a single listening socket
+"""
+import asyncio
+import os
+import signal
+import socket
+import time
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Dict, Optional
+
+import structlog
+from aiohttp import web
+from aiohttp.web import Request, Response
+
+logger = structlog.get_logger(__name__)
+
+SERVING_STATE_KEY = "serving_state"
+# time between restarts of a worker that exited unexpectedly
+RESTART_DELAY = 1.0
+
+
+@dataclass
+class ServingState:
+    worker_index: int = 0
+    ready: bool = False
+
+
+def is_primary_worker(app: web.Application) -> bool:
+    """
+    whether app is served by the first worker (or isn't served by serve() at all) -
+    for work that should happen once however many workers there are
+    """
+    state = app.get(SERVING_STATE_KEY)
+    return not state or state.worker_index == 0
+
+
+async def ready(request: Request) -> Response:
+    """
+    readiness endpoint: 503 until the worker serves requests and from the moment it starts draining
+    """
+    state = request.app.get(SERVING_STATE_KEY)
+    if state and not state.ready:
+        return Response(status=HTTPStatus.SERVICE_UNAVAILABLE)
+    return Response(status=HTTPStatus.OK)
+
+
+def serve(
+        app: web.Application,
+        host: str,
+        port: int,
+        workers: int = 1,
+        shutdown_timeout: float = 60.0,
+        drain_delay: float = 0.0,
+        worker_port_base: Optional[int] = None,
+):
+    """
+    serve app on host:port with workers processes, forked from this one (after app was created).
+    SIGTERM / SIGINT drain the workers: they stop being ready, keep serving for drain_delay (so load balancers notice),
+    stop accepting connections and wait up to shutdown_timeout for the requests in flight before cleaning up.
+    a worker that exits unexpectedly is restarted.
+    when worker_port_base is given, worker i also listens on its own port, worker_port_base + i (for requests that
+    should reach a specific worker, e.g., scrapes of its metrics)
+    """
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.setblocking(False)
+    logger.info("Serving", host=host, port=port, workers=workers)
+
+    def run_worker(index: int):
+        worker_port = worker_port_base + index if worker_port_base is not None else None
+        _run_worker(app, sock, host, worker_port, ServingState(worker_index=index), shutdown_timeout, drain_delay)
+
+    if workers <= 1:
+        run_worker(0)
+        return
+
+    pids: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid:
+            pids[pid] = index
+            return
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            run_worker(index)
+        except BaseException:
+            logger.exception("Worker failed", worker=index)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        logger.info("Stopping workers", signal=signal.Signals(signum).name)
+        for pid in pids:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+
+    while pids:
+        pid, status = os.wait()
+        index = pids.pop(pid, None)
+        if index is None or stopping:
+            continue
+        logger.warning("Worker exited unexpectedly, restarting it", worker=index, status=status)
+        time.sleep(RESTART_DELAY)
+        # a signal may have come in while sleeping
+        if not stopping:
+            spawn(index)
+    sock.close()
+
+
+def _run_worker(
+        app: web.Application,
+        sock: socket.socket,
+        host: str,
+        worker_port: Optional[int],
+        state: ServingState,
+        shutdown_timeout: float,
+        drain_delay: float,
+):
+    # a loop of its own - nothing of the parent's loop (e.g., its selector) may be shared with other processes
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(_serve_worker(app, sock, host, worker_port, state, shutdown_timeout, drain_delay))
+    finally:
+        loop.close()
+
+
+async def _serve_worker(
+        app: web.Application,
+        sock: socket.socket,
+        host: str,
+        worker_port: Optional[int],
+        state: ServingState,
+        shutdown_timeout: float,
+        drain_delay: float,
+):
+    app[SERVING_STATE_KEY] = state
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    try:
+        await web.SockSite(runner, sock, shutdown_timeout=shutdown_timeout).start()
+        if worker_port is not None:
+            await web.TCPSite(runner, host, worker_port, shutdown_timeout=shutdown_timeout).start()
+        state.ready = True
+        logger.info("Worker started", worker=state.worker_index, pid=os.getpid())
+
+        stopping = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        loop.add_signal_handler(signal.SIGTERM, stopping.set)
+        loop.add_signal_handler(signal.SIGINT, stopping.set)
+        await stopping.wait()
+
+        state.ready = False
+        logger.info("Draining worker", worker=state.worker_index, pid=os.getpid())
+        await asyncio.sleep(drain_delay)
+    finally:
+        # stops accepting connections, waits for the requests in flight and runs the app's cleanup
+        await runner.cleanup()
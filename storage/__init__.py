@@ -0,0 +1,12 @@
+from .base import BatchingStorage
+from .redis import RedisStorage
+from .resp import RespClient, RespError
+from .sqlite import SqliteStorage
+
+__all__ = [
+    "BatchingStorage",
+    "RedisStorage",
+    "RespClient",
+    "RespError",
+    "SqliteStorage",
+]
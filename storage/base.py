@@ -0,0 +1,128 @@
+import asyncio
+import json
+from abc import abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from botbuilder.core import Storage, StoreItem
+from jsonpickle.pickler import Pickler
+from jsonpickle.unpickler import Unpickler
+
+# e_tag of a write that overwrites whatever is stored
+ANY_E_TAG = "*"
+
+
+@dataclass(frozen=True)
+class StoredItem:
+    e_tag: str
+    document: str
+
+
+@dataclass(frozen=True)
+class ItemWrite:
+    key: str
+    # None / ANY_E_TAG for an unconditional write
+    e_tag: Optional[str]
+    document: str
+
+
+def _get_e_tag(item: StoreItem) -> Optional[str]:
+    if isinstance(item, dict):
+        return item.get("e_tag")
+    return getattr(item, "e_tag", None)
+
+
+def _set_e_tag(item: StoreItem, e_tag: str):
+    if isinstance(item, dict):
+        item["e_tag"] = e_tag
+    else:
+        item.e_tag = e_tag
+
+
+class BatchingStorage(Storage):
+    """
+    base of the durable (shared between bot processes) storages.
+    items are serialized with jsonpickle, like the state itself is hashed by botbuilder, and carry an e_tag for
+    optimistic concurrency: writing an item that was changed since it was read raises a KeyError (as MemoryStorage does).
+    writes are batched - the writes that come in while a batch is being written are written together in the next one
+    """
+
+    def __init__(self):
+        self._pending: List[Tuple[List[ItemWrite], asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def read(self, keys: List[str]) -> Dict[str, StoreItem]:
+        if not keys:
+            return {}
+        items = {}
+        for key, stored in (await self._read(keys)).items():
+            item = Unpickler().restore(json.loads(stored.document))
+            _set_e_tag(item, stored.e_tag)
+            items[key] = item
+        return items
+
+    async def write(self, changes: Dict[str, StoreItem]):
+        if changes is None:
+            raise Exception("Changes are required when writing")
+        if not changes:
+            return
+        # serialized right away - the caller may keep changing its items once this returns
+        writes = [
+            ItemWrite(key=key, e_tag=_get_e_tag(change), document=json.dumps(Pickler().flatten(change)))
+            for key, change in changes.items()
+        ]
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((writes, future))
+        if not self._flush_task:
+            self._flush_task = asyncio.ensure_future(self._flush())
+        await future
+
+    async def delete(self, keys: List[str]):
+        if keys:
+            await self._delete(keys)
+
+    async def close(self):
+        if self._flush_task:
+            await self._flush_task
+
+    async def _flush(self):
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    conflicts = await self._write([write for writes, _ in batch for write in writes])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                offset = 0
+                for writes, future in batch:
+                    conflicting_keys = [
+                        write.key for i, write in enumerate(writes, start=offset) if i in conflicts
+                    ]
+                    offset += len(writes)
+                    if future.done():
+                        continue
+                    if conflicting_keys:
+                        future.set_exception(KeyError(f"Etag conflict: {', '.join(conflicting_keys)}"))
+                    else:
+                        future.set_result(None)
+        finally:
+            self._flush_task = None
+
+    @abstractmethod
+    async def _read(self, keys: List[str]) -> Dict[str, StoredItem]:
+        pass
+
+    @abstractmethod
+    async def _write(self, writes: List[ItemWrite]) -> Set[int]:
+        """
+        write the items in order, skipping ones whose e_tag doesn't match the stored one.
+        returns the indexes of the skipped ones
+        """
+
+    @abstractmethod
+    async def _delete(self, keys: List[str]):
+        pass
@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional, Set
+
+from .base import BatchingStorage, ItemWrite, StoredItem
+from .resp import RespClient
+
+# writes a batch of items atomically (as far as other clients are concerned), skipping the ones whose e_tag changed.
+# KEYS are the items' keys, ARGV are an (e_tag, document) pair per item followed by the TTL.
+# returns the (1-based) indexes of the skipped items
+WRITE_SCRIPT = """
+local ttl = tonumber(ARGV[#ARGV])
+local conflicts = {}
+for i, key in ipairs(KEYS) do
+    local e_tag = ARGV[2 * i - 1]
+    local current = redis.call('HGET', key, 'e_tag')
+    if e_tag ~= '' and e_tag ~= '*' and current and current ~= e_tag then
+        table.insert(conflicts, i)
+    else
+        redis.call('HSET', key, 'document', ARGV[2 * i])
+        redis.call('HINCRBY', key, 'e_tag', 1)
+        if ttl > 0 then
+            redis.call('EXPIRE', key, ttl)
+        end
+    end
+end
+return conflicts
+"""
+
+
+class RedisStorage(BatchingStorage):
+    """
+    bot state storage in Redis (or a Redis-compatible server), shared by every bot process that uses the same server.
+    an item is a hash of its document and e_tag. a batch of writes is a single script call.
+    items expire after ttl seconds without writes (0 to keep them forever)
+    """
+
+    def __init__(
+            self,
+            host: str = "localhost",
+            port: int = 6379,
+            password: Optional[str] = None,
+            db: int = 0,
+            key_prefix: str = "felix:state:",
+            ttl: int = 0,
+    ):
+        super().__init__()
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.client = RespClient(host=host, port=port, password=password, db=db)
+
+    async def close(self):
+        await super().close()
+        await self.client.close()
+
+    async def _read(self, keys: List[str]) -> Dict[str, StoredItem]:
+        replies = await self.client.pipeline([("HMGET", self.key_prefix + key, "e_tag", "document") for key in keys])
+        items = {}
+        for key, reply in zip(keys, replies):
+            if isinstance(reply, Exception):
+                raise reply
+            e_tag, document = reply
+            if document is not None:
+                items[key] = StoredItem(e_tag=e_tag.decode(), document=document.decode())
+        return items
+
+    async def _write(self, writes: List[ItemWrite]) -> Set[int]:
+        args = [len(writes)] + [self.key_prefix + write.key for write in writes]
+        for write in writes:
+            args += [write.e_tag or "", write.document]
+        args.append(self.ttl)
+        # EVAL rather than EVALSHA - the script is small, the server caches it anyway and there's no script cache
+        # to lose on restarts (or for Redis-compatible servers to lack)
+        conflicts = await self.client.execute("EVAL", WRITE_SCRIPT, *args)
+        return {i - 1 for i in conflicts}
+
+    async def _delete(self, keys: List[str]):
+        await self.client.execute("DEL", *[self.key_prefix + key for key in keys])
@@ -0,0 +1,143 @@
+import asyncio
+from collections import deque
+from typing import Deque, List, Optional, Union
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+Reply = Union[None, int, bytes, "RespError", List["Reply"]]
+
+
+class RespError(Exception):
+    """
+    an error reply of the server
+    """
+
+
+class RespClient:
+    """
+    minimal client of the Redis serialization protocol (RESP2) - works with Redis and Redis-compatible servers.
+    commands of concurrent callers are pipelined over a single connection (replies come back in order).
+    the connection is (re)opened on demand
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, password: Optional[str] = None, db: int = 0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._replies: Deque[asyncio.Future] = deque()
+        self._reader_task: Optional[asyncio.Task] = None
+        # created lazily - it belongs to the loop of its first use (e.g., of a worker process rather than its parent)
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def execute(self, *args: Union[str, bytes, int]) -> Reply:
+        """
+        run a command and return its reply (raises RespError on an error reply)
+        """
+        writer = await self._connect()
+        reply = self._send(writer, args)
+        await writer.drain()
+        return await reply
+
+    async def pipeline(self, commands: List[tuple]) -> List[Reply]:
+        """
+        run commands in a single round trip. error replies are returned rather than raised
+        """
+        writer = await self._connect()
+        replies = [self._send(writer, command) for command in commands]
+        await writer.drain()
+        return await asyncio.gather(*replies, return_exceptions=True)
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if self._reader_task:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+
+    def _send(self, writer: asyncio.StreamWriter, args: tuple) -> asyncio.Future:
+        writer.write(self._encode(args))
+        reply = asyncio.get_event_loop().create_future()
+        self._replies.append(reply)
+        return reply
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        if not self._connect_lock:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer and not self._writer.is_closing():
+                return self._writer
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self._replies = deque()
+            self._reader_task = asyncio.ensure_future(self._read_replies(reader, writer, self._replies))
+            setup = []
+            if self.password:
+                setup.append(self._send(writer, ("AUTH", self.password)))
+            if self.db:
+                setup.append(self._send(writer, ("SELECT", self.db)))
+            try:
+                await asyncio.gather(*setup)
+            except Exception:
+                writer.close()
+                raise
+            self._writer = writer
+            return writer
+
+    async def _read_replies(
+            self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, replies: Deque[asyncio.Future]
+    ):
+        try:
+            while True:
+                reply = await self._read_reply(reader)
+                future = replies.popleft()
+                if future.done():
+                    continue
+                if isinstance(reply, RespError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except Exception as e:
+            if not isinstance(e, asyncio.IncompleteReadError) or replies:
+                logger.warning("Lost the connection to the server", host=self.host, port=self.port, err=repr(e))
+            error = ConnectionError(f"Lost the connection to {self.host}:{self.port}")
+            while replies:
+                future = replies.popleft()
+                if not future.done():
+                    future.set_exception(error)
+            writer.close()
+
+    async def _read_reply(self, reader: asyncio.StreamReader) -> Reply:
+        line = await reader.readuntil(b"\r\n")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value
+        if kind == b"-":
+            return RespError(value.decode())
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            length = int(value)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(value)
+            if length < 0:
+                return None
+            return [await self._read_reply(reader) for _ in range(length)]
+        raise ValueError(f"Unexpected reply: {line!r}")
+
+    @staticmethod
+    def _encode(args: tuple) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif isinstance(arg, int):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
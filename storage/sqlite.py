@@ -0,0 +1,103 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set
+
+from .base import ANY_E_TAG, BatchingStorage, ItemWrite, StoredItem
+
+MAX_KEYS_PER_QUERY = 500
+
+
+class SqliteStorage(BatchingStorage):
+    """
+    bot state storage in a local SQLite database. processes on the same host can share it.
+    every batch of writes is a single transaction.
+    database calls run on a dedicated thread so they never block the event loop
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-storage")
+        self._db: Optional[sqlite3.Connection] = None
+
+    async def close(self):
+        await super().close()
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+    async def _read(self, keys: List[str]) -> Dict[str, StoredItem]:
+        return await self._run(self._read_sync, keys)
+
+    async def _write(self, writes: List[ItemWrite]) -> Set[int]:
+        return await self._run(self._write_sync, writes)
+
+    async def _delete(self, keys: List[str]):
+        await self._run(self._delete_sync, keys)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._db:
+            # transactions are explicit (see _transaction)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            # readers (e.g., other bot processes) don't block the writer and vice versa
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # durable across process crashes; a power loss may lose the latest batches but never corrupts the database
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("PRAGMA busy_timeout=5000")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                " key TEXT NOT NULL PRIMARY KEY, e_tag INTEGER NOT NULL, document TEXT NOT NULL)"
+            )
+        return self._db
+
+    def _read_sync(self, keys: List[str]) -> Dict[str, StoredItem]:
+        items = {}
+        # keep clear of SQLite's limit on the number of query parameters
+        for i in range(0, len(keys), MAX_KEYS_PER_QUERY):
+            chunk = keys[i:i+MAX_KEYS_PER_QUERY]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self._connect().execute(
+                f"SELECT key, e_tag, document FROM state WHERE key IN ({placeholders})", chunk
+            )
+            for key, e_tag, document in rows:
+                items[key] = StoredItem(e_tag=str(e_tag), document=document)
+        return items
+
+    def _write_sync(self, writes: List[ItemWrite]) -> Set[int]:
+        conflicts = set()
+        with self._transaction() as db:
+            for i, write in enumerate(writes):
+                row = db.execute("SELECT e_tag FROM state WHERE key = ?", (write.key,)).fetchone()
+                if row and write.e_tag not in (None, ANY_E_TAG) and write.e_tag != str(row[0]):
+                    conflicts.add(i)
+                    continue
+                db.execute(
+                    "INSERT OR REPLACE INTO state (key, e_tag, document) VALUES (?, ?, ?)",
+                    (write.key, row[0] + 1 if row else 1, write.document),
+                )
+        return conflicts
+
+    def _delete_sync(self, keys: List[str]):
+        with self._transaction() as db:
+            db.executemany("DELETE FROM state WHERE key = ?", ((key,) for key in keys))
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        # take the write lock up front so no other process writes between checking an e_tag and writing its item
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,29 @@
+from .metrics import DEFAULT_REGISTRY, CallbackGauge, Counter, Gauge, Histogram, Registry
+from .tracing import (
+    DEFAULT_TRACER,
+    JsonFileExporter,
+    LoggingExporter,
+    Span,
+    SpanExporter,
+    Tracer,
+    get_current_span,
+)
+from .web import metrics, metrics_middleware
+
+__all__ = [
+    "DEFAULT_REGISTRY",
+    "DEFAULT_TRACER",
+    "CallbackGauge",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "JsonFileExporter",
+    "LoggingExporter",
+    "Registry",
+    "Span",
+    "SpanExporter",
+    "Tracer",
+    "get_current_span",
+    "metrics",
+    "metrics_middleware",
+]
@@ -0,0 +1,155 @@
+import json
+import secrets
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# the span of the running code. tasks copy the context they're created in, so the tasks of asyncio.gather()
+# (or ensure_future()) see the span that was current when they were created as their parent
+_CURRENT_SPAN: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    # epoch seconds
+    start_time: float = field(default_factory=time.time)
+    # seconds, once ended
+    duration: Optional[float] = None
+    error: Optional[str] = None
+
+    _start_counter: float = field(default_factory=time.perf_counter, init=False, repr=False)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class SpanExporter(ABC):
+    """
+    receives every span once it ends
+    """
+
+    @abstractmethod
+    def export(self, span: Span):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonFileExporter(SpanExporter):
+    """
+    appends the spans to a file, a JSON object per line (for offline analysis).
+    every span is a single append so processes may share the file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # line buffered - a write per span
+        self._file = open(path, "a", buffering=1)
+
+    def export(self, span: Span):
+        self._file.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class LoggingExporter(SpanExporter):
+    """
+    logs the spans (e.g., for log based collection)
+    """
+
+    def export(self, span: Span):
+        logger.info("Span", **span.to_dict())
+
+
+class Tracer:
+    """
+    creates spans - children of the current span (or roots of new traces) - and hands the ended ones to its exporters
+    """
+
+    def __init__(self, exporters: Optional[List[SpanExporter]] = None):
+        self.exporters: List[SpanExporter] = list(exporters or [])
+
+    def add_exporter(self, exporter: SpanExporter):
+        self.exporters.append(exporter)
+
+    def start_span(self, name: str, **attributes: Any) -> Span:
+        """
+        start a span without making it current (e.g., for spans of async generators, whose context is their consumer's).
+        it should be ended with end_span()
+        """
+        parent = _CURRENT_SPAN.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.duration = time.perf_counter() - span._start_counter
+        if error is not None:
+            # not repr() - e.g., aiohttp's errors carry the request headers (and with them, auth tokens)
+            span.error = f"{type(error).__name__}: {error}"
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                logger.exception("Failed to export span", exporter=type(exporter).__name__)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        a span of the block, current while it runs
+        """
+        span = self.start_span(name, **attributes)
+        token = _CURRENT_SPAN.set(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _CURRENT_SPAN.reset(token)
+            self.end_span(span, error)
+
+    async def close(self, *args):
+        """
+        close the exporters (can be used as an aiohttp on_cleanup signal)
+        """
+        for exporter in self.exporters:
+            exporter.close()
+
+
+def get_current_span() -> Optional[Span]:
+    return _CURRENT_SPAN.get()
+
+
+DEFAULT_TRACER = Tracer()
@@ -0,0 +1,48 @@
+import time
+
+from aiohttp import web
+from aiohttp.web import Request, Response
+
+from .metrics import DEFAULT_REGISTRY, Gauge, Histogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "felix_http_request_duration_seconds", "Time to handle inbound HTTP requests", ["method", "route", "status"]
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "felix_http_requests_in_flight", "Inbound HTTP requests being handled", ["route"]
+)
+
+
+def _get_route(request: Request) -> str:
+    # the route's template rather than the path - paths may carry ids
+    resource = request.match_info.route.resource
+    return resource.canonical if resource else "unmatched"
+
+
+@web.middleware
+async def metrics_middleware(request: Request, handler) -> Response:
+    """
+    record the latency of every request by route & status and the requests in flight per route
+    """
+    route = _get_route(request)
+    status = 500
+    start = time.perf_counter()
+    try:
+        with HTTP_REQUESTS_IN_FLIGHT.track_in_progress(route=route):
+            response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route, status=status)
+
+
+async def metrics(request: Request) -> Response:
+    """
+    the metrics endpoint (Prometheus text format)
+    """
+    return Response(body=DEFAULT_REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE})
@@ -0,0 +1,112 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from storage.redis import WRITE_SCRIPT
+
+
+class FakeRedis:
+    """
+    in-process server that speaks just enough RESP2 for RespClient and RedisStorage: AUTH, SELECT, PING, ECHO, HMGET,
+    DEL and EVAL of WRITE_SCRIPT (emulated - there's no Lua here). the commands it got are kept in commands
+    """
+
+    def __init__(self, password: Optional[str] = None):
+        self.password = password
+        self.commands: List[List[bytes]] = []
+        self.dbs: Dict[int, Dict[bytes, Dict[bytes, bytes]]] = defaultdict(dict)
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: List[asyncio.StreamWriter] = []
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.drop_connections()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self):
+        for writer in self._writers:
+            writer.close()
+        self._writers = []
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.append(writer)
+        session = {"db": 0, "authenticated": not self.password}
+        try:
+            while True:
+                command = await self._read_command(reader)
+                self.commands.append(command)
+                writer.write(self._encode(self._handle(session, command)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> List[bytes]:
+        header = await reader.readuntil(b"\r\n")
+        assert header[:1] == b"*", header
+        args = []
+        for _ in range(int(header[1:-2])):
+            length = await reader.readuntil(b"\r\n")
+            assert length[:1] == b"$", length
+            arg = await reader.readexactly(int(length[1:-2]) + 2)
+            assert arg[-2:] == b"\r\n", arg
+            args.append(arg[:-2])
+        return args
+
+    def _handle(self, session: dict, command: List[bytes]):
+        name, args = command[0].upper(), command[1:]
+        if name == b"AUTH":
+            if args[0].decode() != self.password:
+                return ValueError("WRONGPASS invalid username-password pair")
+            session["authenticated"] = True
+            return b"OK"
+        if not session["authenticated"]:
+            return ValueError("NOAUTH Authentication required.")
+        db = self.dbs[session["db"]]
+        if name == b"SELECT":
+            session["db"] = int(args[0])
+            return b"OK"
+        if name == b"PING":
+            return b"PONG"
+        if name == b"ECHO":
+            return args[0]
+        if name == b"HMGET":
+            item = db.get(args[0], {})
+            return [item.get(field) for field in args[1:]]
+        if name == b"DEL":
+            return sum(db.pop(key, None) is not None for key in args)
+        if name == b"EVAL":
+            if args[0].decode() != WRITE_SCRIPT:
+                return ValueError("ERR unknown script")
+            return self._write_script(db, args[2:2 + int(args[1])], args[2 + int(args[1]):])
+        return ValueError(f"ERR unknown command '{name.decode()}'")
+
+    @staticmethod
+    def _write_script(db: Dict[bytes, Dict[bytes, bytes]], keys: List[bytes], argv: List[bytes]) -> List[int]:
+        conflicts = []
+        for i, key in enumerate(keys, start=1):
+            e_tag, document = argv[2 * i - 2], argv[2 * i - 1]
+            current = db.get(key, {}).get(b"e_tag")
+            if e_tag not in (b"", b"*") and current is not None and current != e_tag:
+                conflicts.append(i)
+                continue
+            item = db.setdefault(key, {})
+            item[b"document"] = document
+            item[b"e_tag"] = str(int(current or 0) + 1).encode()
+        return conflicts
+
+    def _encode(self, reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, Exception):
+            return b"-%s\r\n" % str(reply).encode()
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        return b"*%d\r\n" % len(reply) + b"".join(self._encode(item) for item in reply)
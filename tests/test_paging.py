@@ -0,0 +1,54 @@
+import asyncio
+from collections import defaultdict
+
+from cloud_clients.paging import iter_pipelined
+
+PAGES = {None: ([1, 2], "b"), "b": ([3, 4], "c"), "c": ([5, 6], "d"), "d": ([7], None)}
+
+
+class SharedPages:
+    """
+    get_page of pages that are loaded in the background and shared, like cached() loads are - cancelling a caller
+    doesn't cancel the load. a load calls back with the next page token once its page is released
+    """
+
+    def __init__(self, released: bool = False):
+        self.requested = []
+        self.loads = []
+        self.released = defaultdict(asyncio.Event)
+        if released:
+            for token in PAGES:
+                self.released[token].set()
+
+    def get_page(self, token, on_next_page_token):
+        self.requested.append(token)
+
+        async def load():
+            await self.released[token].wait()
+            items, next_token = PAGES[token]
+            on_next_page_token(next_token)
+            return items, next_token
+
+        self.loads.append(asyncio.ensure_future(load()))
+        return asyncio.shield(self.loads[-1])
+
+
+async def test_all_pages():
+    pages = SharedPages(released=True)
+    assert [item async for item in iter_pipelined(pages.get_page)] == [1, 2, 3, 4, 5, 6, 7]
+    assert pages.requested == [None, "b", "c", "d"]
+
+
+async def test_prefetch_after_close():
+    pages = SharedPages()
+    items = iter_pipelined(pages.get_page, max_prefetch=2)
+    pages.released[None].set()
+    assert await items.__anext__() == 1
+    assert pages.requested == [None, "b"]
+    await items.aclose()
+
+    # b's load wasn't cancelled along with the iteration - its next page token mustn't be requested
+    pages.released["b"].set()
+    await asyncio.gather(*pages.loads)
+    await asyncio.sleep(0)
+    assert pages.requested == [None, "b"]
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from storage import RespClient, RespError
+from tests.fake_redis import FakeRedis
+
+
+async def _read_reply(data: bytes):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return await RespClient()._read_reply(reader)
+
+
+def test_encode():
+    assert RespClient._encode(("SET", b"key", 12)) == b"*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$2\r\n12\r\n"
+    assert RespClient._encode(("ECHO", "")) == b"*2\r\n$4\r\nECHO\r\n$0\r\n\r\n"
+    # bulk lengths are in bytes, not chars
+    assert RespClient._encode(("ECHO", "café")) == b"*2\r\n$4\r\nECHO\r\n$5\r\ncaf\xc3\xa9\r\n"
+    assert RespClient._encode(("ECHO", b"a\r\nb")) == b"*2\r\n$4\r\nECHO\r\n$4\r\na\r\nb\r\n"
+
+
+@pytest.mark.parametrize(
+    "data,reply",
+    [
+        (b"+OK\r\n", b"OK"),
+        (b":42\r\n", 42),
+        (b":-1\r\n", -1),
+        (b"$5\r\nhello\r\n", b"hello"),
+        (b"$0\r\n\r\n", b""),
+        (b"$4\r\na\r\nb\r\n", b"a\r\nb"),
+        (b"$-1\r\n", None),
+        (b"*-1\r\n", None),
+        (b"*0\r\n", []),
+        (b"*3\r\n$1\r\n1\r\n$-1\r\n:2\r\n", [b"1", None, 2]),
+        (b"*2\r\n*1\r\n+a\r\n*0\r\n", [[b"a"], []]),
+    ],
+)
+async def test_decode(data, reply):
+    assert await _read_reply(data) == reply
+
+
+async def test_decode_error():
+    reply = await _read_reply(b"-ERR unknown command 'FOO'\r\n")
+    assert isinstance(reply, RespError)
+    assert str(reply) == "ERR unknown command 'FOO'"
+
+    # errors nested in an array (e.g., of EXEC) are returned in place
+    replies = await _read_reply(b"*2\r\n:1\r\n-WRONGTYPE bad\r\n")
+    assert replies[0] == 1
+    assert isinstance(replies[1], RespError)
+
+
+async def test_decode_unexpected():
+    with pytest.raises(ValueError):
+        await _read_reply(b"!3\r\nfoo\r\n")
+    with pytest.raises(asyncio.IncompleteReadError):
+        await _read_reply(b"$5\r\nhel")
+
+
+async def test_execute_and_pipeline():
+    server = FakeRedis()
+    await server.start()
+    client = RespClient(port=server.port)
+    try:
+        assert await client.execute("PING") == b"PONG"
+        assert await client.execute("ECHO", "café") == "café".encode()
+        with pytest.raises(RespError, match="unknown command"):
+            await client.execute("NOPE")
+
+        # error replies are returned rather than raised, in order
+        replies = await client.pipeline([("ECHO", "a"), ("NOPE",), ("HMGET", "missing", "x", "y")])
+        assert replies[0] == b"a"
+        assert isinstance(replies[1], RespError)
+        assert replies[2] == [None, None]
+
+        # concurrent callers get their own replies
+        echoes = await asyncio.gather(*[client.execute("ECHO", str(i)) for i in range(50)])
+        assert echoes == [str(i).encode() for i in range(50)]
+    finally:
+        await client.close()
+        await server.stop()
+
+
+async def test_auth_and_select():
+    server = FakeRedis(password="secret")
+    await server.start()
+    client = RespClient(port=server.port, password="secret", db=3)
+    try:
+        assert await client.execute("PING") == b"PONG"
+        assert server.commands[:2] == [[b"AUTH", b"secret"], [b"SELECT", b"3"]]
+    finally:
+        await client.close()
+
+    client = RespClient(port=server.port, password="wrong")
+    try:
+        with pytest.raises(RespError, match="WRONGPASS"):
+            await client.execute("PING")
+    finally:
+        await client.close()
+        await server.stop()
+
+
+async def test_reconnect():
+    server = FakeRedis()
+    await server.start()
+    client = RespClient(port=server.port)
+    try:
+        assert await client.execute("PING") == b"PONG"
+        server.drop_connections()
+        # let the client notice
+        await asyncio.sleep(0.05)
+        assert await client.execute("PING") == b"PONG"
+    finally:
+        await client.close()
+        await server.stop()
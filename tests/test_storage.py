@@ -0,0 +1,145 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from botbuilder.core import StoreItem
+
+from storage import RedisStorage, SqliteStorage
+from tests.fake_redis import FakeRedis
+
+
+class Conversation(StoreItem):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.topic = kwargs.get("topic")
+        self.turns = kwargs.get("turns", 0)
+
+
+@asynccontextmanager
+async def _open(backend: str, tmp_path):
+    if backend == "sqlite":
+        storage = SqliteStorage(str(tmp_path / "state.db"))
+        try:
+            yield storage
+        finally:
+            await storage.close()
+        return
+
+    server = FakeRedis()
+    await server.start()
+    storage = RedisStorage(port=server.port, key_prefix="test:")
+    try:
+        yield storage
+    finally:
+        await storage.close()
+        await server.stop()
+
+
+BACKENDS = pytest.mark.parametrize("backend", ["sqlite", "redis"])
+
+
+@BACKENDS
+async def test_round_trip(backend, tmp_path):
+    async with _open(backend, tmp_path) as storage:
+        assert await storage.read([]) == {}
+        assert await storage.read(["missing"]) == {}
+
+        await storage.write(
+            {"user": {"name": "ada", "clouds": ["azure", "gcp"]}, "conversation": Conversation(topic="vms")}
+        )
+        items = await storage.read(["user", "conversation", "missing"])
+        assert set(items) == {"user", "conversation"}
+        assert items["user"]["name"] == "ada"
+        assert items["user"]["clouds"] == ["azure", "gcp"]
+        assert items["user"]["e_tag"]
+        assert isinstance(items["conversation"], Conversation)
+        assert items["conversation"].topic == "vms"
+        assert items["conversation"].e_tag
+
+        await storage.write({})
+        with pytest.raises(Exception):
+            await storage.write(None)
+
+
+@BACKENDS
+async def test_write_is_serialized_right_away(backend, tmp_path):
+    async with _open(backend, tmp_path) as storage:
+        item = {"turns": 1}
+        write = asyncio.ensure_future(storage.write({"item": item}))
+        await asyncio.sleep(0)
+        item["turns"] = 2
+        await write
+        assert (await storage.read(["item"]))["item"]["turns"] == 1
+
+
+@BACKENDS
+async def test_e_tags(backend, tmp_path):
+    async with _open(backend, tmp_path) as storage:
+        await storage.write({"item": {"turns": 1}})
+        first = (await storage.read(["item"]))["item"]
+
+        # written with the e_tag it was read with
+        first["turns"] = 2
+        await storage.write({"item": first})
+        second = (await storage.read(["item"]))["item"]
+        assert second["turns"] == 2
+        assert second["e_tag"] != first["e_tag"]
+
+        # first's e_tag is stale now
+        first["turns"] = 3
+        with pytest.raises(KeyError, match="item"):
+            await storage.write({"item": first})
+        assert (await storage.read(["item"]))["item"]["turns"] == 2
+
+        # * overwrites whatever is stored, as does an item without an e_tag
+        await storage.write({"item": {"turns": 4, "e_tag": "*"}})
+        assert (await storage.read(["item"]))["item"]["turns"] == 4
+        await storage.write({"item": {"turns": 5}})
+        assert (await storage.read(["item"]))["item"]["turns"] == 5
+
+        # a stale e_tag of an item that isn't stored (anymore) doesn't conflict
+        await storage.write({"other": {"turns": 1, "e_tag": "7"}})
+        assert (await storage.read(["other"]))["other"]["turns"] == 1
+
+
+@BACKENDS
+async def test_batched_writes_conflict_separately(backend, tmp_path):
+    async with _open(backend, tmp_path) as storage:
+        await storage.write({"a": {"v": 0}, "b": {"v": 0}})
+        stale = await storage.read(["a", "b"])
+        await storage.write({"a": {"v": 1}})
+
+        # written together in the next batch - only the one with a's stale e_tag fails
+        results = await asyncio.gather(
+            storage.write({"a": stale["a"]}),
+            storage.write({"b": stale["b"]}),
+            storage.write({"c": {"v": 2}}),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], KeyError)
+        assert results[1:] == [None, None]
+        items = await storage.read(["a", "b", "c"])
+        assert (items["a"]["v"], items["b"]["v"], items["c"]["v"]) == (1, 0, 2)
+
+
+@BACKENDS
+async def test_delete(backend, tmp_path):
+    async with _open(backend, tmp_path) as storage:
+        await storage.write({"a": {"v": 1}, "b": {"v": 2}})
+        await storage.delete(["a", "missing"])
+        await storage.delete([])
+        assert set(await storage.read(["a", "b"])) == {"b"}
+
+        # a deleted item can be written again from scratch
+        await storage.write({"a": {"v": 3}})
+        assert (await storage.read(["a"]))["a"]["v"] == 3
+
+
+async def test_sqlite_is_shared_between_storages(tmp_path):
+    async with _open("sqlite", tmp_path) as first, _open("sqlite", tmp_path) as second:
+        await first.write({"item": {"v": 1}})
+        item = (await second.read(["item"]))["item"]
+        assert item["v"] == 1
+        await first.write({"item": {"v": 2}})
+        with pytest.raises(KeyError):
+            await second.write({"item": item})
@@ -0,0 +1,179 @@
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+import pytest
+
+from cloud_clients.streaming import JsonItemsParser, _ValueEnd
+
+ARRAY_DOCUMENT = json.dumps(
+    {
+        "kind": "compute#instanceList",
+        "items": [
+            {"name": "vm-1", "status": "RUNNING", "labels": {"owner": "a\"b\\c", "path": "C:\\\\temp\\"}},
+            {"name": "brackets ]}[{ in a string", "tags": [[], [{}], ["]"]]},
+            {"name": "\u05e9\u05dc\u05d5\u05dd \U0001f600 caf\u00e9", "escaped": "\\u00e9 \\n \\\""},
+            "a string item",
+            12345,
+            -0.25,
+            6.02e23,
+            True,
+            None,
+        ],
+        "nextPageToken": "token\\with\"escapes",
+        "count": 9,
+    },
+    ensure_ascii=False,
+).encode()
+
+OBJECT_DOCUMENT = json.dumps(
+    {
+        "id": "projects/p/aggregated/instances",
+        "items": {
+            "zones/us-east1-b": {"instances": [{"name": "vm-1", "cpus": 4}, {"name": "vm-\u00e9"}]},
+            "zones/europe-west1-c": {"warning": {"code": "NO_RESULTS_ON_PAGE", "message": "{\"]"}},
+            "zones/asia-east1-a": {},
+        },
+        "nextPageToken": 17,
+    },
+    ensure_ascii=False,
+).encode()
+
+# numbers right before the end of their chunk might continue in the next one
+NUMBERS_DOCUMENT = b'{"value": [1, 23, 456, 7.5, 8e3, -9.25E-2, 1000000], "total": 7, "skip": 0}'
+
+
+def _parse(items_key: str, chunks: Sequence[bytes]) -> Tuple[List[Any], JsonItemsParser]:
+    parser = JsonItemsParser(items_key)
+    items = []
+    for chunk in chunks:
+        items += parser.feed(chunk)
+    items += parser.close()
+    return items, parser
+
+
+def _expected(items_key: str, document: bytes) -> Tuple[List[Any], dict]:
+    parsed = json.loads(document)
+    collection = parsed.pop(items_key)
+    items = list(collection.items()) if isinstance(collection, dict) else collection
+    return items, parsed
+
+
+@pytest.mark.parametrize(
+    "items_key,document",
+    [("items", ARRAY_DOCUMENT), ("items", OBJECT_DOCUMENT), ("value", NUMBERS_DOCUMENT)],
+)
+def test_split_at_every_byte(items_key, document):
+    expected_items, expected_extra = _expected(items_key, document)
+    for i in range(len(document) + 1):
+        items, parser = _parse(items_key, [document[:i], document[i:]])
+        assert items == expected_items, f"split at {i}"
+        assert parser.extra == expected_extra, f"split at {i}"
+        assert parser.done
+
+
+@pytest.mark.parametrize(
+    "items_key,document",
+    [("items", ARRAY_DOCUMENT), ("items", OBJECT_DOCUMENT), ("value", NUMBERS_DOCUMENT)],
+)
+def test_byte_at_a_time(items_key, document):
+    expected_items, expected_extra = _expected(items_key, document)
+    items, parser = _parse(items_key, [document[i:i+1] for i in range(len(document))])
+    assert items == expected_items
+    assert parser.extra == expected_extra
+
+
+def test_items_are_returned_once_complete():
+    parser = JsonItemsParser("value")
+    assert parser.feed(b'{"value": [{"id": 1}, {"id"') == [{"id": 1}]
+    assert parser.feed(b': 2}, 3') == [{"id": 2}]
+    # 3 might be 30, 3.5, ...
+    assert parser.feed(b"0") == []
+    assert parser.feed(b"]") == [30]
+    assert parser.feed(b', "nextLink": null}') == []
+    assert parser.done
+    assert parser.close() == []
+    assert parser.extra == {"nextLink": None}
+
+
+def test_number_at_the_end_of_the_document():
+    parser = JsonItemsParser("value")
+    assert parser.feed(b'{"value": [], "count": 12') == []
+    assert parser.extra == {}
+    assert parser.feed(b"3}") == []
+    assert parser.extra == {"count": 123}
+
+
+def test_missing_and_non_collection_items_key():
+    items, parser = _parse("items", [b'{"kind": "compute#instanceList", "id": "x"}'])
+    assert items == []
+    assert parser.extra == {"kind": "compute#instanceList", "id": "x"}
+
+    items, parser = _parse("items", [b'{"items": "not a collection"}'])
+    assert items == []
+    assert parser.extra == {"items": "not a collection"}
+
+
+def test_empty_collections():
+    assert _parse("value", [b'{"value": []}'])[0] == []
+    assert _parse("items", [b'{"items": {}}'])[0] == []
+
+
+@pytest.mark.parametrize(
+    "items_key,document",
+    [("items", ARRAY_DOCUMENT), ("items", OBJECT_DOCUMENT), ("value", NUMBERS_DOCUMENT)],
+)
+def test_truncated_document(items_key, document):
+    for i in range(len(document)):
+        with pytest.raises(ValueError):
+            _parse(items_key, [document[:i]])
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        b'["value", 1]',
+        b'{"value": [1, 2}',
+        b'{"value": [{"a": 1]]}',
+        b'{"value": [tru]}',
+        b'{"value": [1, 2], "next" 3}',
+        b'{"value": [{"a": "\xff"}]}',
+        b'{"value": {"a": 1, 2: 3}}',
+    ],
+)
+def test_invalid_document(document):
+    for i in range(len(document) + 1):
+        with pytest.raises(ValueError):
+            _parse("value", [document[:i], document[i:]])
+
+
+def _find_end(value: str, rest: str, split: int) -> Optional[int]:
+    text = value + rest
+    end = _ValueEnd()
+    pos = end.feed(text[:split])
+    if pos is not None:
+        return pos
+    pos = end.feed(text[split:])
+    return None if pos is None else split + pos
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        '{"a": [1, {"b": "}"}], "c": "\\"]"}',
+        '["\\\\", "\\\\\\"", "\\u00e9", "\u05e9\u05dc\u05d5\u05dd"]',
+        '"a string with \\" and \\\\ and ]}"',
+        '"\\\\"',
+        '[[[[]]], {}]',
+    ],
+)
+def test_value_end_split_at_every_char(value):
+    for split in range(len(value) + 1):
+        assert _find_end(value, ', "next": "}"', split) == len(value), f"split at {split}"
+
+
+def test_value_end_escape_at_the_end_of_a_chunk():
+    end = _ValueEnd()
+    assert end.feed('["a\\') is None
+    assert end.escape
+    assert end.feed('"') is None
+    assert end.feed('"]') == 2